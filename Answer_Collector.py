@@ -0,0 +1,142 @@
+import selectors
+
+from Clock import SYSTEM_CLOCK
+
+
+class AnswerCollector:
+    """
+    Collects the players' answers for a round. Client sockets stay registered with an
+    epoll/kqueue selector between rounds and only the changes to the active set are applied,
+    so the collector neither rebuilds its fd set nor hits select()'s 1024-fd limit.
+
+    While a round is open, the same selector also flushes the messages still queued in the
+    clients' outbound buffers as their sockets become writable, so the game thread never blocks
+    on a client with a full send window.
+
+    Attributes:
+        timeout (float): Seconds a round waits for answers.
+        close_early (bool): End the round as soon as every active client has answered.
+        selector (selectors.BaseSelector): Selector holding the registered client sockets.
+        metrics (TriviaMetrics): Optional metrics receiving the answer count and latencies.
+        outbound (dict): Optional client socket -> OutboundBuffer mapping to flush during rounds.
+        clock: The clock the deadline and answer times are read from.
+    """
+
+    def __init__(self, timeout=10, close_early=False, metrics=None, outbound=None, clock=SYSTEM_CLOCK):
+        self.timeout = timeout
+        self.close_early = close_early
+        self.metrics = metrics
+        self.outbound = outbound
+        self.clock = clock
+        self.selector = selectors.DefaultSelector()
+        self.registered = set()
+        self.writing = set()  # Sockets also watched for writability
+
+    def sync(self, active_clients):
+        """
+        Registers clients that became active and unregisters the ones that left.
+        """
+        active = set(active_clients)
+        for client_socket in self.registered - active:
+            self.unregister(client_socket)
+        for client_socket in active - self.registered:
+            self.selector.register(client_socket, selectors.EVENT_READ)
+            self.registered.add(client_socket)
+
+    def unregister(self, client_socket):
+        """
+        Stops watching a client socket.
+        """
+        if client_socket in self.registered:
+            self.registered.discard(client_socket)
+            self.writing.discard(client_socket)
+            try:
+                self.selector.unregister(client_socket)
+            except (KeyError, ValueError):
+                pass
+
+    def clear(self):
+        """
+        Unregisters every client, before their sockets are closed at the end of a game.
+        """
+        for client_socket in list(self.registered):
+            self.unregister(client_socket)
+
+    def watch_writes(self, client_socket, writing):
+        """
+        Starts or stops watching a registered client socket for writability.
+        """
+        if writing == (client_socket in self.writing):
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+        self.selector.modify(client_socket, events)
+        if writing:
+            self.writing.add(client_socket)
+        else:
+            self.writing.discard(client_socket)
+
+    def flush(self, client_socket):
+        """
+        Sends the queued messages of a writable client socket, watching it until its buffer is empty.
+        """
+        buffer = self.outbound.get(client_socket)
+        try:
+            done = buffer is None or buffer.flush()
+        except OSError:
+            buffer.clear()  # The read side reports the lost connection
+            done = True
+        self.watch_writes(client_socket, not done)
+
+    def collect(self, active_clients, answered_at=None):
+        """
+        Collects responses from the active clients until the deadline, or until everyone answered
+        when `close_early` is set. The last answer a client sends within the time limit counts;
+        clients that did not answer map to None. If `answered_at` is given, it maps every client
+        that answered to the perf_counter_ns() nanoseconds between the start of collection and
+        the receipt of its counted answer.
+        """
+        self.sync(active_clients)
+        if self.outbound is not None:
+            for client_socket in self.registered:
+                buffer = self.outbound.get(client_socket)
+                self.watch_writes(client_socket, bool(buffer and buffer.pending))
+        responses = {client_socket: None for client_socket in active_clients}
+        answered = 0
+        start_ns = self.clock.perf_counter_ns()
+        start = self.clock.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            if self.close_early and answered == len(responses):
+                break
+            time_left = deadline - self.clock.monotonic()
+            if time_left <= 0:
+                break
+            for key, mask in self.selector.select(time_left):
+                client_socket = key.fileobj
+                if mask & selectors.EVENT_WRITE:
+                    self.flush(client_socket)
+                if not mask & selectors.EVENT_READ:
+                    continue
+                try:
+                    data = client_socket.recv(1024)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b''
+                received_ns = self.clock.perf_counter_ns()  # Stamped per read, so answers of one wakeup are still ordered
+                if not data:
+                    # Disconnected: stop polling the socket so it does not wake every select
+                    self.unregister(client_socket)
+                if client_socket not in responses:
+                    continue
+                if responses[client_socket] is None:
+                    answered += 1
+                    if self.metrics and data:
+                        self.metrics.answers_received.inc()
+                        self.metrics.answer_latency.observe(self.clock.monotonic() - start)
+                responses[client_socket] = data.strip().decode(errors='replace')
+                if answered_at is not None and data:
+                    answered_at[client_socket] = received_ns - start_ns
+
+        return responses
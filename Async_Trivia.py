@@ -0,0 +1,562 @@
+import asyncio
+import secrets
+import socket
+import time
+
+from Broadcast import HIGH_WATERMARK, LOW_WATERMARK
+from Lobby import Lobby, LobbyScheduler
+from Messages import ONLY_PLAYER, ONLY_PLAYER_FRAME, DISQUALIFIED_DATA, DISQUALIFIED_FRAME, winner_message
+from Offers import UNLIMITED_SLOTS
+from Players import ActiveSet
+from Protocol import (LEGACY_VERSION, PROTOCOL_VERSION, ANSWER, GAME_OVER, STATS, INFO, SESSION, REPLAY, RESUME_REJECTED,
+                      FrameDecoder, ProtocolError, encode_frame, encode_question, encode_text_frames, encode_welcome, parse_hello,
+                      parse_resume)
+from Replay import GameRecord
+from Trivia import TriviaServer
+
+
+class AsyncTriviaServer(TriviaServer):
+    """
+    A Trivia Server that runs connection accepts, offer broadcasts, question fan-out and answer
+    collection on a single asyncio event loop instead of one thread per client and per message.
+    Legacy clients get the same raw text protocol as TriviaServer, while clients that open with a
+    protocol hello get length-prefixed frames (see Protocol.py).
+
+    Players are sharded into lobbies by a LobbyScheduler and every lobby plays its own game
+    concurrently, so new players never wait for a running game to finish.
+
+    Attributes:
+        readers (dict): Maps each connected client's StreamWriter to its StreamReader.
+        decoders (dict): Maps the StreamWriter of every framed client to its FrameDecoder.
+        scheduler (LobbyScheduler): Assigns players to lobbies and tracks the running games.
+        join_timeout (int): Seconds without a new connection before a lobby starts.
+        checkpoints (CheckpointStore): When set, running games are saved after every round and framed
+            clients get a session token to rejoin their game after a server restart.
+        resume_grace (float): Seconds a restored game waits for its players to rejoin.
+        sessions (dict): Session token -> restored lobby, for the players that have not rejoined yet.
+        replay_timeout (float): Seconds a framed client's connection stays open after its game for
+            it to ask for the next one.
+        pending_handshakes (int): Connections still waiting for their handshake line.
+    """
+
+    def __init__(self, udp_port=13117, join_timeout=10, answer_timeout=10, close_round_early=False,
+                 lobby_size=None, questions=None, stats_store=None, logger=None, metrics=None, host=None,
+                 tcp_port=0, checkpoints=None, resume_grace=30, offer_group=None, scoring='elimination',
+                 replays=None, handshake_timeout=5, max_pending_handshakes=1024, slow_consumers='disqualify'):
+        super().__init__(udp_port, answer_timeout, close_round_early, questions, stats_store, logger, metrics,
+                         host, tcp_port, offer_group, scoring, replays, handshake_timeout, max_pending_handshakes,
+                         slow_consumers)
+        self.readers = {}
+        self.decoders = {}
+        self.join_timeout = join_timeout
+        self.scheduler = LobbyScheduler(self.questions, lobby_size, join_timeout)
+        self.lobby_events = {}  # Lobby id -> asyncio.Event set on every join
+        self.games = set()
+        self.loop = None
+        self.checkpoints = checkpoints
+        self.resume_grace = resume_grace
+        self.sessions = {}
+        self.replay_timeout = 30
+        self.pending_handshakes = 0
+
+    def start(self):
+        """
+        Starts the server and runs the event loop until interrupted.
+        """
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """
+        Opens the TCP listener and keeps one offer broadcaster alive for the lifetime of the server.
+        Games are started by the lobbies as they fill up.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.restore_checkpoint()
+
+        self.tcp_socket.listen(socket.SOMAXCONN)  # Room for connection bursts
+        self.tcp_socket.setblocking(False)
+        server = await asyncio.start_server(self.handle_connection, sock=self.tcp_socket)
+        self.log_startup()
+
+        broadcaster = asyncio.create_task(self.broadcast_offers())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            broadcaster.cancel()
+
+    def offer_load(self):
+        """
+        Returns the (open slots, players, lobby id) of the lobby being filled, or of the next
+        lobby when no one is waiting.
+        """
+        lobby_size = self.scheduler.lobby_size
+        lobby = self.scheduler.filling
+        if lobby is None:
+            return lobby_size or UNLIMITED_SLOTS, 0, self.scheduler.next_lobby_id
+        players = len(lobby.clients)
+        open_slots = max(lobby_size - players, 0) if lobby_size else UNLIMITED_SLOTS
+        return open_slots, players, lobby.lobby_id
+
+    async def broadcast_offers(self):
+        """
+        Sends the offers for as long as the server runs, faster as the filling lobby fills up.
+        """
+        self.udp_socket.setblocking(False)
+        while True:
+            open_slots, players, lobby_id = self.offer_load()
+            if open_slots:
+                try:
+                    self.offers.send(open_slots, players, lobby_id)
+                except OSError as e:
+                    self.logger.log('offer_failed', f"\033[31mError broadcasting offer: {e}\033[00m", error=str(e))
+            await asyncio.sleep(self.offers.interval(open_slots, players))
+
+    async def handle_connection(self, reader, writer):
+        """
+        Reads the handshake line, negotiates the protocol and places the client in the filling lobby.
+        Connections beyond `max_pending_handshakes` still waiting for their line are turned away.
+        """
+        address = writer.get_extra_info('peername')
+        # Bound the transport's queue like TriviaServer's outbound buffers: drain() waits once it
+        # holds more than the high watermark, until it is down to the low watermark
+        writer.transport.set_write_buffer_limits(HIGH_WATERMARK, LOW_WATERMARK)
+        if self.pending_handshakes >= self.max_pending_handshakes:
+            self.reject_handshake(writer, address, "too many pending handshakes")
+            return
+        self.pending_handshakes += 1
+        try:
+            line = (await asyncio.wait_for(reader.readline(), self.handshake_timeout)).decode()
+        except (asyncio.TimeoutError, ConnectionError, ValueError) as e:
+            # ValueError: the line is not UTF-8 or longer than the stream's buffer limit
+            self.reject_handshake(writer, address, str(e))
+            return
+        finally:
+            self.pending_handshakes -= 1
+        if not line.endswith('\n'):
+            self.reject_handshake(writer, address, "connection closed")  # readline() returns the partial line at EOF
+            return
+
+        token = parse_resume(line)
+        if token is not None:
+            self.resume_client(reader, writer, address, token)
+            return
+        version, client_name = parse_hello(line)
+        if not client_name:
+            self.reject_handshake(writer, address, "empty player name")
+            return
+        self.readers[writer] = reader
+        if version != LEGACY_VERSION:
+            writer.write(encode_welcome(PROTOCOL_VERSION))
+            self.decoders[writer] = FrameDecoder()
+        self.register_client(writer, address, client_name)
+
+    def reject_handshake(self, writer, address, reason):
+        """
+        Closes a connection that did not send a valid handshake line.
+        """
+        self.logger.log('handshake_failed', f"\033[31mError receiving name from {address}: {reason}\033[00m",
+                        address=address, error=reason)
+        self.metrics.handshakes_failed.inc()
+        writer.close()
+
+    def register_client(self, writer, address, client_name):
+        """
+        Assigns a client to a lobby. The first player of a lobby launches the task that starts its game.
+        """
+        token = secrets.token_hex(16) if self.checkpoints and writer in self.decoders else None
+        player = self.clients.add(writer, address, client_name, token)
+        if token:
+            writer.write(encode_frame(SESSION, token.encode()))
+        lobby = self.scheduler.assign(player, self.loop.time())
+        self.update_player_activity(client_name)
+        self.metrics.connections_accepted.inc()
+        self.metrics.connected_players.inc()
+        self.logger.log('client_connected', f"New client {address} connected to lobby {lobby.lobby_id} with name: {client_name}",
+                        address=address, lobby=lobby.lobby_id, name=client_name)
+
+        if lobby.lobby_id not in self.lobby_events:
+            self.lobby_events[lobby.lobby_id] = asyncio.Event()
+            game = asyncio.create_task(self.run_lobby(lobby))
+            self.games.add(game)
+            game.add_done_callback(self.games.discard)
+        self.lobby_events[lobby.lobby_id].set()
+
+    async def run_lobby(self, lobby):
+        """
+        Waits until the lobby is full or idle for `join_timeout` seconds, then plays its game.
+        """
+        joined = self.lobby_events[lobby.lobby_id]
+        while True:
+            remaining = self.scheduler.time_until_start(lobby, self.loop.time())
+            if remaining <= 0:
+                break
+            joined.clear()
+            try:
+                await asyncio.wait_for(joined.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        self.scheduler.start(lobby)
+        await self.play_lobby(lobby)
+
+    async def play_lobby(self, lobby, resumed=False):
+        """
+        Plays the lobby's game, stopping it if it crashes.
+        """
+        try:
+            await self.run_game(lobby, resumed)
+        except Exception as e:
+            self.logger.log('lobby_crashed', f"\033[31mLobby {lobby.lobby_id} crashed: {e}\033[00m",
+                            lobby=lobby.lobby_id, error=str(e))
+            self.stop_game(lobby)
+        finally:
+            del self.lobby_events[lobby.lobby_id]
+
+    def restore_checkpoint(self):
+        """
+        Restores the games of a recent checkpoint. Each one waits for its players to rejoin.
+        """
+        if not self.checkpoints:
+            return
+        for snapshot in self.checkpoints.load(self.resume_grace):
+            lobby = Lobby.from_snapshot(snapshot, self.questions)
+            lobby.active = ActiveSet()  # Filled as the players still in the game rejoin
+            self.scheduler.resume(lobby)
+            for token in lobby.expected:
+                self.sessions[token] = lobby
+            self.logger.log('lobby_restored', f"Lobby {lobby.lobby_id} restored at round {lobby.round_num}, "
+                                              f"waiting for {len(lobby.expected)} players to rejoin...",
+                            lobby=lobby.lobby_id, round=lobby.round_num, players=len(lobby.expected))
+            self.lobby_events[lobby.lobby_id] = asyncio.Event()
+            game = asyncio.create_task(self.run_restored_lobby(lobby))
+            self.games.add(game)
+            game.add_done_callback(self.games.discard)
+
+    def resume_client(self, reader, writer, address, token):
+        """
+        Puts a client presenting a session token back into its restored game.
+        """
+        lobby = self.sessions.pop(token, None)
+        if lobby is None:
+            self.logger.log('resume_rejected', f"\033[31mClient {address} presented an unknown or expired session.\033[00m",
+                            address=address)
+            writer.write(encode_frame(RESUME_REJECTED))  # Flushed by close(), tells the client to stop retrying
+            writer.close()
+            return
+
+        saved = lobby.expected.pop(token)
+        self.readers[writer] = reader
+        self.decoders[writer] = FrameDecoder()
+        player = self.clients.add(writer, address, saved['name'], token)
+        lobby.clients.append(player)
+        if saved['alive']:
+            lobby.active[writer] = player.name
+        writer.write(encode_welcome(PROTOCOL_VERSION) +
+                     encode_frame(INFO, f"Welcome back {player.name}, resuming round {lobby.round_num}.\n".encode()))
+        self.metrics.connections_accepted.inc()
+        self.metrics.connected_players.inc()
+        self.logger.log('client_resumed', f"Client {address} rejoined lobby {lobby.lobby_id} as {player.name}",
+                        address=address, lobby=lobby.lobby_id, name=player.name)
+        self.lobby_events[lobby.lobby_id].set()
+
+    async def run_restored_lobby(self, lobby):
+        """
+        Waits up to `resume_grace` seconds for the players still in a restored game to rejoin,
+        then closes the sessions of the missing ones and continues the game with the ones that
+        came back. Players can therefore never rejoin in the middle of a round.
+        """
+        joined = self.lobby_events[lobby.lobby_id]
+        deadline = self.loop.time() + self.resume_grace
+        while any(saved['alive'] for saved in lobby.expected.values()):
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                break
+            joined.clear()
+            try:
+                await asyncio.wait_for(joined.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        for token, saved in lobby.expected.items():
+            self.sessions.pop(token, None)
+            self.logger.log('resume_expired', f"{saved['name']} did not rejoin lobby {lobby.lobby_id} in time.",
+                            lobby=lobby.lobby_id, name=saved['name'])
+        lobby.expected.clear()
+        await self.play_lobby(lobby, resumed=True)
+
+    def save_checkpoint(self):
+        """
+        Queues a snapshot of every running game.
+        """
+        if self.checkpoints:
+            self.checkpoints.save_later([lobby.snapshot() for lobby in self.scheduler.running.values()])
+
+    async def run_game(self, lobby, resumed=False):
+        """
+        Plays a full game with the lobby's clients: sends questions, collects answers and
+        eliminates players until a single winner remains. A resumed game continues from its
+        restored round with the players that rejoined.
+        """
+        if resumed:
+            self.logger.log('game_resumed', f"Game resuming in lobby {lobby.lobby_id} at round {lobby.round_num}...",
+                            lobby=lobby.lobby_id, players=len(lobby.active))
+        else:
+            self.logger.log('game_started', f"Game starting in lobby {lobby.lobby_id} with connected clients...",
+                            lobby=lobby.lobby_id, players=len(lobby.clients))
+            lobby.active = ActiveSet.of(lobby.clients)
+            lobby.round_num = 1
+        active_clients = lobby.active
+        client_names = active_clients
+
+        if len(active_clients) == 1 and not resumed:
+            self.logger.log('game_cancelled', ONLY_PLAYER, lobby=lobby.lobby_id)
+            self.send_message_to_all(ONLY_PLAYER, active_clients, ONLY_PLAYER_FRAME)
+            await self.drain_all(active_clients)
+            self.stop_game(lobby, replay=True)
+            return
+
+        record = GameRecord(lobby.lobby_id, active_clients) if self.replays else None
+        while len(active_clients) > 1:
+            question_text, correct_answer = self.pick_lobby_question(lobby)
+            welcome_message = self.build_round_message(lobby.round_num, question_text, client_names)
+            self.logger.log('round_started', welcome_message, lobby=lobby.lobby_id, round=lobby.round_num,
+                            players=len(active_clients))
+            round_start = time.perf_counter()
+
+            self.send_message_to_all(welcome_message, active_clients, encode_question(lobby.round_num, welcome_message))
+            self.evict_slow_consumers(await self.drain_all(active_clients), active_clients)
+            self.metrics.fanout_time.observe(time.perf_counter() - round_start)
+
+            answered_at = {}
+            responses = await self.gather_responses(active_clients, answered_at)
+            correct_responses, incorrect_responses, no_responses = self.determine_round_results(responses, correct_answer, client_names, answered_at)
+            for writer in correct_responses:
+                lobby.scores[client_names[writer]] = lobby.scores.get(client_names[writer], 0) + 1
+            if record:
+                eliminated = incorrect_responses + no_responses if correct_responses else []
+                record.add_round(lobby.round_num, question_text, correct_answer, responses, answered_at, client_names,
+                                 eliminated)
+            active_clients = self.update_active_clients(correct_responses, incorrect_responses, no_responses, active_clients, client_names)
+            await self.drain_all(incorrect_responses + no_responses)
+            self.metrics.rounds_played.inc()
+            self.metrics.round_duration.observe(time.perf_counter() - round_start)
+
+            if not correct_responses or len(correct_responses) > 1:
+                lobby.round_num += 1
+                self.logger.log('next_round', "\033[35mMoving to the next round with another question...\033[00m\n",
+                                lobby=lobby.lobby_id)
+            self.save_checkpoint()
+
+        if not active_clients:
+            self.logger.log('lobby_empty', f"\033[31mAll players left lobby {lobby.lobby_id}.\033[00m", lobby=lobby.lobby_id)
+            self.save_replay(record, None)
+            self.stop_game(lobby)
+            return
+        self.save_replay(record, active_clients.first())
+        await self.announce_winner(lobby, active_clients.first(), client_names)
+
+    def pick_lobby_question(self, lobby):
+        """
+        Draws the lobby's next question and adds it to the cumulative statistics.
+        """
+        question, answer = lobby.pick_question()
+        self.count_question(answer)
+        return question, answer
+
+    def send_message_to_all(self, message, active_clients, frame=None):
+        """
+        Queues a message on every active client's stream writer. The message is encoded once for
+        legacy clients and once as `frame` (an INFO frame by default) for framed clients.
+        Clients whose connection is already closing are removed from `active_clients`.
+        """
+        data = message.encode()
+        if frame is None:
+            frame = encode_text_frames(INFO, message)
+        for writer in list(active_clients):
+            if writer.is_closing():
+                self.logger.log('send_failed', "\033[31mError sending to client: connection closed\033[00m")
+                self.metrics.connections_dropped.inc()
+                active_clients.remove(writer)
+                continue
+            writer.write(frame if writer in self.decoders else data)
+
+    async def drain_all(self, writers):
+        """
+        Waits until the queue of every writer is below its high watermark. Writers over it are
+        not waited for, and the others get at most `drain_timeout` seconds. Returns the writers
+        of the clients that fell behind.
+        """
+        lagging = []
+        draining = []
+        for writer in writers:
+            if writer.transport.get_write_buffer_size() > HIGH_WATERMARK:
+                lagging.append(writer)
+            else:
+                draining.append(writer)
+        results = await asyncio.gather(*(asyncio.wait_for(writer.drain(), self.drain_timeout) for writer in draining),
+                                       return_exceptions=True)
+        for writer, result in zip(draining, results):
+            if isinstance(result, asyncio.TimeoutError):
+                lagging.append(writer)
+            elif isinstance(result, Exception):
+                self.logger.log('send_failed', f"\033[31mError sending to client: {result}\033[00m", error=str(result))
+                self.metrics.connections_dropped.inc()
+                writer.close()
+        return lagging
+
+    def drop_connection(self, writer):
+        """
+        Closes a client connection in the middle of a game, discarding its queued data. The
+        player is forgotten when its lobby stops, and counted as dropped by the game-over message.
+        """
+        writer.transport.abort()
+
+    async def gather_responses(self, active_clients, answered_at=None):
+        """
+        Collects the answers of all active clients for `answer_timeout` seconds, or until every
+        client answered when `close_round_early` is set. Otherwise, as in TriviaServer.collect_responses,
+        the last answer a client sends within the time limit counts. If `answered_at` is given, it
+        maps every client that answered to the nanoseconds between the start of collection and
+        the receipt of its counted answer.
+        """
+        responses = {writer: None for writer in active_clients}
+        if answered_at is None:
+            answered_at = {}
+        start_ns = time.perf_counter_ns()
+        deadline = self.loop.time() + self.answer_timeout
+        await asyncio.gather(*(self.read_answers(writer, responses, deadline, answered_at, start_ns)
+                               for writer in active_clients))
+        return responses
+
+    async def read_answers(self, writer, responses, deadline, answered_at, start_ns):
+        """
+        Reads one client's answers until the round deadline or until it disconnects.
+        Framed clients answer with ANSWER frames, legacy clients with raw text.
+        """
+        reader = self.readers[writer]
+        decoder = self.decoders.get(writer)
+        round_start = deadline - self.answer_timeout
+        while True:
+            time_left = deadline - self.loop.time()
+            if time_left <= 0:
+                return
+            try:
+                data = await asyncio.wait_for(reader.read(1024), time_left)
+            except asyncio.TimeoutError:
+                return
+            except ConnectionError:
+                data = b''
+            received_ns = time.perf_counter_ns()
+
+            if decoder is None or not data:
+                if data and responses[writer] is None:
+                    self.metrics.answers_received.inc()
+                    self.metrics.answer_latency.observe(self.loop.time() - round_start)
+                responses[writer] = data.strip().decode(errors='replace')
+                if data:
+                    answered_at[writer] = received_ns - start_ns
+            else:
+                try:
+                    frames = decoder.feed(data)
+                except ProtocolError as e:
+                    self.logger.log('invalid_frame', f"\033[31mInvalid frame from client: {e}\033[00m", error=str(e))
+                    writer.close()
+                    responses[writer] = ''
+                    return
+                answered = responses[writer] is not None
+                for message_type, payload in frames:
+                    if message_type == ANSWER:
+                        responses[writer] = payload.decode(errors='replace').strip()
+                        answered_at[writer] = received_ns - start_ns
+                if not answered and responses[writer] is not None:
+                    self.metrics.answers_received.inc()
+                    self.metrics.answer_latency.observe(self.loop.time() - round_start)
+            if not data or (self.close_round_early and responses[writer] is not None):
+                return  # Disconnected clients stop reading at once, like in the threaded AnswerCollector
+
+    def disqualify_clients(self, losers, client_names):
+        """
+        Queues the disqualification notice on every losing client's stream writer.
+        """
+        for writer in losers:
+            self.logger.log('player_disqualified', f"\033[35m{client_names[writer]} is disqualified.\033[00m",
+                            name=client_names[writer])
+            if not writer.is_closing():
+                writer.write(DISQUALIFIED_FRAME if writer in self.decoders else DISQUALIFIED_DATA)
+
+    async def announce_winner(self, lobby, winner, client_names):
+        """
+        Announces the winner, sends the game-over message with stats to every client of the lobby
+        and stops its game.
+        """
+        winner_name = client_names[winner]
+        self.logger.log('game_won', f"\033[34mCongratulations to {winner_name}, the winner of this game!\033[00m\n",
+                        lobby=lobby.lobby_id, name=winner_name)
+        self.metrics.games_played.inc()
+        self.update_player_wins(winner_name)
+
+        true_false_rate = self.format_true_false_rate(lobby.current_game_true_answers, lobby.current_game_false_answers)
+        winner_text = winner_message(winner_name)
+        stats_text = (self.send_most_active_players_stats() + '\n' +
+                      self.send_most_wins_stats() + '\n' + true_false_rate)
+        game_over_message = winner_text + "\n" + stats_text
+        # Framed clients get the stats first, the game-over frame ends their game
+        frames = encode_text_frames(STATS, stats_text) + encode_text_frames(GAME_OVER, winner_text, INFO)
+
+        writers = [player.connection for player in lobby.clients]
+        self.send_message_to_all(game_over_message, writers, frames)  # Drops the closed connections from `writers`
+        await self.drain_all(writers)
+        self.stop_game(lobby, replay=True)
+
+    def stop_game(self, lobby=None, replay=False):
+        """
+        Closes the client connections of a lobby, or of every lobby when none is given, and
+        forgets the finished games. A finished lobby is also dropped from the checkpoint, while
+        stopping every lobby at shutdown leaves the checkpoint for the next start to resume.
+        With `replay`, the connections of framed clients are kept open for them to ask for another game.
+        """
+        finished = lobby is not None
+        lobbies = [lobby] if lobby else self.scheduler.all_lobbies()
+        for lobby in lobbies:
+            for token in lobby.expected:
+                self.sessions.pop(token, None)
+            for player in lobby.clients:
+                writer = player.connection
+                self.clients.remove(player)
+                reader = self.readers.pop(writer, None)
+                decoder = self.decoders.pop(writer, None)
+                if replay and decoder is not None and not writer.is_closing():
+                    waiter = asyncio.create_task(self.await_replay(reader, writer, decoder, player.address, player.name))
+                    self.games.add(waiter)
+                    waiter.add_done_callback(self.games.discard)
+                    continue
+                try:
+                    writer.close()
+                except Exception as e:
+                    self.logger.log('close_failed', f"\033[31mError closing client socket: {e}\033[00m", error=str(e))
+            self.metrics.connected_players.dec(len(lobby.clients))
+            self.scheduler.finish(lobby)
+            self.logger.log('game_over', f"Game over in lobby {lobby.lobby_id}.", lobby=lobby.lobby_id)
+        if finished:
+            self.save_checkpoint()
+
+    async def await_replay(self, reader, writer, decoder, address, client_name):
+        """
+        Waits up to `replay_timeout` seconds for a framed client to send REPLAY after its game,
+        then puts it in the filling lobby on the same connection, sparing it a new connection and
+        handshake. The connection is closed if the client leaves or stays silent.
+        """
+        try:
+            while True:
+                data = await asyncio.wait_for(reader.read(1024), self.replay_timeout)
+                if not data:
+                    break
+                if any(message_type == REPLAY for message_type, _ in decoder.feed(data)):
+                    self.readers[writer] = reader
+                    self.decoders[writer] = decoder
+                    self.metrics.connections_reused.inc()
+                    self.register_client(writer, address, client_name)
+                    return
+        except (asyncio.TimeoutError, ConnectionError, ProtocolError):
+            pass
+        writer.close()
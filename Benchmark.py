@@ -0,0 +1,213 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import socket
+import sys
+import time
+import tracemalloc
+
+from Broadcast import OutboundBuffer
+from Game_Log import GameLog
+from Players import ActiveSet
+from Trivia import TriviaServer
+
+ANSWERS = ['1', '0', 'Y', 'n', 'true', None]
+
+
+class BenchServer(TriviaServer):
+    """
+    A TriviaServer listening on the loopback interface, so benchmarks run offline.
+    """
+
+    def get_server_ip(self):
+        return '127.0.0.1'
+
+
+class FakeClients:
+    """
+    Connected socket pairs standing in for players. The server side is registered with the
+    server like an accepted client by `register`, the peer side is drained between measurements.
+    """
+
+    def __init__(self, server, players, transport):
+        self.server = server
+        self.sockets = []
+        self.peers = []
+        listener = None
+        if transport == 'loopback':
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(socket.SOMAXCONN)
+        for i in range(players):
+            if listener:
+                peer = socket.create_connection(listener.getsockname())
+                client_socket, _ = listener.accept()
+            else:
+                client_socket, peer = socket.socketpair()
+            client_socket.setblocking(False)
+            peer.setblocking(False)
+            self.sockets.append(client_socket)
+            self.peers.append(peer)
+        if listener:
+            listener.close()
+
+    def register(self, index):
+        """
+        Registers the server side of a player with the server.
+        """
+        client_socket = self.sockets[index]
+        self.server.clients.add(client_socket, ('127.0.0.1', index), f"player{index}")
+        self.server.outbound[client_socket] = OutboundBuffer(client_socket)
+
+    def drain(self):
+        """
+        Reads and discards everything the server sent to the players.
+        """
+        for peer in self.peers:
+            try:
+                while peer.recv(65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        self.server.stop_game()
+        for peer in self.peers:
+            peer.close()
+
+
+class PhaseTimer:
+    """
+    Accumulates the time and, optionally, the peak traced allocation of each benchmarked phase.
+    """
+
+    def __init__(self, allocations):
+        self.allocations = allocations
+        self.times = {}
+        self.peaks = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.allocations:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter_ns()
+        yield
+        elapsed = time.perf_counter_ns() - start
+        self.times[name] = self.times.get(name, 0) + elapsed
+        if self.allocations:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+
+def run_case(players, rounds, transport, allocations):
+    """
+    Benchmarks one (players, rounds) combination and returns a result row per phase.
+    """
+    # The server logs every step; keep the cost of logging but discard the output
+    server = BenchServer(logger=GameLog(stream=open(os.devnull, 'w')))
+    clients = FakeClients(server, players, transport)
+    timer = PhaseTimer(allocations)
+    for index in range(players):
+        with timer.phase('register_player'):
+            clients.register(index)
+    sockets = list(clients.sockets)
+    client_names = ActiveSet.of(server.clients)
+
+    for name in client_names.values():
+        with timer.phase('update_player_activity'):
+            server.update_player_activity(name)
+
+    for round_num in range(1, rounds + 1):
+        active_clients = ActiveSet(client_names)
+        question_text, correct_answer = server.pick_question()
+
+        with timer.phase('build_round_message'):
+            message = server.build_round_message(round_num, question_text, client_names)
+        with timer.phase('send_message_to_all'):
+            server.send_message_to_all(message, active_clients)
+        clients.drain()
+
+        responses = {client_socket: random.choice(ANSWERS) for client_socket in active_clients}
+        with timer.phase('normalize_response'):
+            for response in responses.values():
+                if response is not None:
+                    server.normalize_response(response)
+        with timer.phase('determine_round_results'):
+            correct, incorrect, missing = server.determine_round_results(responses, correct_answer, client_names)
+        with timer.phase('update_active_clients'):
+            server.update_active_clients(correct, incorrect, missing, active_clients, client_names)
+        clients.drain()
+
+        winner = client_names[random.choice(sockets)]
+        with timer.phase('update_player_wins'):
+            server.update_player_wins(winner)
+        with timer.phase('send_most_active_players_stats'):
+            server.send_most_active_players_stats()
+        with timer.phase('send_most_wins_stats'):
+            server.send_most_wins_stats()
+
+    clients.close()
+    server.logger.close()
+    rows = []
+    for phase, total in timer.times.items():
+        calls = players if phase in ('register_player', 'update_player_activity') else rounds
+        row = {'players': players, 'rounds': rounds, 'transport': transport, 'phase': phase,
+               'total_ms': round(total / 1e6, 4), 'per_call_us': round(total / calls / 1e3, 4),
+               'per_player_ns': round(total / calls / players, 2)}
+        if allocations:
+            row['peak_alloc_bytes'] = timer.peaks[phase]
+        rows.append(row)
+    return rows
+
+
+def compare(old_path, new_results):
+    """
+    Prints the time ratio of every phase against a previous results file.
+    """
+    with open(old_path) as old_file:
+        old = {(row['players'], row['rounds'], row['transport'], row['phase']): row
+               for row in json.load(old_file)['results']}
+    print(f"{'players':>8} {'rounds':>7} {'phase':<32} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for row in new_results:
+        key = (row['players'], row['rounds'], row['transport'], row['phase'])
+        if key in old and old[key]['total_ms']:
+            ratio = row['total_ms'] / old[key]['total_ms']
+            print(f"{row['players']:>8} {row['rounds']:>7} {row['phase']:<32} "
+                  f"{old[key]['total_ms']:>10.3f} {row['total_ms']:>10.3f} {ratio:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the trivia server hot paths")
+    parser.add_argument('--players', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10])
+    parser.add_argument('--transport', choices=['socketpair', 'loopback'], default='socketpair')
+    parser.add_argument('--allocations', action='store_true', help="also record peak allocations per phase")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="write the results as JSON to this file")
+    parser.add_argument('--compare', default=None, help="compare against a previous JSON results file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.allocations:
+        tracemalloc.start()
+
+    results = []
+    for players in args.players:
+        for rounds in args.rounds:
+            results.extend(run_case(players, rounds, args.transport, args.allocations))
+
+    print(f"{'players':>8} {'rounds':>7} {'phase':<32} {'total ms':>10} {'us/call':>10} {'ns/player':>10}")
+    for row in results:
+        print(f"{row['players']:>8} {row['rounds']:>7} {row['phase']:<32} "
+              f"{row['total_ms']:>10.3f} {row['per_call_us']:>10.3f} {row['per_player_ns']:>10.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'python': sys.version.split()[0], 'platform': platform.platform(),
+                       'seed': args.seed, 'results': results}, output_file, indent=2)
+    if args.compare:
+        compare(args.compare, results)
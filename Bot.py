@@ -1,5 +1,7 @@
 import random
+from Client_Input import ImmediateInput
 from Client_Side import TriviaClient
+from Discovery import DiscoveryCache
 
 
 class BotManager:
@@ -21,10 +23,12 @@ class BotManager:
 
     def generate_bot_name(self):
         """
-        Generate a random number and make sure it's unique
+        Generate a random number and make sure it's unique. The range grows with the number of
+        bots in use, so there is no cap on how many bots one process can name.
         """
+        upper = max(9999, 2 * len(self.existing_bot_numbers))
         while True:
-            bot_number = random.randint(1, 9999)  # You can adjust the range as needed
+            bot_number = random.randint(1, upper)
             if bot_number not in self.existing_bot_numbers:
                 self.existing_bot_numbers.add(bot_number)
                 return f"bot{bot_number}"
@@ -46,6 +50,10 @@ class TriviaBot(TriviaClient):
         bot_manager = BotManager.get_instance()
         bot_name = bot_manager.generate_bot_name()
         super().__init__(bot_name)
+        self.input = ImmediateInput(self.get_answer)
+        if self.discovery is None:
+            # Without a discovery daemon on the host, the bots of a process share one offer listener
+            self.discovery = DiscoveryCache.get_instance()
 
     def cleanup(self):
         """
@@ -58,6 +66,7 @@ class TriviaBot(TriviaClient):
     def game_mode(self):
         """
         Starts the bot's game mode, handling questions and sending responses.
+        Returns True when the game ended, False when the connection to the server was lost.
         """
         print(f"{self.player_name} started game mode. Waiting for questions...\n")
         loser = 0
@@ -73,23 +82,29 @@ class TriviaBot(TriviaClient):
                         loser = 1
                     if 'Congratulations' in message:
                         print(message)
-                        break  # Exit the loop and finish the game
+                        return True  # Finish the game
 
                     print(message)
                     if "Here's your question:" in message or "Round" in message:
-                        ans = self.generate_random_answer()
-                        print(f'Bot {self.player_name} answer: {ans}\n')
+                        ans = self.get_answer()
                         self.tcp_socket.sendall(ans.encode('utf-8'))
                         # Set timeout as required
 
                 except Exception as e:
                     print("Server crushed, trying to find new server...")
-                    self.cleanup()
-                    self.run()
+                    return False
 
         finally:
             self.cleanup()
 
+    def get_answer(self):
+        """
+        Answers the current question at random.
+        """
+        ans = self.generate_random_answer()
+        print(f'Bot {self.player_name} answer: {ans}\n')
+        return ans
+
     def generate_random_answer(self):
         """
         Bot randomly chooses '1' or '0'
@@ -0,0 +1,140 @@
+import os
+import selectors
+import time
+from collections import deque
+from itertools import islice
+
+# Upper bound on the buffers passed to a single sendmsg call
+try:
+    IOV_MAX = min(os.sysconf('SC_IOV_MAX'), 1024)
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16
+
+# A client with more queued bytes than the high watermark is lagging: nothing more is queued for
+# it until its queue drains below the low watermark
+HIGH_WATERMARK = 64 * 1024
+LOW_WATERMARK = 16 * 1024
+
+
+class OutboundBuffer:
+    """
+    The queue of outgoing data of one non-blocking client socket. Messages are queued as
+    memoryviews of buffers shared by every recipient and flushed with a single scatter-gather
+    sendmsg call, however many messages are waiting.
+
+    The queue is bounded: once it holds more than `high_watermark` bytes the client is lagging
+    and further messages are refused, until flushing brings the queue down to `low_watermark`.
+
+    Attributes:
+        sock (socket.socket): The non-blocking client socket.
+        pending (deque): The queued memoryviews, oldest first.
+        pending_bytes (int): Number of queued bytes not yet handed to the kernel.
+        high_watermark (int): Queued bytes above which the client is lagging.
+        low_watermark (int): Queued bytes at which a lagging client catches up again.
+        lagging (bool): The queue went over the high watermark and has not drained since.
+    """
+
+    def __init__(self, sock, high_watermark=HIGH_WATERMARK, low_watermark=LOW_WATERMARK):
+        self.sock = sock
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.lagging = False
+
+    def queue(self, view):
+        """
+        Queues a memoryview for sending. The view is shared, not copied.
+        Returns False when the client is lagging and the view was dropped.
+        """
+        if self.lagging:
+            return False
+        self.pending.append(view)
+        self.pending_bytes += len(view)
+        if self.pending_bytes > self.high_watermark:
+            self.lagging = True
+        return True
+
+    def flush(self):
+        """
+        Sends as much queued data as the socket accepts without blocking.
+        Returns True once the queue is empty. Socket errors are raised to the caller.
+        """
+        while self.pending:
+            try:
+                sent = self.sock.sendmsg(list(islice(self.pending, IOV_MAX)))
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.pending_bytes -= sent
+            if self.pending_bytes <= self.low_watermark:
+                self.lagging = False
+            while sent:
+                head = self.pending[0]
+                if len(head) <= sent:
+                    sent -= len(head)
+                    self.pending.popleft()
+                else:
+                    self.pending[0] = head[sent:]
+                    sent = 0
+        return True
+
+    def clear(self):
+        """
+        Drops all queued data.
+        """
+        self.pending.clear()
+        self.pending_bytes = 0
+        self.lagging = False
+
+
+def broadcast(data, buffers, timeout=0):
+    """
+    Queues `data` on every buffer and flushes them. The data is wrapped in a single memoryview,
+    so each recipient only costs a queue append and its share of a sendmsg call.
+    Returns (the buffers whose socket failed, the buffers of lagging clients). The lagging ones
+    include every buffer that refused the data, even if it drained while flushing, since that
+    client will never receive this message.
+    """
+    view = memoryview(data)
+    refused = [buffer for buffer in buffers if not buffer.queue(view)]
+    failed, lagging = flush_all(buffers, timeout)
+    lagging += [buffer for buffer in refused if buffer not in lagging and buffer not in failed]
+    return failed, lagging
+
+
+def flush_all(buffers, timeout=0):
+    """
+    Flushes every buffer without blocking. With a `timeout`, waits up to that many seconds for
+    sockets with a full send window to become writable. Data still queued at the end stays queued
+    for the next flush. Returns (the buffers whose socket failed, the buffers of lagging clients).
+    """
+    failed = []
+    waiting = []
+    for buffer in buffers:
+        try:
+            if not buffer.flush():
+                waiting.append(buffer)
+        except OSError:
+            failed.append(buffer)
+
+    if waiting and timeout > 0:
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            for buffer in waiting:
+                selector.register(buffer.sock, selectors.EVENT_WRITE, buffer)
+            writable = list(waiting)
+            while writable:
+                time_left = deadline - time.monotonic()
+                if time_left <= 0:
+                    break
+                for key, _ in selector.select(time_left):
+                    buffer = key.data
+                    try:
+                        done = buffer.flush()
+                    except OSError:
+                        failed.append(buffer)
+                        done = True
+                    if done:
+                        selector.unregister(buffer.sock)
+                        writable.remove(buffer)
+    return failed, [buffer for buffer in waiting if buffer.lagging and buffer not in failed]
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CheckpointStore:
+    """
+    Snapshots of the running games in a JSON file. Every save replaces the whole file
+    atomically (write to a temporary file, fsync, rename), so a crash leaves either the previous
+    or the new checkpoint on disk, never a torn one. Saves run in order on a single background
+    thread so the event loop never waits for the disk.
+
+    Attributes:
+        path (str): Path of the checkpoint file.
+        executor (ThreadPoolExecutor): The single thread writing the checkpoints.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def save(self, lobbies):
+        """
+        Writes the snapshots of the running lobbies.
+        """
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump({'saved_at': time.time(), 'lobbies': lobbies}, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.path)
+
+    def save_later(self, lobbies):
+        """
+        Queues a save on the writer thread.
+        """
+        self.executor.submit(self.save, lobbies)
+
+    def load(self, max_age):
+        """
+        Returns the lobby snapshots of the checkpoint, or an empty list when there is none or it
+        is older than `max_age` seconds (its players have stopped waiting by then).
+        """
+        try:
+            with open(self.path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return []
+        if time.time() - checkpoint.get('saved_at', 0) > max_age:
+            return []
+        return checkpoint.get('lobbies', [])
+
+    def close(self):
+        """
+        Waits for the queued saves to be written.
+        """
+        self.executor.shutdown(wait=True)
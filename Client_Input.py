@@ -1,52 +1,109 @@
-import tkinter as tk
-from tkinter import simpledialog
+import os
+import sys
+import time
+
+try:
+    import tkinter as tk
+except ImportError:  # Python built without Tk, only the terminal input is available
+    tk = None
+
+PROMPT = "Enter your answer (True/False):"
 
 
 class Client_Input:
+    """
+    A long-lived answer window. The Tk root is created once and shown for every question
+    instead of being built and destroyed per question, and it never blocks: the client's event
+    loop calls poll() between socket reads to run the window and collect the answer.
+
+    Attributes:
+        poll_interval (float): Seconds between poll() calls while a question is open.
+        user_input (str): The answer submitted for the open question, until it is polled.
+        deadline (float): When the open question closes, on the monotonic clock, or None.
+    """
+
+    poll_interval = 0.05
+
     def __init__(self):
         self.main_window = tk.Tk()
-        self.main_window.withdraw()  # Main window is hidden.
+        self.main_window.title("Trivia")
+        self.main_window.protocol("WM_DELETE_WINDOW", self.cancel)  # Closing the window skips the question
+        tk.Label(self.main_window, text=PROMPT).pack(padx=10, pady=(10, 0))
+        self.entry = tk.Entry(self.main_window)
+        self.entry.pack(padx=10, pady=5)
+        self.entry.bind('<Return>', self.submit)
+        self.countdown = tk.Label(self.main_window)
+        self.countdown.pack(padx=10, pady=(0, 10))
+        self.main_window.withdraw()  # Hidden until the first question
         self.user_input = None
-        self.timer_id = None
+        self.deadline = None
 
-    def execute(self):
+    def fileno(self):
         """
-        Prompts the user for input with a 10-second timeout. Shows a dialog for the user to enter
-        an answer and sets `user_input` based on the response. Cancels the timeout if input is received.
-
+        The window is polled, it has no file descriptor to select on.
         """
-        self.timer_id = self.main_window.after(10000, self.handle_timeout)
-        user_response = simpledialog.askstring("Input", "Enter your answer (True/False):", parent=self.main_window)
+        return None
 
-        if self.timer_id:
-            self.main_window.after_cancel(self.timer_id)
-            self.timer_id = None
+    def ask(self, deadline):
+        """
+        Opens a question until `deadline`. Answers arrive through poll().
+        """
+        self.deadline = deadline
+        self.user_input = None
+        self.entry.delete(0, tk.END)
+        self.main_window.deiconify()
+        self.entry.focus_force()
+        return None
 
-        if user_response:
-            self.user_input = user_response
+    def submit(self, event=None):
+        """
+        Takes the entered text as the answer to the open question.
+        """
+        if self.deadline is not None:
+            self.user_input = self.entry.get().strip() or None
 
-        self.terminate()
-        return self.user_input
+    def poll(self):
+        """
+        Runs the window's pending events and returns the submitted answer, or None.
+        """
+        if self.deadline is not None:
+            self.countdown.config(text=f"{max(self.deadline - time.monotonic(), 0):.0f} seconds left")
+        try:
+            self.main_window.update()
+        except tk.TclError:
+            return None  # The window was destroyed
+        answer, self.user_input = self.user_input, None
+        if answer is not None:
+            self.cancel()
+        return answer
 
-    def handle_timeout(self):
+    def cancel(self):
         """
-        Handles timeout for user input. Sets `user_input` to None and terminates the session if no
-        input is received within the timeout.
+        Closes the open question and hides the window.
         """
+        self.deadline = None
         try:
-            if self.main_window.winfo_exists():
-                self.user_input = None  # Indicates absence of input
-                self.terminate()
+            self.main_window.withdraw()
         except tk.TclError:
-            print("Window session ended.")  # User-friendly message
+            pass
+
+    def execute(self, timeout=10):
+        """
+        Asks a single question and waits up to `timeout` seconds for the answer. Returns None if the time ran out.
+        """
+        deadline = time.monotonic() + timeout
+        self.ask(deadline)
+        answer = None
+        while answer is None and time.monotonic() < deadline:
+            answer = self.poll()
+            time.sleep(self.poll_interval)
+        self.cancel()
+        return answer
 
     def terminate(self):
         """
-        Terminates the session. Cancels any remaining timers and closes the main window if it exists.
+        Closes the window for good.
         """
-        if self.timer_id:
-            self.main_window.after_cancel(self.timer_id)
-            self.timer_id = None
         try:
             if self.main_window.winfo_exists():
                 self.main_window.destroy()
@@ -54,7 +111,111 @@ class Client_Input:
             pass  # Exception ignored as the window is already closed
 
 
+class TerminalInput:
+    """
+    Reads answers from the terminal without blocking. Standard input is selected on by the
+    client's event loop next to the server socket, and the first line typed while a question is
+    open is its answer; lines typed between questions are discarded.
+
+    Attributes:
+        fd (int): The file descriptor answers are read from, None once it reached end of file.
+        deadline (float): When the open question closes, on the monotonic clock, or None.
+    """
+
+    poll_interval = None  # Woken up by the selector
+
+    def __init__(self, fd=None):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.buffer = b''
+        self.deadline = None
+
+    def fileno(self):
+        return self.fd
+
+    def ask(self, deadline):
+        """
+        Opens a question until `deadline` and shows the prompt.
+        """
+        self.deadline = deadline
+        print(PROMPT, end=' ', flush=True)
+        return None
+
+    def poll(self):
+        """
+        Reads the available input and returns the answer to the open question, or None.
+        """
+        data = os.read(self.fd, 1024)
+        if not data:
+            self.fd = None  # End of input, questions time out from now on
+            return None
+        self.buffer += data
+        answer = None
+        while b'\n' in self.buffer:
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            if self.deadline is not None and answer is None:
+                answer = line.decode(errors='replace').strip() or None
+        if answer is not None:
+            self.cancel()
+        return answer
+
+    def cancel(self):
+        """
+        Closes the open question.
+        """
+        self.deadline = None
+
+    def terminate(self):
+        pass
+
+
+class ImmediateInput:
+    """
+    Answers every question as soon as it is asked with the answer of a function, for bots.
+    """
+
+    poll_interval = None
+
+    def __init__(self, answer):
+        self.answer = answer
+
+    def fileno(self):
+        return None
+
+    def ask(self, deadline):
+        return self.answer()
+
+    def poll(self):
+        return None
+
+    def cancel(self):
+        pass
+
+    def terminate(self):
+        pass
+
+
+def open_input(mode=None):
+    """
+    Returns the answer input for `mode`: 'dialog' for the answer window, 'terminal' for standard
+    input, or None for the window when a display is available and the terminal otherwise.
+    """
+    if mode == 'terminal':
+        return TerminalInput()
+    if mode == 'dialog':
+        return Client_Input()
+    if tk is not None:
+        try:
+            return Client_Input()
+        except tk.TclError:  # No display
+            pass
+    return TerminalInput()
+
+
 if __name__ == "__main__":
-    dialog = Client_Input()
-    result = dialog.execute()
-    print(f"Received input: {result}")
\ No newline at end of file
+    dialog = open_input()
+    if isinstance(dialog, Client_Input):
+        result = dialog.execute()
+    else:
+        print(PROMPT)
+        result = sys.stdin.readline().strip() or None
+    print(f"Received input: {result}")
@@ -1,39 +1,151 @@
+import selectors
 import socket
 import struct
-from Client_Input import Client_Input
+import time
+from Client_Input import open_input
+from Connection_Manager import ConnectionManager
+from Discovery import local_discovery
+from Offers import MULTICAST_GROUP, decode_offer, offer_rank, open_offer_listener, join_offer_group
+from Protocol import (LEGACY_VERSION, WELCOME, QUESTION, ANSWER, GAME_OVER, SESSION, REPLAY, RESUME_REJECTED, FRAME_HEADER,
+                      WELCOME_PAYLOAD, FrameDecoder, ProtocolError, SessionRejected, decode_question, encode_frame,
+                      encode_hello, encode_resume, parse_header)
 
 
 class TriviaClient:
-    def __init__(self, player_name):
+    def __init__(self, player_name, framed=True, input_mode=None):
         self.player_name = player_name
         self.udp_port = 13117
+        self.offer_group = MULTICAST_GROUP  # Multicast group of the extended offers, joined when it can be
+        self.offer_window = 1.0  # Seconds to keep collecting offers after the first one
+        self.discovery = local_discovery(self.udp_port)  # Offers seen by a listener shared on this host, if one runs
         self.tcp_socket = None
+        self.framed = framed  # Ask the server for the length-prefixed protocol
+        self.protocol_version = LEGACY_VERSION
+        self.decoder = None
+        self.handshake_timeout = 2
+        self.server_address = None
+        self.session_token = None  # Given by servers that can resume a game after a restart
+        self.resume_grace = 30  # Seconds to keep trying to rejoin the game
+        self.connections = ConnectionManager()
+        self.input_mode = input_mode  # 'dialog', 'terminal' or None to pick the window when there is a display
+        self.input = None  # Opened at the first game and kept for the following ones
+        self.selector = None
+        self.input_fd = None
+        self.answer_timeout = 10  # Seconds the server waits for answers
+        self.answer_deadline = None  # When the open question closes, on the monotonic clock
+        self.replay_requested = False  # Asked for the next game on the connection of the last one
 
-    def run(self):
+    def run(self, games=1):
         """
-        Listens for server offers and connects to the server, then starts game mode.
+        Plays `games` games, or keeps playing when it is None. Connects to a known server or to the
+        best offer, plays, and after a lost connection reconnects with a growing delay. Between
+        games on the framed protocol the connection is kept and the server puts the player
+        straight into its next lobby.
 
         """
-        server_ip, server_port = self.listen_for_offers()  # blocking
-        if self.connect_to_server(server_ip, server_port):
-            self.game_mode()
+        played = 0
+        attempt = 0
+        while games is None or played < games:
+            if self.tcp_socket is None and not self.connect():
+                finished = False
+            else:
+                keep_alive = games is None or played + 1 < games
+                if self.protocol_version != LEGACY_VERSION:
+                    finished = self.framed_game_mode(keep_alive)
+                else:
+                    finished = self.game_mode()
+            if finished is None:
+                continue  # The server ended the connection after a game, look for the next one at once
+            if finished:
+                played += 1
+                attempt = 0
+                continue
+            delay = self.connections.backoff(attempt)
+            attempt += 1
+            print(f"Reconnecting in {delay:.1f} seconds...")
+            time.sleep(delay)
 
-    def listen_for_offers(self):
+    def connect(self):
         """
-         Listens for UDP offers from the server and returns server IP and port.
+        Connects to the server of the last game or another recently offered server, and listens
+        for offers when none of them can be reached. Returns True once connected.
 
         """
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as udp_socket:
-            udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            udp_socket.bind(("", self.udp_port))
+        for server_ip, server_port in self.connections.candidates():
+            if self.connect_to_server(server_ip, server_port):
+                return True
+        offer = self.listen_for_offers()  # blocking
+        return offer is not None and self.connect_to_server(*offer)
+
+    def listen_for_offers(self, timeout=None):
+        """
+         Listens for UDP offers and returns the IP and port of the least-loaded server, or None if no
+         offer arrived within `timeout` seconds.
+
+         Offers are collected for `offer_window` seconds after the first one. Extended offers, which
+         carry each server's open slots and players, are preferred; a server sending only the
+         original offer is picked when no extended offer arrived.
+
+         With a shared `discovery` listener, the servers it saw recently are used right away and
+         the client only listens on its own when the listener cannot be reached.
+
+        """
+        if self.discovery is not None:
+            servers = self.discovery.lookup(timeout, self.offer_window)
+            if servers is not None:
+                return self.choose_offer(servers)
+
+        with open_offer_listener(self.udp_port) as udp_socket, open_offer_listener(self.udp_port + 1) as extended_socket:
+            join_offer_group(extended_socket, self.offer_group)
+            selector = selectors.DefaultSelector()
+            selector.register(udp_socket, selectors.EVENT_READ)
+            selector.register(extended_socket, selectors.EVENT_READ)
             print("Client started, listening for offer requests...")
-            while True:
-                data, addr = udp_socket.recvfrom(1024)  # blocking operation; addr is a (host, udp port) tuple
-                magic_cookie, message_type, server_name, server_port = struct.unpack('!Ib32sH', data)
-                if magic_cookie == 0xabcddcba and message_type == 0x2:
-                    print(f"Received offer from server: {addr},server port:{server_port} , attempting to connect...")
-                    return addr[0], server_port
+            deadline = None if timeout is None else time.monotonic() + timeout
+            window_end = None
+            servers = {}  # (ip, port) -> (open slots, players, lobby id), or None for an original offer
+            with selector:
+                while True:
+                    ends = [end for end in (deadline, window_end) if end is not None]
+                    wait = min(ends) - time.monotonic() if ends else None
+                    if wait is not None and wait <= 0:
+                        break
+                    for key, _ in selector.select(wait):
+                        data, addr = key.fileobj.recvfrom(1024)  # addr is a (host, udp port) tuple
+                        offer = decode_offer(data, addr)
+                        if offer is None:
+                            continue
+                        server_ip, server_port, load = offer
+                        if load is not None or (server_ip, server_port) not in servers:
+                            servers[(server_ip, server_port)] = load
+                        if window_end is None:
+                            window_end = time.monotonic() + self.offer_window
+            return self.choose_offer([(address, load, 0.0) for address, load in servers.items()])
+
+    def choose_offer(self, servers):
+        """
+         Records the offered servers, given as (address, load, age) with load None for an original
+         offer, and returns the least-loaded one. A server sending only the original offer is
+         picked when none sent an extended offer. Returns None when there is no server.
+
+        """
+        offers = {}  # (ip, port) -> (open slots, players, lobby id)
+        fallback = None
+        for address, load, age in servers:
+            self.connections.offer(address, load, age)
+            if load is not None:
+                offers[address] = load
+            elif fallback is None:
+                fallback = address
+        if offers:
+            server = min(offers, key=lambda address: offer_rank(offers[address]))
+            open_slots, players, lobby_id = offers[server]
+            print(f"Received offers from {len(offers)} server(s), joining {server[0]}:{server[1]} "
+                  f"(lobby {lobby_id}, {players} players), attempting to connect...")
+            return server
+        if fallback:
+            print(f"Received offer from server: {fallback[0]},server port:{fallback[1]} , attempting to connect...")
+        return fallback
 
     def connect_to_server(self, server_ip, server_port):
         """
@@ -48,16 +160,24 @@ class TriviaClient:
             self.tcp_socket.settimeout(10)
 
             # Attempt to establish a TCP connection to the server
+            started = time.perf_counter()
             self.tcp_socket.connect((server_ip, server_port))  # blocking operation
+            rtt = time.perf_counter() - started
+            self.connections.connected((server_ip, server_port), rtt)
+            self.server_address = (server_ip, server_port)
 
-            # Send the player's name followed by a newline character to the server
-            self.tcp_socket.sendall(f"{self.player_name}\n".encode())
+            if self.framed and self.connections.speaks_frames((server_ip, server_port)):
+                self.protocol_version = self.negotiate_protocol(server_ip, server_port)
+            else:
+                self.protocol_version = LEGACY_VERSION
+                # Send the player's name followed by a newline character to the server
+                self.tcp_socket.sendall(f"{self.player_name}\n".encode())
 
             # Reset the timeout to None (blocking mode) or another value, as needed for the game_mode logic
             self.tcp_socket.settimeout(None)
 
             # If reached here, the connection and initial data send were successful
-            print("Connected to the server successfully.\n")
+            print(f"Connected to the server successfully ({rtt * 1000:.1f} ms).\n")
             return True
         except socket.timeout:
             # Handle a timeout during the connection attempt
@@ -75,8 +195,167 @@ class TriviaClient:
 
         # Close the socket if it exists and clear the reference to it
         self.cleanup()
+        self.connections.failed((server_ip, server_port))
         return False  # Indicate that the connection attempt was unsuccessful
 
+    def negotiate_protocol(self, server_ip, server_port):
+        """
+        Sends the protocol hello and waits for the server's welcome frame. Servers that do not
+        answer in time only know the legacy protocol, so the client reconnects and sends its bare name.
+        Such a server already registered the hello as a player who never answers, so the servers
+        ConnectionManager.speaks_frames rules out are not probed.
+        Returns the protocol version to use for the connection.
+        """
+        self.tcp_socket.sendall(encode_hello(self.player_name))
+        self.decoder = FrameDecoder()
+        try:
+            return self.read_welcome()
+        except (socket.timeout, ProtocolError, struct.error) as e:
+            print(f"Server does not support the framed protocol ({e}), falling back to text.")
+            self.tcp_socket.close()
+            self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.tcp_socket.settimeout(10)
+            self.tcp_socket.connect((server_ip, server_port))
+            self.tcp_socket.sendall(f"{self.player_name}\n".encode())
+            return LEGACY_VERSION
+
+    def read_welcome(self):
+        """
+        Reads the server's welcome frame and returns the protocol version it picked.
+        """
+        self.tcp_socket.settimeout(self.handshake_timeout)
+        # Read exactly the welcome frame, anything after it belongs to the game
+        welcome_size = FRAME_HEADER.size + WELCOME_PAYLOAD.size
+        data = self.tcp_socket.recv(welcome_size, socket.MSG_WAITALL)
+        if len(data) >= FRAME_HEADER.size and parse_header(data[:FRAME_HEADER.size])[0] == RESUME_REJECTED:
+            raise SessionRejected("The server does not know the session")
+        if len(data) < welcome_size:
+            raise ProtocolError("Connection closed during the handshake")
+        message_type, length = parse_header(data[:FRAME_HEADER.size])
+        payload = data[FRAME_HEADER.size:]
+        if message_type != WELCOME or length != WELCOME_PAYLOAD.size:
+            raise ProtocolError(f"Expected a welcome frame, got type {message_type}")
+        (version,) = WELCOME_PAYLOAD.unpack(payload)
+        return version
+
+    def resume_session(self):
+        """
+        Tries to rejoin the game with the session token for up to `resume_grace` seconds, at the
+        server's last address and at the address of the latest offer. Only failed connections are
+        retried: a server rejecting the session ends the attempt at once.
+        Returns True once the server took the player back.
+        """
+        deadline = time.monotonic() + self.resume_grace
+        last_address = self.server_address
+        offer = None
+        try:
+            while time.monotonic() < deadline:
+                for address in (last_address, offer):
+                    if address and self.try_resume(*address):
+                        return True
+                time.sleep(min(1, max(deadline - time.monotonic(), 0)))
+                offer = self.listen_for_offers(timeout=max(deadline - time.monotonic(), 0.1))
+        except SessionRejected:
+            print("The server no longer runs this game.")
+        return False
+
+    def try_resume(self, server_ip, server_port):
+        """
+        Presents the session token to a server. Returns True if the server resumed the session,
+        False if it could not be reached, and raises SessionRejected if it does not know the session.
+        """
+        try:
+            self.tcp_socket = socket.create_connection((server_ip, server_port), timeout=self.handshake_timeout)
+            self.tcp_socket.sendall(encode_resume(self.session_token))
+            self.read_welcome()
+        except SessionRejected:
+            self.cleanup()
+            raise
+        except (OSError, ProtocolError, struct.error):
+            self.cleanup()
+            return False
+        self.tcp_socket.settimeout(None)
+        self.server_address = (server_ip, server_port)
+        self.decoder = FrameDecoder()
+        return True
+
+    def request_replay(self):
+        """
+        Asks the server for the next game on the current connection. Returns True if the request was sent.
+        """
+        try:
+            self.tcp_socket.sendall(encode_frame(REPLAY))
+        except OSError:
+            return False
+        return True
+
+    def watch_server(self):
+        """
+        Opens the answer input on first use and selects on the server socket and the input together.
+        """
+        if self.input is None:
+            self.input = open_input(self.input_mode)
+        if self.selector:
+            self.selector.close()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.tcp_socket, selectors.EVENT_READ, 'server')
+        self.input_fd = self.input.fileno()
+        if self.input_fd is not None:
+            self.selector.register(self.input_fd, selectors.EVENT_READ, 'input')
+        self.answer_deadline = None
+
+    def ask_question(self):
+        """
+        Opens the answer input for the question that just arrived. The deadline is the server's
+        answer time counted from the arrival of the question, less half the connect round trip
+        the question spent on the way.
+        """
+        self.close_question()
+        self.answer_deadline = time.monotonic() + self.answer_timeout - self.connections.rtt(self.server_address) / 2
+        ans = self.input.ask(self.answer_deadline)
+        if ans is not None:
+            self.send_answer(ans)
+
+    def close_question(self):
+        if self.answer_deadline is not None:
+            self.input.cancel()
+            self.answer_deadline = None
+
+    def send_answer(self, ans):
+        """
+        Sends the answer to the open question and closes it.
+        """
+        self.answer_deadline = None
+        if self.protocol_version != LEGACY_VERSION:
+            self.tcp_socket.sendall(encode_frame(ANSWER, ans.encode('utf-8')))
+        else:
+            self.tcp_socket.sendall(ans.encode('utf-8'))
+
+    def wait_for_server(self):
+        """
+        Waits until the server socket has data. Meanwhile the player's answer to the open
+        question is sent as soon as it is given, and the question closes when its time is up.
+        """
+        while True:
+            timeout = self.input.poll_interval if self.answer_deadline is not None else None
+            if self.answer_deadline is not None:
+                time_left = max(self.answer_deadline - time.monotonic(), 0)
+                timeout = time_left if timeout is None else min(timeout, time_left)
+            ready = {key.data for key, _ in self.selector.select(timeout)}
+            if 'input' in ready or (self.answer_deadline is not None and self.input.poll_interval):
+                ans = self.input.poll()
+                if 'input' in ready and self.input.fileno() is None:
+                    self.selector.unregister(self.input_fd)  # The input was closed
+                    self.input_fd = None
+                if ans is not None and self.answer_deadline is not None:
+                    print(f'Your answer: {ans}\n')
+                    self.send_answer(ans)
+            if self.answer_deadline is not None and time.monotonic() >= self.answer_deadline:
+                print("\033[31mTime's up! No response provided.\033[00m")
+                self.close_question()
+            if 'server' in ready:
+                return
+
     def cleanup(self):
         """
         Cleans up resources, like closing the TCP socket.
@@ -87,42 +366,104 @@ class TriviaClient:
             except Exception as e:
                 print(f"\033[31mError closing socket: {e}\033[00m")
             self.tcp_socket = None
+        self.replay_requested = False
+        if self.selector:
+            self.selector.close()
+            self.selector = None
 
     def game_mode(self):
         """
          Manages game mode, receiving and sending messages from/to the server.
+         Returns True when the game ended, False when the connection to the server was lost.
         """
         print("Game mode started. Waiting for questions...\n")
         loser = 0
+        game_over = False  # The server closes the connection after its game-over message
+        self.watch_server()
         try:
             while True:
                 try:
+                    self.wait_for_server()
                     message = self.tcp_socket.recv(1024).decode()
                     if message == "":
+                        if game_over:
+                            return True
                         raise Exception
+                    if 'Game over!' in message:
+                        game_over = True
                     if 'You have been disqualified(loser!)' in message and not loser:
                         self.tcp_socket.settimeout(None)
                         loser = 1
                     if 'Congratulations' in message or "You are the only registered player, the game is over." in message:
                         print(message)
 
-                        break  # Exit the loop and finish the game
+                        return True  # Finish the game
 
                     print(message)
                     if "Here's your question:" in message or "Round" in message:
-                        client_input = Client_Input()
-                        ans = client_input.execute()
-                        if ans is not None:
-                            print(f'Your answer: {ans}\n')
-                            self.tcp_socket.sendall(ans.encode('utf-8'))
-                        else:
-                            print("\033[31mTime's up! No response provided.\033[00m")
+                        self.ask_question()
 
                 except Exception as e:
                     print("Server crushed, trying to find new server...")
-                    self.cleanup()
-                    self.run()
+                    return False
 
         finally:
             # Ensure the socket is closed when leaving game mode
+            self.close_question()
             self.cleanup()
+
+    def framed_game_mode(self, keep_alive=False):
+        """
+        Manages game mode over the framed protocol: every frame is handled by its message type
+        instead of matching text, so split or coalesced messages are parsed correctly.
+        With `keep_alive`, the player asks for the next game at game over and the connection is kept.
+        Returns True when the game ended, False when the connection to the server was lost, and
+        None when the server closed the kept connection instead of starting the next game.
+        """
+        print("Game mode started. Waiting for questions...\n")
+        reuse_connection = False
+        self.watch_server()
+        try:
+            while True:
+                try:
+                    self.wait_for_server()
+                    data = self.tcp_socket.recv(4096)
+                    if not data and self.replay_requested:
+                        self.replay_requested = False
+                        print("The server ended the connection after the game, looking for a new game...")
+                        return None
+                    if not data:
+                        raise ConnectionError("Connection closed by the server")
+                    self.replay_requested = False
+                    for message_type, payload in self.decoder.feed(data):
+                        if message_type == QUESTION:
+                            round_num, text = decode_question(payload)
+                            print(text)
+                            self.ask_question()
+                        elif message_type == GAME_OVER:
+                            print(payload.decode())
+                            self.session_token = None
+                            if keep_alive:
+                                reuse_connection = self.replay_requested = self.request_replay()
+                            return True  # Finish the game
+                        elif message_type == SESSION:
+                            self.session_token = payload.decode()
+                        else:
+                            print(payload.decode())
+
+                except Exception as e:
+                    self.cleanup()
+                    if self.session_token:
+                        print("Lost the server, trying to rejoin the game...")
+                        if self.resume_session():
+                            self.watch_server()
+                            continue
+                        self.session_token = None
+                    print("Server crushed, trying to find new server...")
+                    return False
+
+        finally:
+            # Ensure the socket is closed when leaving game mode, unless the next game reuses it
+            self.close_question()
+            if not reuse_connection:
+                self.cleanup()
@@ -0,0 +1,48 @@
+import time
+
+
+class SystemClock:
+    """
+    The clocks of the operating system, used by a live server.
+    """
+
+    monotonic = staticmethod(time.monotonic)
+    perf_counter = staticmethod(time.perf_counter)
+    perf_counter_ns = staticmethod(time.perf_counter_ns)
+    sleep = staticmethod(time.sleep)
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock:
+    """
+    A clock that only moves when it is told to. Sleeping advances it at once, so a game timed
+    by it runs at full CPU speed while every duration it measures stays the simulated one.
+    Time is kept in integer nanoseconds, so repeated advances do not accumulate rounding errors.
+
+    Attributes:
+        now_ns (int): The current time in nanoseconds.
+    """
+
+    __slots__ = ('now_ns',)
+
+    def __init__(self, start=0.0):
+        self.now_ns = round(start * 1e9)
+
+    def monotonic(self):
+        return self.now_ns / 1e9
+
+    perf_counter = monotonic
+
+    def perf_counter_ns(self):
+        return self.now_ns
+
+    def advance(self, seconds):
+        """
+        Moves the clock `seconds` forward. Negative durations leave it where it is.
+        """
+        if seconds > 0:
+            self.now_ns += round(seconds * 1e9)
+
+    sleep = advance
@@ -0,0 +1,134 @@
+import math
+import random
+import time
+
+from Offers import offer_rank
+
+
+class KnownServer:
+    """
+    What the client has learned about one server.
+
+    Attributes:
+        address (tuple): The server's (ip, tcp port).
+        load (tuple): (open slots, players, lobby id) of its latest extended offer, or None.
+        seen_at (float): When its latest offer arrived, on the monotonic clock.
+        rtt (float): Seconds its latest TCP connect took, or None before the first connect.
+        failures (int): Connection attempts that failed in a row.
+    """
+
+    __slots__ = ('address', 'load', 'seen_at', 'rtt', 'failures')
+
+    def __init__(self, address):
+        self.address = address
+        self.load = None
+        self.seen_at = 0.0
+        self.rtt = None
+        self.failures = 0
+
+
+class ConnectionManager:
+    """
+    The client's cache of known servers. Servers are learned from offers and ranked for the next
+    connection: the server of the last game first while its latest offer is fresh, so a returning
+    player skips offer discovery, then the least-loaded servers, then the fastest to connect to. Servers failing
+    `max_failures` connects in a row are forgotten, and the delay between reconnect attempts
+    grows exponentially.
+
+    Attributes:
+        servers (dict): (ip, port) -> KnownServer.
+        last_server (tuple): Address of the server of the last game, or None.
+        max_age (float): Seconds an offer keeps a server among the candidates.
+        base_delay (float): Delay before the first reconnect attempt.
+        max_delay (float): Longest delay between reconnect attempts.
+        max_failures (int): Failed connects in a row after which a server is forgotten.
+    """
+
+    def __init__(self, max_age=5, base_delay=0.5, max_delay=10, max_failures=3):
+        self.servers = {}
+        self.last_server = None
+        self.max_age = max_age
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_failures = max_failures
+
+    def offer(self, address, load=None, age=0.0):
+        """
+        Records an offer that arrived `age` seconds ago. An original offer refreshes a server
+        without dropping the load its extended offers reported.
+        """
+        server = self.servers.get(address)
+        if server is None:
+            server = self.servers[address] = KnownServer(address)
+        if load is not None:
+            server.load = load
+        server.seen_at = max(server.seen_at, time.monotonic() - age)
+
+    def connected(self, address, rtt):
+        """
+        Records a successful connect that took `rtt` seconds.
+        """
+        server = self.servers.get(address)
+        if server is None:
+            server = self.servers[address] = KnownServer(address)
+        server.rtt = rtt
+        server.failures = 0
+        self.last_server = address
+
+    def failed(self, address):
+        """
+        Records a failed connect, forgetting the server after `max_failures` in a row.
+        """
+        server = self.servers.get(address)
+        if server is None:
+            return
+        server.failures += 1
+        if server.failures >= self.max_failures:
+            del self.servers[address]
+            if self.last_server == address:
+                self.last_server = None
+
+    def rtt(self, address):
+        """
+        Returns the latest connect time to a server in seconds, 0 when it is unknown.
+        """
+        server = self.servers.get(address)
+        return server.rtt if server and server.rtt is not None else 0.0
+
+    def speaks_frames(self, address):
+        """
+        Returns False for a server heard only through original offers: servers from before the
+        framed protocol send no extended offers, and would take the framed hello for a player
+        name. Servers known from extended offers, or not from offers at all, are probed.
+        """
+        server = self.servers.get(address)
+        return server is None or server.load is not None or not server.seen_at
+
+    def rank(self, server):
+        """
+        Sort key of a candidate server: known load before unknown, least loaded, then fastest.
+        """
+        load_rank = offer_rank(server.load) if server.load else (False, 0)
+        return server.load is None, load_rank, server.rtt if server.rtt is not None else math.inf
+
+    def candidates(self):
+        """
+        Returns the addresses worth connecting to, best first: the servers that sent an offer in
+        the last `max_age` seconds, the last server leading. A server that stopped offering may
+        be running a game, so the last server is skipped once its latest offer is older.
+        """
+        oldest = time.monotonic() - self.max_age
+        fresh = [server for server in self.servers.values()
+                 if server.seen_at >= oldest and server.address != self.last_server]
+        ranked = [server.address for server in sorted(fresh, key=self.rank)]
+        last = self.servers.get(self.last_server)
+        if last is not None and last.seen_at >= oldest:
+            ranked.insert(0, self.last_server)
+        return ranked
+
+    def backoff(self, attempt):
+        """
+        Returns the delay before reconnect attempt number `attempt` (from 0), with jitter.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import selectors
+import socket
+import socketserver
+import tempfile
+import time
+from threading import Condition, Thread
+
+from Offers import MULTICAST_GROUP, decode_offer, join_offer_group, open_offer_listener
+
+
+def socket_path(udp_port=13117):
+    """
+    Returns the path of the Unix socket the discovery daemon of an offer port answers on.
+    """
+    return os.path.join(tempfile.gettempdir(), f"trivia-discovery-{udp_port}.sock")
+
+
+class DiscoveryCache:
+    """
+    One listener for the offers of every server, shared by all the clients of a process. The
+    offer ports are bound once by a background thread that decodes each offer a single time and
+    keeps the servers it heard from, so a client started between two offers gets the recently
+    seen servers at once instead of waiting for the next offer.
+
+    Attributes:
+        udp_port (int): Port of the original offers; the extended offers arrive on the next one.
+        offer_group (str): Multicast group of the extended offers, or None.
+        max_age (float): Seconds a server stays in the cache after its latest offer.
+        servers (dict): (ip, tcp port) -> [load, seen_at], in the order the servers were first seen.
+            The load is None while only original offers came from a server.
+        changed (threading.Condition): Guards `servers` and wakes the lookups waiting for offers.
+    """
+
+    instance = None
+
+    def __init__(self, udp_port=13117, offer_group=MULTICAST_GROUP, max_age=5.0):
+        self.udp_port = udp_port
+        self.offer_group = offer_group
+        self.max_age = max_age
+        self.servers = {}
+        self.changed = Condition()
+        self.listener = None
+        if not DiscoveryCache.instance:
+            DiscoveryCache.instance = self
+
+    @staticmethod
+    def get_instance():
+        """
+        Returns the singleton instance of DiscoveryCache.
+        """
+        if not DiscoveryCache.instance:
+            DiscoveryCache()
+        return DiscoveryCache.instance
+
+    def start(self):
+        """
+        Binds the offer ports and starts listening, on the first lookup.
+        """
+        if self.listener is None:
+            sockets = [open_offer_listener(self.udp_port), open_offer_listener(self.udp_port + 1)]
+            join_offer_group(sockets[1], self.offer_group)
+            self.listener = Thread(target=self.listen, args=(sockets,), daemon=True)
+            self.listener.start()
+
+    def listen(self, sockets):
+        """
+        Records every offer arriving on the offer ports, for the lifetime of the process.
+        """
+        selector = selectors.DefaultSelector()
+        for udp_socket in sockets:
+            selector.register(udp_socket, selectors.EVENT_READ)
+        while True:
+            for key, _ in selector.select():
+                try:
+                    data, addr = key.fileobj.recvfrom(1024)
+                except OSError:
+                    continue
+                offer = decode_offer(data, addr)
+                if offer is not None:
+                    self.record(*offer)
+
+    def record(self, server_ip, server_port, load):
+        """
+        Adds or refreshes a server. An original offer keeps the load its extended offers reported.
+        """
+        with self.changed:
+            entry = self.servers.get((server_ip, server_port))
+            if entry is None:
+                self.servers[(server_ip, server_port)] = [load, time.monotonic()]
+            else:
+                if load is not None:
+                    entry[0] = load
+                entry[1] = time.monotonic()
+            self.changed.notify_all()
+
+    def fresh(self):
+        """
+        Returns the (address, load, age in seconds) of the servers heard from in the last
+        `max_age` seconds, forgetting the older ones. Must be called with `changed` held.
+        """
+        now = time.monotonic()
+        stale = [address for address, (_, seen_at) in self.servers.items() if now - seen_at > self.max_age]
+        for address in stale:
+            del self.servers[address]
+        return [(address, load, now - seen_at) for address, (load, seen_at) in self.servers.items()]
+
+    def lookup(self, timeout=None, window=1.0):
+        """
+        Returns the fresh servers as a list of (address, load, age). When none is cached, waits
+        for a first offer and keeps collecting for `window` seconds after it. Returns an empty
+        list when no offer arrived within `timeout` seconds.
+        """
+        self.start()
+        with self.changed:
+            servers = self.fresh()
+            if servers:
+                return servers
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.servers:
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    return []
+                self.changed.wait(wait)
+            window_end = time.monotonic() + window
+            while True:
+                wait = window_end - time.monotonic()
+                if wait <= 0:
+                    return self.fresh()
+                self.changed.wait(wait)
+
+
+class DiscoveryDaemon:
+    """
+    Answers the discovery lookups of the other processes of this host from a DiscoveryCache,
+    over a Unix socket. Each request is one JSON line {"timeout": ..., "window": ...}, each reply
+    one JSON line listing the servers as [ip, tcp port, load or null, age].
+    """
+
+    def __init__(self, cache, path):
+        class LookupHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline() or b'{}')
+                except ValueError:
+                    return
+                servers = cache.lookup(request.get('timeout'), request.get('window', 1.0))
+                reply = [[ip, port, load, round(age, 3)] for (ip, port), load, age in servers]
+                self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a daemon that did not exit cleanly
+        self.unix_server = socketserver.ThreadingUnixStreamServer(path, LookupHandler)
+        self.unix_server.daemon_threads = True
+        Thread(target=self.unix_server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.unix_server.shutdown()
+        self.unix_server.server_close()
+        os.unlink(self.path)
+
+
+class DiscoveryClient:
+    """
+    Looks servers up through the discovery daemon of this host. Same lookup as a DiscoveryCache,
+    returning None instead when no daemon answers, so the caller can listen for offers itself.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def lookup(self, timeout=None, window=1.0):
+        request = json.dumps({'timeout': timeout, 'window': window}).encode() + b"\n"
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as unix_socket:
+                unix_socket.connect(self.path)
+                unix_socket.sendall(request)
+                with unix_socket.makefile('rb') as reply:
+                    servers = json.loads(reply.readline())
+        except (OSError, ValueError):
+            return None
+        return [((ip, port), tuple(load) if load else None, age) for ip, port, load, age in servers]
+
+
+def local_discovery(udp_port=13117):
+    """
+    Returns a DiscoveryClient when a discovery daemon runs on this host for the offer port, or None.
+    """
+    path = socket_path(udp_port)
+    return DiscoveryClient(path) if os.path.exists(path) else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Listens for trivia offers once for every client of this host")
+    parser.add_argument('--udp-port', type=int, default=13117, help="port of the original offers")
+    parser.add_argument('--socket', default=None, help="Unix socket to answer on (default: in the temp directory)")
+    parser.add_argument('--max-age', type=float, default=5.0, help="seconds a server is kept after its latest offer")
+    args = parser.parse_args()
+
+    cache = DiscoveryCache(args.udp_port, max_age=args.max_age)
+    cache.start()
+    daemon = DiscoveryDaemon(cache, args.socket or socket_path(args.udp_port))
+    print(f"Discovery daemon listening for offers on port {args.udp_port}, answering on {daemon.path}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        daemon.close()
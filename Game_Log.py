@@ -0,0 +1,117 @@
+import atexit
+import json
+import re
+import sys
+import time
+from collections import deque
+from threading import Event, Thread
+
+ANSI_CODE = re.compile(r'\033\[[0-9;]*m')
+
+
+class GameLog:
+    """
+    A buffered, structured logger for the game servers. Logging only appends a record to an
+    in-memory buffer; a background thread formats the records and writes them in batches, so the
+    game loop never waits for the terminal or the disk.
+
+    In 'console' format each record is written exactly like the server's old print output.
+    In 'json' format each record becomes one JSON line with a timestamp, the event name, its
+    fields and the message stripped of color codes.
+
+    Attributes:
+        log_format (str): 'console' or 'json'.
+        stream: The file object the records are written to.
+        flush_interval (float): Seconds between writes while records are coming in.
+    """
+
+    def __init__(self, log_format='console', stream=None, flush_interval=0.05, max_buffer=10000):
+        self.log_format = log_format
+        self.stream = stream
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.records = deque()
+        self.wakeup = Event()
+        self.closed = False
+        self.writer = Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def log(self, event, message, **fields):
+        """
+        Queues a log record. `event` is a short machine-readable name, `message` the human-readable text.
+        """
+        self.records.append((time.time(), event, message, fields))
+        if len(self.records) >= self.max_buffer:
+            self.wakeup.set()
+
+    def format(self, record):
+        timestamp, event, message, fields = record
+        if self.log_format == 'json':
+            entry = {'ts': round(timestamp, 6), 'event': event}
+            entry.update(fields)
+            entry['message'] = ANSI_CODE.sub('', str(message)).strip()
+            return json.dumps(entry, default=str) + "\n"
+        return f"{message}\n"
+
+    def flush(self):
+        """
+        Writes every buffered record.
+        """
+        lines = []
+        while self.records:
+            lines.append(self.format(self.records.popleft()))
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write("".join(lines))
+            stream.flush()
+
+    def write_records(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except (OSError, ValueError):
+                pass  # The stream was closed under us
+
+    def after_fork(self):
+        """
+        Restarts the writer thread in a forked child process, where it did not survive the fork.
+        Records buffered before the fork are left to the parent to write.
+        """
+        self.records.clear()
+        self.writer = Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+
+    def close(self):
+        """
+        Stops the writer thread after writing the remaining records.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.writer.join()
+        try:
+            self.flush()
+        except (OSError, ValueError):
+            pass
+
+
+class NullLog:
+    """
+    A logger that drops every record, for simulations playing far more games than anyone reads.
+    """
+
+    def log(self, event, message, **fields):
+        pass
+
+    def flush(self):
+        pass
+
+    def after_fork(self):
+        pass
+
+    def close(self):
+        pass
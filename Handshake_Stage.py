@@ -0,0 +1,168 @@
+import selectors
+import time
+
+MAX_HANDSHAKE_LENGTH = 1024
+
+
+class PendingHandshake:
+    """
+    A connection whose handshake line has not fully arrived yet.
+    """
+
+    __slots__ = ('address', 'buffer', 'deadline')
+
+    def __init__(self, address, deadline):
+        self.address = address
+        self.buffer = b''
+        self.deadline = deadline
+
+
+class HandshakeStage:
+    """
+    Accepts connections and reads their handshake lines for the threaded server. Every
+    connection waiting in the listen backlog is accepted at once, and the lines of all pending
+    connections are read concurrently with one selector, in reads bounded by the line limit.
+    A slow or silent client therefore only holds its own slot until its deadline, never the
+    other joins. While `max_pending` handshakes are in progress, new connections wait in the
+    kernel's backlog.
+
+    Attributes:
+        listener (socket.socket): The listening TCP socket.
+        on_complete (callable): Called with (client socket, address, handshake line) for every
+            completed handshake; the socket is left non-blocking.
+        max_pending (int): Most handshakes in progress at once.
+        handshake_timeout (float): Seconds a connection has to send its handshake line.
+        pending (dict): Client socket -> PendingHandshake.
+    """
+
+    def __init__(self, listener, on_complete, max_pending=1024, handshake_timeout=5, logger=None, metrics=None):
+        self.listener = listener
+        self.on_complete = on_complete
+        self.max_pending = max_pending
+        self.handshake_timeout = handshake_timeout
+        self.logger = logger
+        self.metrics = metrics
+        self.pending = {}
+        self.selector = selectors.DefaultSelector()
+        self.accepting = False
+        self.closing = False  # Set once the join window is over
+        self.last_accept = None
+        self.completed = 0  # Handshakes completed in the current join window
+
+    def run(self, idle_timeout=10):
+        """
+        Accepts players until `idle_timeout` seconds passed without a new connection after the
+        first completed handshake, then finishes the handshakes still in progress and returns.
+        Connections that all fail their handshake do not start the countdown.
+        """
+        self.listener.setblocking(False)
+        self.last_accept = None
+        self.completed = 0
+        self.closing = False
+        self.resume_accepting()
+        while True:
+            now = time.monotonic()
+            waited = self.last_accept is not None and now - self.last_accept >= idle_timeout
+            idle = waited and self.completed > 0
+            if idle and not self.closing:
+                self.closing = True
+                self.pause_accepting()
+            if idle and not self.pending:
+                return
+            wakeups = [handshake.deadline for handshake in self.pending.values()]
+            if self.last_accept is not None and not waited:
+                wakeups.append(self.last_accept + idle_timeout)
+            timeout = max(min(wakeups) - now, 0) if wakeups else None
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self.listener:
+                    self.accept_all()
+                else:
+                    self.read(key.fileobj)
+            self.expire(time.monotonic())
+
+    def resume_accepting(self):
+        if not self.accepting:
+            self.selector.register(self.listener, selectors.EVENT_READ)
+            self.accepting = True
+
+    def pause_accepting(self):
+        if self.accepting:
+            self.selector.unregister(self.listener)
+            self.accepting = False
+
+    def accept_all(self):
+        """
+        Accepts every connection waiting in the backlog, up to `max_pending` handshakes in progress.
+        """
+        while len(self.pending) < self.max_pending:
+            try:
+                client_socket, address = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.log('accept_failed', f"\033[31mError accepting a connection: {e}\033[00m", error=str(e))
+                return
+            client_socket.setblocking(False)
+            self.pending[client_socket] = PendingHandshake(address, time.monotonic() + self.handshake_timeout)
+            self.selector.register(client_socket, selectors.EVENT_READ)
+            self.last_accept = time.monotonic()
+        self.pause_accepting()  # Full: the backlog holds the next connections
+
+    def read(self, client_socket):
+        """
+        Reads the available part of a handshake line and completes the handshake at the newline.
+        """
+        handshake = self.pending[client_socket]
+        try:
+            data = client_socket.recv(MAX_HANDSHAKE_LENGTH - len(handshake.buffer))
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.fail(client_socket, "connection closed")
+            return
+        handshake.buffer += data
+        if b'\n' in handshake.buffer:
+            # Clients send nothing else until the server answers, so there is no data after the newline to keep
+            line = handshake.buffer.split(b'\n', 1)[0].decode(errors='replace')
+            if not line.strip():
+                self.fail(client_socket, "empty player name")
+                return
+            self.release(client_socket)
+            self.completed += 1
+            self.on_complete(client_socket, handshake.address, line)
+        elif len(handshake.buffer) >= MAX_HANDSHAKE_LENGTH:
+            self.fail(client_socket, f"handshake line longer than {MAX_HANDSHAKE_LENGTH} bytes")
+
+    def expire(self, now):
+        """
+        Drops the connections that did not complete their handshake in time.
+        """
+        for client_socket in [client_socket for client_socket, handshake in self.pending.items()
+                              if handshake.deadline <= now]:
+            self.fail(client_socket, "handshake timed out")
+
+    def fail(self, client_socket, reason):
+        address = self.pending[client_socket].address
+        self.release(client_socket)
+        client_socket.close()
+        if not self.pending and not self.completed:
+            self.last_accept = None  # Nobody joined yet, wait for the next connection
+        self.log('handshake_failed', f"\033[31mError receiving name from {address}: {reason}\033[00m",
+                 address=address, error=reason)
+        if self.metrics:
+            self.metrics.handshakes_failed.inc()
+
+    def release(self, client_socket):
+        """
+        Forgets a pending handshake and makes room for the next connection.
+        """
+        del self.pending[client_socket]
+        self.selector.unregister(client_socket)
+        if not self.closing and len(self.pending) < self.max_pending:
+            self.resume_accepting()
+
+    def log(self, event, message, **fields):
+        if self.logger:
+            self.logger.log(event, message, **fields)
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import time
+
+from Async_Trivia import AsyncTriviaServer
+from Protocol import (ANSWER, GAME_OVER, QUESTION, FRAME_HEADER, WELCOME_PAYLOAD, FrameDecoder, ProtocolError,
+                      decode_question, encode_frame, encode_hello, parse_header)
+
+ANSI_CODE = re.compile(r'\033\[[0-9;]*m')
+
+
+def parse_latency(spec):
+    """
+    Turns a latency distribution spec into a function returning answer delays in seconds:
+    'fixed:S', 'uniform:MIN:MAX', 'exp:MEAN' or 'normal:MEAN:STDDEV'.
+    """
+    kind, *values = spec.split(':')
+    values = [float(value) for value in values]
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'exp':
+        return lambda: random.expovariate(1 / values[0])
+    if kind == 'normal':
+        return lambda: max(random.gauss(values[0], values[1]), 0)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def percentile(samples, pct):
+    """
+    Returns the nearest-rank percentile of a sorted list of samples.
+    """
+    if not samples:
+        return None
+    rank = max(int(round(pct / 100 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class LoadResults:
+    """
+    Measurements shared by every simulated player of a load test.
+    """
+
+    def __init__(self):
+        self.connect_latencies = []
+        self.answer_rtts = []
+        self.games_won = 0
+        self.games_cancelled = 0
+        self.answers = 0
+        self.connect_errors = 0
+        self.disconnects = 0
+        self.protocol_errors = 0
+
+    def summary(self, duration):
+        """
+        Returns the results as a dictionary of latency percentiles (in milliseconds) and rates.
+        """
+        report = {'duration_s': round(duration, 3),
+                  'games': self.games_won,
+                  'games_per_minute': round(self.games_won * 60 / duration, 2) if duration else 0,
+                  'cancelled_games': self.games_cancelled,
+                  'answers': self.answers,
+                  'connect_errors': self.connect_errors,
+                  'disconnects': self.disconnects,
+                  'protocol_errors': self.protocol_errors}
+        for name, samples in (('connect_ms', self.connect_latencies), ('answer_rtt_ms', self.answer_rtts)):
+            samples = sorted(samples)
+            for pct in (50, 90, 99):
+                value = percentile(samples, pct)
+                report[f'{name}_p{pct}'] = round(value * 1000, 3) if value is not None else None
+        return report
+
+
+class LoadBot:
+    """
+    One simulated player speaking the framed protocol. It answers each question after a delay drawn
+    from the latency distribution, correctly with probability `accuracy`, and measures the time
+    from sending an answer until the server's next message (the round's resolution).
+    """
+
+    def __init__(self, name, answer_key, latency, accuracy, results):
+        self.name = name
+        self.answer_key = answer_key
+        self.latency = latency
+        self.accuracy = accuracy
+        self.results = results
+
+    def choose_answer(self, message):
+        """
+        Picks an answer for a question message, right with probability `accuracy` when the
+        question is in the answer key and at random otherwise.
+        """
+        question = ANSI_CODE.sub('', message).strip().splitlines()[-1]
+        correct = self.answer_key.get(question)
+        if correct is None:
+            return random.choice(['1', '0'])
+        if random.random() < self.accuracy:
+            return '1' if correct else '0'
+        return '0' if correct else '1'
+
+    async def play_game(self, host, port):
+        """
+        Connects, plays one game to its end and records the measurements.
+        """
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(encode_hello(self.name))
+            welcome = await reader.readexactly(FRAME_HEADER.size + WELCOME_PAYLOAD.size)
+            parse_header(welcome[:FRAME_HEADER.size])
+        except (OSError, asyncio.IncompleteReadError, ProtocolError):
+            self.results.connect_errors += 1
+            await asyncio.sleep(0.1)
+            return
+        self.results.connect_latencies.append(time.perf_counter() - start)
+
+        decoder = FrameDecoder()
+        answered_at = None
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    self.results.disconnects += 1
+                    return
+                for message_type, payload in decoder.feed(data):
+                    if answered_at is not None:
+                        self.results.answer_rtts.append(time.perf_counter() - answered_at)
+                        answered_at = None
+                    if message_type == QUESTION:
+                        _, text = decode_question(payload)
+                        await asyncio.sleep(self.latency())
+                        writer.write(encode_frame(ANSWER, self.choose_answer(text).encode()))
+                        answered_at = time.perf_counter()
+                        self.results.answers += 1
+                    elif message_type == GAME_OVER:
+                        text = payload.decode()
+                        if f"winner: {self.name}\033" in text:
+                            self.results.games_won += 1
+                        elif "only registered player" in text:
+                            self.results.games_cancelled += 1
+                        return
+        except (OSError, asyncio.IncompleteReadError):
+            self.results.disconnects += 1
+        except ProtocolError:
+            self.results.protocol_errors += 1
+        finally:
+            writer.close()
+
+    async def run(self, host, port, deadline):
+        """
+        Plays games back to back until the deadline.
+        """
+        while time.perf_counter() < deadline:
+            await self.play_game(host, port)
+
+
+class LocalServer(AsyncTriviaServer):
+    """
+    An AsyncTriviaServer bound to the loopback interface, for load tests on a single machine.
+    """
+
+    def get_server_ip(self):
+        return '127.0.0.1'
+
+
+def run_quiet(server):
+    """
+    Runs a server with its console output discarded, so logging does not skew the measurements.
+    """
+    sys.stdout = open(os.devnull, 'w')
+    server.logger.after_fork()
+    server.start()
+
+
+async def run_load(host, port, bots, duration, latency, accuracy, answer_key, ramp):
+    """
+    Starts `bots` simulated players, spreading their first connection over `ramp` seconds,
+    and lets them play until `duration` seconds have passed.
+    """
+    results = LoadResults()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def start_bot(index):
+        await asyncio.sleep(ramp * index / bots)
+        await LoadBot(f"load{index}", answer_key, latency, accuracy, results).run(host, port, deadline)
+
+    await asyncio.gather(*(start_bot(index) for index in range(bots)))
+    return results.summary(time.perf_counter() - start)
+
+
+def raise_file_limit(wanted):
+    """
+    Raises the soft limit on open files so thousands of sockets fit in one process.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trivia server load test")
+    parser.add_argument('--host', default='127.0.0.1', help="server address")
+    parser.add_argument('--port', type=int, default=None, help="server TCP port; omit to start a local server")
+    parser.add_argument('--bots', type=int, default=1000, help="number of simulated players")
+    parser.add_argument('--duration', type=float, default=60, help="seconds to keep playing")
+    parser.add_argument('--ramp', type=float, default=5, help="seconds over which the bots connect")
+    parser.add_argument('--latency', default='uniform:0.2:2', help="answer delay distribution")
+    parser.add_argument('--accuracy', type=float, default=0.5, help="probability of a correct answer")
+    parser.add_argument('--lobby-size', type=int, default=50, help="lobby size of the local server")
+    parser.add_argument('--answer-timeout', type=float, default=10, help="answer timeout of the local server")
+    parser.add_argument('--join-timeout', type=float, default=2, help="join timeout of the local server")
+    parser.add_argument('--json', default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    raise_file_limit(2 * args.bots + 256)
+    server_process = None
+    answer_key = {}
+    port = args.port
+    if port is None:
+        server = LocalServer(join_timeout=args.join_timeout, answer_timeout=args.answer_timeout,
+                             close_round_early=True, lobby_size=args.lobby_size)
+        answer_key = {question: answer for question, answer in server.questions}
+        port = server.tcp_port
+        server_process = multiprocessing.get_context('fork').Process(target=run_quiet, args=(server,), daemon=True)
+        server_process.start()
+        time.sleep(0.5)
+
+    try:
+        report = asyncio.run(run_load(args.host, port, args.bots, args.duration, parse_latency(args.latency),
+                                      args.accuracy, answer_key, args.ramp))
+    finally:
+        if server_process:
+            server_process.terminate()
+
+    for key, value in report.items():
+        print(f"{key:<20} {value}")
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
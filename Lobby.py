@@ -0,0 +1,172 @@
+from Question_Bank import QuestionDeck
+
+
+class Lobby:
+    """
+    A single game instance. Each lobby has its own players, round counter and no-repeat
+    question deck, so many lobbies can play at the same time inside one server process.
+
+    Attributes:
+        lobby_id (int): Sequential id of the lobby within the server.
+        max_players (int): Number of players that fills the lobby, or None for no limit.
+        clients (list): The Player records of the clients that joined this lobby.
+        state (str): 'waiting' while filling, 'game' while playing and 'over' once finished.
+        round_num (int): The round currently being played.
+        last_join_time (float): Event loop time of the latest join.
+        current_game_true_answers (int): Questions with a true answer asked in this game.
+        current_game_false_answers (int): Questions with a false answer asked in this game.
+        question (tuple): The (question, answer) asked last.
+        scores (dict): Number of correct answers per player name in this game.
+        active (ActiveSet): The players still in the game, once it started.
+        expected (dict): Session token -> saved player of a game restored from a checkpoint, for
+            the players that have not rejoined yet.
+    """
+
+    def __init__(self, lobby_id, questions, max_players=None):
+        self.lobby_id = lobby_id
+        self.deck = QuestionDeck(questions)
+        self.max_players = max_players
+        self.clients = []
+        self.state = 'waiting'
+        self.round_num = 0
+        self.last_join_time = None
+        self.current_game_true_answers = 0
+        self.current_game_false_answers = 0
+        self.question = None
+        self.scores = {}
+        self.active = None
+        self.expected = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot, questions):
+        """
+        Rebuilds a running lobby from snapshot(). Its players are expected to rejoin with their
+        session tokens.
+        """
+        lobby = cls(snapshot['lobby_id'], questions)
+        lobby.deck.restore(snapshot['deck'])
+        lobby.round_num = snapshot['round_num']
+        lobby.current_game_true_answers = snapshot['true_answers']
+        lobby.current_game_false_answers = snapshot['false_answers']
+        lobby.question = tuple(snapshot['question']) if snapshot['question'] else None
+        lobby.scores = {player['name']: player['score'] for player in snapshot['players']}
+        lobby.expected = {player['token']: player for player in snapshot['players']}
+        return lobby
+
+    def snapshot(self):
+        """
+        Returns the state of the running game as JSON-serializable data: round, last question,
+        deck position and the players that hold a session token, with their scores and whether
+        they are still in the game. Players of a restored game that have not rejoined yet keep
+        their saved entry.
+        """
+        active = self.active if self.active is not None else {}
+        return {'lobby_id': self.lobby_id,
+                'round_num': self.round_num,
+                'question': list(self.question) if self.question else None,
+                'deck': self.deck.state(),
+                'true_answers': self.current_game_true_answers,
+                'false_answers': self.current_game_false_answers,
+                'players': [{'token': player.token, 'name': player.name, 'alive': player.connection in active,
+                             'score': self.scores.get(player.name, 0)}
+                            for player in self.clients if player.token] + list(self.expected.values())}
+
+    def add_client(self, player, join_time):
+        """
+        Adds a player to the lobby and records when it joined.
+        """
+        self.clients.append(player)
+        self.last_join_time = join_time
+
+    def is_full(self):
+        """
+        Returns True once the lobby has reached its player limit.
+        """
+        return self.max_players is not None and len(self.clients) >= self.max_players
+
+    def pick_question(self):
+        """
+        Draws the next question of this lobby's game and counts its answer.
+        """
+        question, answer = self.deck.draw()
+        self.question = (question, answer)
+        if answer:
+            self.current_game_true_answers += 1
+        else:
+            self.current_game_false_answers += 1
+        return question, answer
+
+
+class LobbyScheduler:
+    """
+    Shards incoming players into lobbies with a fill-then-start policy: players join the lobby
+    that is currently filling, and that lobby starts as soon as it is full or once no new player
+    has joined for `join_timeout` seconds. The next player then opens a fresh lobby.
+
+    Attributes:
+        lobby_size (int): Players per lobby, or None to fill a lobby until the join timeout.
+        join_timeout (float): Seconds without a new player before a partly filled lobby starts.
+        filling (Lobby): The lobby currently accepting players, if any.
+        running (dict): Lobbies currently playing, by lobby id.
+    """
+
+    def __init__(self, questions, lobby_size=None, join_timeout=10):
+        self.questions = questions
+        self.lobby_size = lobby_size
+        self.join_timeout = join_timeout
+        self.filling = None
+        self.running = {}
+        self.next_lobby_id = 1
+
+    def assign(self, player, join_time):
+        """
+        Places a player in the filling lobby, opening a new one if there is none or it is already
+        full, and returns that lobby.
+        """
+        if self.filling is None or self.filling.is_full():
+            self.filling = Lobby(self.next_lobby_id, self.questions, self.lobby_size)
+            self.next_lobby_id += 1
+        lobby = self.filling
+        lobby.add_client(player, join_time)
+        return lobby
+
+    def resume(self, lobby):
+        """
+        Marks a lobby restored from a checkpoint as running, keeping new lobby ids above its id.
+        """
+        lobby.state = 'game'
+        self.running[lobby.lobby_id] = lobby
+        self.next_lobby_id = max(self.next_lobby_id, lobby.lobby_id + 1)
+
+    def time_until_start(self, lobby, now):
+        """
+        Returns how many seconds the lobby still waits before starting; 0 means it should start now.
+        """
+        if lobby.is_full():
+            return 0
+        return max(lobby.last_join_time + self.join_timeout - now, 0)
+
+    def start(self, lobby):
+        """
+        Closes the lobby for new players and marks it as running.
+        """
+        if self.filling is lobby:
+            self.filling = None
+        lobby.state = 'game'
+        self.running[lobby.lobby_id] = lobby
+
+    def finish(self, lobby):
+        """
+        Marks the lobby's game as over and forgets it.
+        """
+        lobby.state = 'over'
+        self.running.pop(lobby.lobby_id, None)
+
+    def all_lobbies(self):
+        """
+        Returns every lobby that is filling or running.
+        """
+        lobbies = list(self.running.values())
+        if self.filling is not None:
+            lobbies.append(self.filling)
+        return lobbies
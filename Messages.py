@@ -0,0 +1,107 @@
+from Protocol import DISQUALIFY, GAME_OVER, encode_frame
+
+# ANSI colors of the server's messages
+MAGENTA = "\033[35m"
+BLUE = "\033[34m"
+RESET = "\033[00m"
+
+WELCOME = f"{MAGENTA}Welcome to the Trivia Contest!\nHere's your question:\n"
+
+# The fixed notices never change, so they are encoded and framed once
+ONLY_PLAYER = f"{BLUE}You are the only registered player, the game is over.{RESET}"
+ONLY_PLAYER_DATA = ONLY_PLAYER.encode()
+ONLY_PLAYER_FRAME = encode_frame(GAME_OVER, ONLY_PLAYER_DATA)
+
+DISQUALIFIED = "You have been disqualified (loser)\n"
+DISQUALIFIED_DATA = DISQUALIFIED.encode()
+DISQUALIFIED_FRAME = encode_frame(DISQUALIFY, DISQUALIFIED_DATA)
+
+
+def round_message(round_num, question_text, active_clients):
+    """
+    Renders the message announcing a question. The first round gets the contest welcome, later
+    rounds list the players of an ActiveSet, whose roster text is cached between eliminations.
+    """
+    if round_num == 1:
+        return f"{WELCOME}{question_text}{RESET}\n"
+    return f"\n{MAGENTA}Round {round_num}, played by {active_clients.roster()}:\n{question_text}{RESET}\n"
+
+
+def winner_message(winner_name):
+    """
+    Renders the head of the game-over message.
+    """
+    return f"{BLUE}Game over!\nCongratulations to the winner: {winner_name}{RESET}\n"
+
+
+def most_active_message(most_games, players):
+    """
+    Renders the most active players line of the stats.
+    """
+    if len(players) > 1:
+        return f"Most active players each with {most_games} games: " + ", ".join(players) + " (nerds)\n"
+    return f"Most active player: {players[0]} with {most_games} games (nerd).\n"
+
+
+def top_winners_message(max_wins, winners):
+    """
+    Renders the top winners line of the stats.
+    """
+    if len(winners) > 1:
+        return f"Top winners, each with {max_wins} wins: " + ", ".join(winners) + "\n"
+    return f"Top winner: {winners[0]} with {max_wins} wins.\n"
+
+
+def true_false_rate_messages(cumulative_true, cumulative_false, current_true, current_false):
+    """
+    Renders the true/false answer rates from the question counters. Returns the table that is
+    logged, the text sent to the players and the cumulative and current game true rates.
+    """
+    total_questions = cumulative_true + cumulative_false
+    current_game_total = current_true + current_false
+
+    if total_questions > 0:  # Avoid division by zero
+        cumulative_true_pct = cumulative_true / total_questions
+        cumulative_false_pct = cumulative_false / total_questions
+    else:
+        cumulative_true_pct = cumulative_false_pct = 0
+
+    if current_game_total > 0:
+        current_game_true_pct = current_true / current_game_total
+        current_game_false_pct = current_false / current_game_total
+    else:
+        current_game_true_pct = current_game_false_pct = 0
+
+    table = ("+--------------------------------+\n"
+             "| Statistic                | Value |\n"
+             "+--------------------------------+\n"
+             f"| Cumulative True Answers   | {cumulative_true_pct:.2%} |\n"
+             f"| Cumulative False Answers  | {cumulative_false_pct:.2%} |\n"
+             "+--------------------------------+\n"
+             f"| Current Game True Answers | {current_game_true_pct:.2%} |\n"
+             f"| Current Game False Answers| {current_game_false_pct:.2%} |\n"
+             "+--------------------------------+")
+    text = (f"Cumulative True Answers: {cumulative_true_pct:.2%}\n"
+            f"Cumulative False Answers: {cumulative_false_pct:.2%}\n"
+            f"Current Game True Answers: {current_game_true_pct:.2%}\n"
+            f"Current Game False Answers: {current_game_false_pct:.2%}")
+    return table, text, cumulative_true_pct, current_game_true_pct
+
+
+class TextCache:
+    """
+    Rendered texts kept until the values they were rendered from change. Each entry is stored
+    under a name with a key summarizing its inputs, and rendered again only when the key differs.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, name, key, render, *args):
+        """
+        Returns the text cached under `name` for `key`, rendering it with render(*args) on a miss.
+        """
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != key:
+            entry = self.entries[name] = (key, render(*args))
+        return entry[1]
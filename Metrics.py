@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Counter:
+    """
+    A monotonically increasing count.
+    """
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+class Gauge(Counter):
+    """
+    A value that goes up and down.
+    """
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+
+class Histogram:
+    """
+    Observations counted in fixed buckets, plus their sum and count. Observing costs one binary
+    search over the bucket bounds and two additions.
+    """
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+        self.lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class TriviaMetrics:
+    """
+    The server's counters and histograms, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.connections_accepted = Counter('trivia_connections_accepted_total', "Client connections accepted.")
+        self.connections_dropped = Counter('trivia_connections_dropped_total', "Client connections lost or closed on error.")
+        self.connections_reused = Counter('trivia_connections_reused_total', "Connections kept open for another game.")
+        self.handshakes_failed = Counter('trivia_handshakes_failed_total',
+                                         "Connections dropped before completing their handshake.")
+        self.slow_consumers = Counter('trivia_slow_consumers_total',
+                                      "Players removed from a game for not keeping up with its messages.")
+        self.connected_players = Gauge('trivia_connected_players', "Players currently connected.")
+        self.games_played = Counter('trivia_games_total', "Games played to the end.")
+        self.rounds_played = Counter('trivia_rounds_total', "Rounds played.")
+        self.answers_received = Counter('trivia_answers_total', "Answers received from players.")
+        self.round_duration = Histogram('trivia_round_duration_seconds', "Time from sending a question to resolving the round.")
+        self.answer_latency = Histogram('trivia_answer_latency_seconds', "Time from sending a question to receiving an answer.")
+        self.fanout_time = Histogram('trivia_fanout_seconds', "Time to send one message to every player.")
+
+    def render(self):
+        lines = []
+        for metric in vars(self).values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves the metrics on http://<host>:<port>/metrics from a background thread.
+    """
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are not worth a log line
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.http_server.daemon_threads = True
+        Thread(target=self.http_server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
@@ -0,0 +1,148 @@
+import random
+import socket
+import struct
+
+OFFER_COOKIE = 0xabcddcba
+OFFER_TYPE = 0x2
+EXTENDED_OFFER_TYPE = 0x4
+EXTENDED_OFFER_VERSION = 1
+
+# The offer every client understands; old clients unpack exactly these 39 bytes
+OFFER_PACKET = struct.Struct('!Ib32sH')
+# The same fields followed by the offer version, open slots, current players, lobby id and the
+# address to connect to (0.0.0.0 for the sender's address). Sent on its own port, so old clients
+# listening on the offer port never see it.
+EXTENDED_OFFER_PACKET = struct.Struct('!Ib32sHBHHI4s')
+
+UNLIMITED_SLOTS = 0xFFFF  # Open slots of a server whose games have no player limit
+MULTICAST_GROUP = '239.255.13.117'
+SERVER_NAME = "MysticTriviaServer"
+
+
+def encode_offer(server_name, tcp_port):
+    """
+    Builds the original offer packet.
+    """
+    return OFFER_PACKET.pack(OFFER_COOKIE, OFFER_TYPE, server_name.ljust(32).encode('utf-8'), tcp_port)
+
+
+def encode_extended_offer(server_name, tcp_port, host, open_slots, players, lobby_id):
+    """
+    Builds an offer packet carrying the server's load.
+    """
+    try:
+        address = socket.inet_aton(host)
+    except OSError:
+        address = bytes(4)
+    return EXTENDED_OFFER_PACKET.pack(OFFER_COOKIE, EXTENDED_OFFER_TYPE, server_name.ljust(32).encode('utf-8'),
+                                      tcp_port, EXTENDED_OFFER_VERSION, min(open_slots, UNLIMITED_SLOTS),
+                                      min(players, 0xFFFF), lobby_id, address)
+
+
+def decode_offer(data, sender):
+    """
+    Parses an offer datagram from `sender` (an (ip, port) tuple). Returns (ip, tcp port, load),
+    where load is (open slots, players, lobby id) for extended offers and None for original
+    ones, or None when the datagram is not an offer.
+    """
+    if len(data) >= EXTENDED_OFFER_PACKET.size:
+        cookie, message_type, _, tcp_port, _, open_slots, players, lobby_id, address = \
+            EXTENDED_OFFER_PACKET.unpack_from(data)
+        if cookie == OFFER_COOKIE and message_type == EXTENDED_OFFER_TYPE:
+            host = socket.inet_ntoa(address) if address != bytes(4) else sender[0]
+            return host, tcp_port, (open_slots, players, lobby_id)
+    if len(data) >= OFFER_PACKET.size:
+        cookie, message_type, _, tcp_port = OFFER_PACKET.unpack_from(data)
+        if cookie == OFFER_COOKIE and message_type == OFFER_TYPE:
+            return sender[0], tcp_port, None
+    return None
+
+
+def offer_rank(load):
+    """
+    Sort key ranking offers from the least to the most loaded server: servers with open slots
+    first, then the fewest players.
+    """
+    open_slots, players, _ = load
+    return open_slots == 0, players
+
+
+def open_offer_listener(port):
+    """
+    Returns a UDP socket bound to the given offer port, shared with other listeners on this host.
+    """
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    udp_socket.bind(("", port))
+    return udp_socket
+
+
+def join_offer_group(udp_socket, group):
+    """
+    Joins the multicast group of the extended offers. Broadcast offers still arrive when the
+    host has no multicast route.
+    """
+    if not group:
+        return
+    membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0'))
+    try:
+        udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    except OSError:
+        pass
+
+
+class OfferBroadcaster:
+    """
+    Sends a server's offers: the original packet on the offer port for every client, and the
+    extended packet with the server's load on the extended offer port, to a multicast group or
+    as a broadcast. The interval between offers follows the fill level of the lobby being filled,
+    so idle and full servers keep the discovery traffic low.
+
+    Attributes:
+        udp_socket (socket.socket): The socket the offers are sent from.
+        udp_port (int): Port of the original offers.
+        offer_port (int): Port of the extended offers.
+        multicast_group (str): Group receiving the extended offers, or None to broadcast them.
+        min_interval (float): Seconds between offers while a lobby is almost full.
+        max_interval (float): Seconds between offers while idle or full.
+    """
+
+    def __init__(self, udp_socket, server_name, host, tcp_port, udp_port=13117, multicast_group=None,
+                 min_interval=0.5, max_interval=2.0):
+        self.udp_socket = udp_socket
+        self.server_name = server_name
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.offer_port = udp_port + 1
+        self.multicast_group = multicast_group
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.offer = encode_offer(server_name, tcp_port)
+
+        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        if multicast_group:
+            self.udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)  # Stay on the segment
+            self.udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+    def send(self, open_slots, players, lobby_id):
+        """
+        Sends one original and one extended offer.
+        """
+        extended = encode_extended_offer(self.server_name, self.tcp_port, self.host, open_slots, players, lobby_id)
+        self.udp_socket.sendto(self.offer, ('<broadcast>', self.udp_port))
+        self.udp_socket.sendto(extended, (self.multicast_group or '<broadcast>', self.offer_port))
+
+    def interval(self, open_slots, players):
+        """
+        Returns the seconds to wait before the next offer: the longest interval while no one is
+        waiting or no slot is open, shrinking towards `min_interval` as the lobby fills up,
+        with some jitter so servers on one segment do not send in lockstep.
+        """
+        if players == 0 or open_slots == 0:
+            interval = self.max_interval
+        else:
+            fill = 1.0 if open_slots >= UNLIMITED_SLOTS else players / (players + open_slots)
+            interval = self.max_interval - (self.max_interval - self.min_interval) * fill
+        return interval * random.uniform(0.9, 1.1)
@@ -0,0 +1,213 @@
+def connection_fd(connection):
+    """
+    Returns the file descriptor of a client socket or asyncio StreamWriter, or None when it has none.
+    """
+    if hasattr(connection, 'fileno'):
+        return connection.fileno()
+    sock = connection.get_extra_info('socket')
+    return sock.fileno() if sock is not None else None
+
+
+class Player:
+    """
+    The record of one connected player. Slotted so a connection costs a few dozen bytes beside
+    its socket, and iterable as (connection, address, name) like the tuples it replaces.
+
+    Attributes:
+        player_id (int): Small integer id, unique within the server.
+        connection: The player's client socket or asyncio StreamWriter.
+        address (tuple): The player's address.
+        name (str): The player's name.
+        fd (int): The file descriptor of the connection when the player joined.
+        token (str): The session token the player can rejoin its game with, if it has one.
+    """
+
+    __slots__ = ('player_id', 'connection', 'address', 'name', 'fd', 'token')
+
+    def __init__(self, player_id, connection, address, name, token=None):
+        self.player_id = player_id
+        self.connection = connection
+        self.address = address
+        self.name = name
+        self.fd = connection_fd(connection)
+        self.token = token
+
+    def __iter__(self):
+        yield self.connection
+        yield self.address
+        yield self.name
+
+    def __repr__(self):
+        return f"Player({self.player_id}, {self.name!r})"
+
+
+class PlayerRegistry:
+    """
+    The connected players of a server, with O(1) lookup by id, by file descriptor and by
+    connection. Iterating yields the Player records in the order they joined.
+    """
+
+    def __init__(self):
+        self.next_id = 1
+        self.by_id = {}
+        self.by_fd = {}
+        self.by_connection = {}
+
+    def add(self, connection, address, name, token=None):
+        """
+        Registers a new player and returns its record.
+        """
+        player = Player(self.next_id, connection, address, name, token)
+        self.next_id += 1
+        self.by_id[player.player_id] = player
+        self.by_connection[connection] = player
+        if player.fd is not None:
+            self.by_fd[player.fd] = player
+        return player
+
+    def remove(self, player):
+        """
+        Forgets a player.
+        """
+        self.by_id.pop(player.player_id, None)
+        self.by_connection.pop(player.connection, None)
+        if self.by_fd.get(player.fd) is player:
+            del self.by_fd[player.fd]
+
+    def get(self, player_id):
+        """
+        Returns the player with the given id, or None.
+        """
+        return self.by_id.get(player_id)
+
+    def find_fd(self, fd):
+        """
+        Returns the player connected on the given file descriptor, or None.
+        """
+        return self.by_fd.get(fd)
+
+    def find(self, connection):
+        """
+        Returns the player of a connection, or None.
+        """
+        return self.by_connection.get(connection)
+
+    def clear(self):
+        self.by_id.clear()
+        self.by_fd.clear()
+        self.by_connection.clear()
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+class ActiveSet(dict):
+    """
+    The players still in a game as an insertion-ordered {connection: name} mapping, so one
+    object serves both as the active client list and as the name lookup of a round. It is
+    updated in place as players are eliminated instead of being rebuilt every round, and its
+    roster text is only rendered again after a change.
+    """
+
+    __slots__ = ('roster_text',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.roster_text = None
+
+    def __setitem__(self, connection, name):
+        super().__setitem__(connection, name)
+        self.roster_text = None
+
+    def __delitem__(self, connection):
+        super().__delitem__(connection)
+        self.roster_text = None
+
+    @classmethod
+    def of(cls, players):
+        """
+        Returns the active set of the given Player records.
+        """
+        return cls((player.connection, player.name) for player in players)
+
+    def remove(self, connection):
+        """
+        Removes a player, like list.remove.
+        """
+        del self[connection]
+
+    def retain(self, connections):
+        """
+        Keeps only the given connections, preserving their order of joining.
+        """
+        keep = set(connections)
+        for connection in [connection for connection in self if connection not in keep]:
+            del self[connection]
+
+    def roster(self):
+        """
+        Returns the players' names as "A, B and C". Rounds without eliminations reuse the text.
+        """
+        if self.roster_text is None:
+            names = list(self.values())
+            if len(names) > 1:
+                self.roster_text = ", ".join(names[:-1]) + f" and {names[-1]}"
+            else:
+                self.roster_text = "".join(names)
+        return self.roster_text
+
+    def first(self):
+        """
+        Returns the first remaining connection.
+        """
+        return next(iter(self))
+
+
+def top_counts(counts):
+    """
+    Returns the highest count of a {name: count} table and the names holding it, by scanning it.
+    """
+    if not counts:
+        return 0, []
+    best = max(counts.values())
+    return best, [name for name, count in counts.items() if count == best]
+
+
+class TopCounts:
+    """
+    A {name: count} table that keeps its highest count and the names holding it up to date on
+    every increment, so the top is read without scanning every player. Counts only grow: an
+    increment leaves the top alone, joins it or starts a new one.
+
+    Attributes:
+        counts (dict): Name -> count.
+        best (int): The highest count, 0 while the table is empty.
+        leaders (list): The names holding the highest count, in the order they reached it.
+    """
+
+    __slots__ = ('counts', 'best', 'leaders')
+
+    def __init__(self, counts=None):
+        self.counts = {} if counts is None else counts
+        self.best, self.leaders = top_counts(self.counts)
+
+    def add(self, name):
+        """
+        Counts one more for `name`.
+        """
+        count = self.counts.get(name, 0) + 1
+        self.counts[name] = count
+        if count > self.best:
+            self.best = count
+            self.leaders = [name]
+        elif count == self.best:
+            self.leaders.append(name)
+
+    def top(self):
+        """
+        Returns the highest count and the names holding it.
+        """
+        return self.best, self.leaders
@@ -0,0 +1,197 @@
+import asyncio
+import multiprocessing
+
+from Async_Trivia import AsyncTriviaServer
+from Metrics import MetricsServer
+from Offers import UNLIMITED_SLOTS
+from Players import top_counts
+from Trivia import TriviaServer
+
+
+class SharedStats:
+    """
+    Player statistics shared by every worker process. The win and activity tables live in a
+    multiprocessing Manager (a local aggregator process) and the true/false question counters
+    in shared memory, all guarded by one inter-process lock. Each worker also publishes the
+    players waiting in its filling lobby, for the parent's offers.
+
+    Attributes:
+        player_wins (DictProxy): Number of wins per player, across all workers.
+        player_activity (DictProxy): Number of games per player, across all workers.
+        true_answers (Value): Cumulative number of questions whose answer was true.
+        false_answers (Value): Cumulative number of questions whose answer was false.
+        waiting_players (Array): Players waiting in the filling lobby of every worker, by worker index.
+        lock (multiprocessing.Lock): Serializes read-modify-write updates between workers.
+    """
+
+    def __init__(self, manager, workers=1):
+        self.player_wins = manager.dict()
+        self.player_activity = manager.dict()
+        self.true_answers = multiprocessing.Value('i', 0, lock=False)
+        self.false_answers = multiprocessing.Value('i', 0, lock=False)
+        self.waiting_players = multiprocessing.Array('i', workers, lock=False)  # One writer per entry
+        self.lock = multiprocessing.Lock()
+
+
+class PreforkWorkerServer(AsyncTriviaServer):
+    """
+    An AsyncTriviaServer running in one of the pre-forked worker processes. Every worker binds
+    its own listener to the shared TCP port with SO_REUSEPORT, so the kernel spreads incoming
+    players between them, and records its statistics in the SharedStats of the parent.
+    """
+
+    reuse_port = True
+
+    def __init__(self, host, tcp_port, stats, udp_port=13117, index=0, **options):
+        super().__init__(udp_port, host=host, tcp_port=tcp_port, **options)
+        self.stats = stats
+        self.index = index
+        self.player_wins = stats.player_wins
+        self.player_activity = stats.player_activity
+
+    async def broadcast_offers(self):
+        """
+        Offers are broadcast once by the parent process, so workers only publish how many players
+        wait in their filling lobby, at the pace of the fastest offers.
+        """
+        while True:
+            self.stats.waiting_players[self.index] = self.offer_load()[1]
+            await asyncio.sleep(self.offers.min_interval)
+
+    def update_player_activity(self, client_name):
+        """
+        Updates the activity count for a client in the shared table.
+        """
+        with self.stats.lock:
+            self.player_activity[client_name] = self.player_activity.get(client_name, 0) + 1
+
+    def update_player_wins(self, winner_name):
+        """
+        Updates the win count for a player in the shared table.
+        """
+        with self.stats.lock:
+            self.player_wins[winner_name] = self.player_wins.get(winner_name, 0) + 1
+
+    def most_active_players(self):
+        """
+        Returns the most active players of the shared table, which other workers also update.
+        """
+        if self.stats_store:
+            return self.stats_store.most_games()
+        with self.stats.lock:
+            return top_counts(self.player_activity.copy())
+
+    def top_winners(self):
+        """
+        Returns the top winners of the shared table, which other workers also update.
+        """
+        if self.stats_store:
+            return self.stats_store.most_wins()
+        with self.stats.lock:
+            return top_counts(self.player_wins.copy())
+
+    def count_question(self, answer):
+        """
+        Adds an asked question to the shared cumulative statistics.
+        """
+        with self.stats.lock:
+            if answer:
+                self.stats.true_answers.value += 1
+            else:
+                self.stats.false_answers.value += 1
+
+    def format_true_false_rate(self, current_game_true_answers, current_game_false_answers):
+        """
+        Refreshes the cumulative counters from shared memory before formatting the answer rates.
+        """
+        with self.stats.lock:
+            self.cumulative_true_answers = self.stats.true_answers.value
+            self.cumulative_false_answers = self.stats.false_answers.value
+        return super().format_true_false_rate(current_game_true_answers, current_game_false_answers)
+
+
+def run_worker(host, tcp_port, stats, udp_port, options, index, metrics_port=None):
+    """
+    Entry point of worker number `index`. Each worker keeps its own metrics, served on
+    `metrics_port` when given.
+    """
+    if options.get('logger'):
+        options['logger'].after_fork()
+    worker = PreforkWorkerServer(host, tcp_port, stats, udp_port, index, **options)
+    if metrics_port:
+        MetricsServer(worker.metrics, metrics_port)
+    try:
+        worker.start()
+    except KeyboardInterrupt:
+        worker.stop_game()
+
+
+class PreforkTriviaServer(TriviaServer):
+    """
+    Multi-process deployment of the trivia server. The parent picks the address, forks
+    `workers` processes that each run lobbies on their own event loop, and is the single
+    process broadcasting UDP offers for all of them.
+
+    Attributes:
+        workers (int): Number of worker processes to fork.
+        worker_options (dict): Keyword arguments for every worker's AsyncTriviaServer.
+        processes (list): The running worker processes.
+        stats (SharedStats): Statistics shared with the workers, once they are started.
+        metrics_port (int): Port of the first worker's metrics endpoint; worker k serves on metrics_port + k.
+    """
+
+    reuse_port = True  # The parent reserves the port, its workers bind it again
+
+    def __init__(self, workers=None, udp_port=13117, metrics_port=None, **worker_options):
+        super().__init__(udp_port, logger=worker_options.get('logger'), host=worker_options.pop('host', None),
+                         tcp_port=worker_options.pop('tcp_port', 0), offer_group=worker_options.pop('offer_group', None))
+        self.workers = workers or multiprocessing.cpu_count()
+        self.worker_options = worker_options
+        self.metrics_port = metrics_port
+        self.processes = []
+        self.stats = None
+
+    def offer_load(self):
+        """
+        Advertises the workers' filling lobbies as one: the players waiting in all of them, and
+        the slots left in all of them together. The kernel picks the worker of every new player,
+        so no single lobby id is advertised.
+        """
+        players = sum(self.stats.waiting_players) if self.stats else 0
+        lobby_size = self.worker_options.get('lobby_size')
+        open_slots = max(lobby_size * self.workers - players, 0) if lobby_size else UNLIMITED_SLOTS
+        return open_slots, players, 0
+
+    def start(self):
+        """
+        Forks the workers and broadcasts offers from the parent until interrupted.
+        """
+        context = multiprocessing.get_context('fork')
+        manager = context.Manager()
+        stats = self.stats = SharedStats(manager, self.workers)
+        for index in range(self.workers):
+            metrics_port = self.metrics_port + index if self.metrics_port else None
+            process = context.Process(target=run_worker,
+                                      args=(self.host, self.tcp_port, stats, self.udp_port, self.worker_options,
+                                            index, metrics_port))
+            process.start()
+            self.processes.append(process)
+        self.logger.log('server_started', f"Server started with {self.workers} workers, listening on IP address "
+                                          f"{self.host} on port {self.tcp_port}",
+                        host=self.host, port=self.tcp_port, workers=self.workers)
+
+        try:
+            self.udp_broadcast()
+        finally:
+            self.stop_game()
+            manager.shutdown()
+
+    def stop_game(self):
+        """
+        Terminates every worker process.
+        """
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes.clear()
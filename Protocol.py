@@ -0,0 +1,186 @@
+import struct
+
+# Version 0 is the legacy protocol: raw, ANSI-colored text in both directions
+LEGACY_VERSION = 0
+PROTOCOL_VERSION = 1
+
+# Framed clients open with "TRIVIA/<version> <name>\n" instead of the bare "<name>\n" line
+HELLO_PREFIX = "TRIVIA/"
+# Clients rejoining a game after a server restart open with "RESUME/<version> <session token>\n"
+RESUME_PREFIX = "RESUME/"
+
+# Every frame starts with the protocol version, the message type and the payload length
+FRAME_HEADER = struct.Struct('!BBI')
+# Question payloads start with the round number, followed by the question text
+QUESTION_HEADER = struct.Struct('!I')
+# Welcome payloads carry the protocol version the server picked for the connection
+WELCOME_PAYLOAD = struct.Struct('!B')
+
+MAX_PAYLOAD = 64 * 1024
+
+WELCOME = 0x1
+QUESTION = 0x2
+ANSWER = 0x3
+DISQUALIFY = 0x4
+GAME_OVER = 0x5
+STATS = 0x6
+INFO = 0x7
+SESSION = 0x8  # Carries the session token a client presents to rejoin its game
+REPLAY = 0x9  # Sent by a client after GAME_OVER to play the next game on the same connection
+RESUME_REJECTED = 0xA  # Answers a session token the server does not know, so the client stops trying to rejoin
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a peer sends a frame that does not follow the protocol.
+    """
+
+
+class SessionRejected(ProtocolError):
+    """
+    Raised when the server answers a session token with RESUME_REJECTED.
+    """
+
+
+def encode_frame(message_type, payload=b''):
+    """
+    Builds a complete frame from a message type and its payload bytes. Raises ProtocolError for
+    a payload the peer's decoder would reject.
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds the {MAX_PAYLOAD} byte limit")
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, message_type, len(payload)) + payload
+
+
+def truncate_text(data, limit):
+    """
+    Cuts UTF-8 bytes to at most `limit` bytes without splitting a character.
+    """
+    if len(data) <= limit:
+        return data
+    return data[:limit].decode(errors='ignore').encode()
+
+
+def encode_text_frames(message_type, text, lead_type=None, header=b''):
+    """
+    Builds the frames carrying a text of any length. The text is split at line ends into
+    payloads that fit in a frame, so printing the payloads one per line prints the text. The
+    last payload is sent as `message_type` behind `header`, and the ones before it as
+    `lead_type` (`message_type` by default), so a GAME_OVER or QUESTION frame still comes last.
+    Lines longer than a frame are cut.
+    """
+    limit = MAX_PAYLOAD - len(header)
+    payloads = []
+    lines, size = [], 0
+    for line in text.encode().split(b'\n'):
+        line = truncate_text(line, limit)
+        if lines and size + 1 + len(line) > limit:
+            payloads.append(b'\n'.join(lines))
+            lines, size = [], 0
+        size += len(line) + (1 if lines else 0)
+        lines.append(line)
+    payloads.append(b'\n'.join(lines))
+    lead_type = message_type if lead_type is None else lead_type
+    return b''.join(encode_frame(lead_type, payload) for payload in payloads[:-1]) + \
+        encode_frame(message_type, header + payloads[-1])
+
+
+def encode_question(round_num, text):
+    """
+    Builds the question frame for the given round. The leading lines of a text too long for
+    one frame, like the roster of a crowded round, go ahead of it in INFO frames.
+    """
+    return encode_text_frames(QUESTION, text, INFO, QUESTION_HEADER.pack(round_num))
+
+
+def decode_question(payload):
+    """
+    Splits a question payload into the round number and the question text.
+    """
+    (round_num,) = QUESTION_HEADER.unpack_from(payload)
+    return round_num, payload[QUESTION_HEADER.size:].decode()
+
+
+def encode_welcome(version):
+    """
+    Builds the welcome frame telling a client which protocol version the connection uses.
+    """
+    return encode_frame(WELCOME, WELCOME_PAYLOAD.pack(version))
+
+
+def parse_header(header):
+    """
+    Unpacks a frame header into (message type, payload length), validating version and size.
+    """
+    version, message_type, length = FRAME_HEADER.unpack(header)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the {MAX_PAYLOAD} byte limit")
+    return message_type, length
+
+
+def encode_hello(player_name, version=PROTOCOL_VERSION):
+    """
+    Builds the handshake line a framed client sends instead of its bare name.
+    """
+    return f"{HELLO_PREFIX}{version} {player_name}\n".encode()
+
+
+def encode_resume(token, version=PROTOCOL_VERSION):
+    """
+    Builds the handshake line a client sends to rejoin its game with a session token.
+    """
+    return f"{RESUME_PREFIX}{version} {token}\n".encode()
+
+
+def parse_resume(line):
+    """
+    Returns the session token of a resume handshake line, or None for any other line.
+    """
+    line = line.strip()
+    if line.startswith(RESUME_PREFIX):
+        version, _, token = line[len(RESUME_PREFIX):].partition(' ')
+        if version.isdigit() and token:
+            return token.strip()
+    return None
+
+
+def parse_hello(line):
+    """
+    Parses the handshake line sent by a client. Returns (version, name), where version is
+    LEGACY_VERSION for clients that only sent their name.
+    """
+    line = line.strip()
+    if line.startswith(HELLO_PREFIX):
+        version, _, name = line[len(HELLO_PREFIX):].partition(' ')
+        if version.isdigit():
+            return int(version), name.strip()
+    return LEGACY_VERSION, line
+
+
+class FrameDecoder:
+    """
+    Incremental frame parser for stream sockets. Bytes are fed as they arrive and every
+    complete frame is returned exactly once, no matter how the stream was split or coalesced.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Adds received bytes and returns the list of complete (message type, payload) frames.
+        """
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            message_type, length = parse_header(self.buffer[offset:offset + FRAME_HEADER.size])
+            end = offset + FRAME_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((message_type, bytes(self.buffer[offset + FRAME_HEADER.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
@@ -0,0 +1,241 @@
+import csv
+import mmap
+import random
+import struct
+import sys
+from array import array
+
+# File layout: header, question records, category table, offset index (one '<Q' per question)
+BANK_MAGIC = b'TQB2'
+OLD_BANK_MAGIC = b'TQB1'  # Category names of at most 255 bytes, with a one-byte length
+CATEGORY_LENGTH = struct.Struct('<H')
+BANK_HEADER = struct.Struct('<4sIQQ')  # magic, question count, category table offset, index offset
+RECORD_HEADER = struct.Struct('<BHBH')  # answer, category id, difficulty, text length
+INDEX_ENTRY = struct.Struct('<Q')
+
+
+class QuestionBank:
+    """
+    A read-only question bank backed by a memory-mapped file. Questions are decoded on demand
+    through an offset index, so opening a bank with hundreds of thousands of questions costs no
+    more memory than the pages actually read, and processes opening the same file share them.
+
+    Supports the sequence protocol: `len(bank)` and `bank[i]` -> (question, answer), like the
+    built-in question list of TriviaServer.
+
+    Attributes:
+        path (str): Path of the bank file.
+        count (int): Number of questions.
+        categories (list): Category names, indexed by category id. Id 0 is uncategorized.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as bank_file:
+            self.data = mmap.mmap(bank_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, categories_offset, self.index_offset = BANK_HEADER.unpack_from(self.data)
+        if magic not in (BANK_MAGIC, OLD_BANK_MAGIC):
+            raise ValueError(f"{path} is not a question bank file")
+        self.categories = self._read_categories(categories_offset, magic == OLD_BANK_MAGIC)
+        self._tag_indices = {}
+
+    def _read_categories(self, offset, short_names=False):
+        """
+        Reads the category name table. Banks of the first format store one-byte name lengths.
+        """
+        (count,) = struct.unpack_from('<H', self.data, offset)
+        offset += 2
+        categories = []
+        for _ in range(count):
+            if short_names:
+                length, size = self.data[offset], 1
+            else:
+                (length,), size = CATEGORY_LENGTH.unpack_from(self.data, offset), CATEGORY_LENGTH.size
+            offset += size
+            categories.append(self.data[offset:offset + length].decode())
+            offset += length
+        return categories
+
+    def __len__(self):
+        return self.count
+
+    def _record_offset(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return INDEX_ENTRY.unpack_from(self.data, self.index_offset + i * INDEX_ENTRY.size)[0]
+
+    def __getitem__(self, i):
+        """
+        Returns question i as a (question, answer) tuple.
+        """
+        offset = self._record_offset(i)
+        answer, _, _, length = RECORD_HEADER.unpack_from(self.data, offset)
+        start = offset + RECORD_HEADER.size
+        return self.data[start:start + length].decode(), bool(answer)
+
+    def tags(self, i):
+        """
+        Returns the (category, difficulty) of question i without decoding its text.
+        """
+        _, category_id, difficulty, _ = RECORD_HEADER.unpack_from(self.data, self._record_offset(i))
+        return self.categories[category_id], difficulty
+
+    def select(self, category=None, difficulty=None):
+        """
+        Returns the questions matching the given tags as a QuestionSubset. The matching ids are
+        computed once per tag combination and kept as a compact array.
+        """
+        if category is None and difficulty is None:
+            return self
+        key = (category, difficulty)
+        if key not in self._tag_indices:
+            indices = array('I')
+            for i in range(self.count):
+                question_category, question_difficulty = self.tags(i)
+                if category is not None and question_category != category:
+                    continue
+                if difficulty is not None and question_difficulty != difficulty:
+                    continue
+                indices.append(i)
+            self._tag_indices[key] = indices
+        return QuestionSubset(self, self._tag_indices[key])
+
+    def close(self):
+        """
+        Unmaps the bank file.
+        """
+        self.data.close()
+
+
+class QuestionSubset:
+    """
+    The questions of a QuestionBank matching a tag filter, as a sequence of (question, answer).
+    """
+
+    def __init__(self, bank, indices):
+        self.bank = bank
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        return self.bank[self.indices[i]]
+
+
+class QuestionDeck:
+    """
+    Per-game, no-repeat draw over any question sequence (a QuestionBank, a QuestionSubset or a
+    plain list). The deck runs a Fisher-Yates shuffle one step per draw, keeping only the
+    swapped positions in a dict, so starting a deck and drawing a question are O(1) whatever
+    the size of the bank. The shuffle is seeded, so a checkpoint only saves the seed and the
+    position. Once every question was asked, a new shuffle starts.
+    """
+
+    def __init__(self, questions):
+        if not len(questions):
+            raise ValueError("The question bank is empty")
+        self.questions = questions
+        self.reshuffle()
+
+    def reshuffle(self, seed=None):
+        """
+        Starts a new shuffle with `seed` (a new random one by default).
+        """
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.random = random.Random(self.seed)
+        self.swapped = {}  # Position -> index of the question moved there, for the touched positions only
+        self.drawn = 0
+
+    def state(self):
+        """
+        Returns the deck's position as a list of integers, to continue the same draw later.
+        """
+        return [len(self.questions), self.seed, self.drawn]
+
+    def restore(self, state):
+        """
+        Continues the draw from a saved state(). Ignored when the questions changed in between,
+        or for the states saved before the decks were shuffled. Replays the saved draws.
+        """
+        if len(state) == 3 and state[0] == len(self.questions):
+            self.reshuffle(state[1])
+            for _ in range(min(state[2], len(self.questions))):
+                self.next_index()
+
+    def next_index(self):
+        """
+        Runs one step of the shuffle and returns the index of the next question.
+        """
+        position = self.drawn
+        pick = self.random.randrange(position, len(self.questions))
+        index = self.swapped.pop(pick, pick)
+        if pick != position:
+            self.swapped[pick] = self.swapped.pop(position, position)  # Positions before the next draw are never read again
+        self.drawn += 1
+        return index
+
+    def draw(self):
+        """
+        Returns the next (question, answer) of the game.
+        """
+        if self.drawn >= len(self.questions):
+            self.reshuffle()
+        return self.questions[self.next_index()]
+
+
+def build_question_bank(path, questions):
+    """
+    Writes a question bank file. `questions` yields (question, answer) or
+    (question, answer, category, difficulty) tuples.
+    """
+    categories = {'': 0}
+    index = array('Q')
+    with open(path, 'wb') as bank_file:
+        bank_file.write(BANK_HEADER.pack(BANK_MAGIC, 0, 0, 0))
+        for entry in questions:
+            text, answer = entry[0], entry[1]
+            category = entry[2] if len(entry) > 2 and entry[2] else ''
+            difficulty = int(entry[3]) if len(entry) > 3 and entry[3] not in (None, '') else 0
+            category_id = categories.setdefault(category, len(categories))
+            encoded = text.encode()
+            index.append(bank_file.tell())
+            bank_file.write(RECORD_HEADER.pack(1 if answer else 0, category_id, difficulty, len(encoded)))
+            bank_file.write(encoded)
+
+        categories_offset = bank_file.tell()
+        bank_file.write(struct.pack('<H', len(categories)))
+        for name in sorted(categories, key=categories.get):
+            encoded = name.encode()
+            bank_file.write(CATEGORY_LENGTH.pack(len(encoded)) + encoded)
+
+        index_offset = bank_file.tell()
+        if sys.byteorder != 'little':
+            index.byteswap()
+        index.tofile(bank_file)
+
+        bank_file.seek(0)
+        bank_file.write(BANK_HEADER.pack(BANK_MAGIC, len(index), categories_offset, index_offset))
+
+
+def read_csv_questions(path):
+    """
+    Yields (question, answer, category, difficulty) rows from a CSV file. The answer column
+    accepts the same values as player answers (true/false, yes/no, 1/0).
+    """
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file):
+            if not row:
+                continue
+            text, answer = row[0], row[1].strip().upper()[:1] in ('Y', 'T', '1')
+            category = row[2] if len(row) > 2 else ''
+            difficulty = row[3] if len(row) > 3 else 0
+            yield text, answer, category, difficulty
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python Question_Bank.py questions.csv questions.tqb")
+        sys.exit(1)
+    build_question_bank(sys.argv[2], read_csv_questions(sys.argv[1]))
+    print(f"Question bank written to {sys.argv[2]}")
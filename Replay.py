@@ -0,0 +1,344 @@
+import argparse
+import json
+import os
+import queue
+import struct
+import time
+from threading import Thread
+
+from Game_Log import GameLog
+from Round_Table import encode_answer
+
+# The replay file starts with DATA_MAGIC and holds one length-prefixed record per game, appended
+# in order. The index file (replay path + '.idx') starts with INDEX_MAGIC and holds one fixed-size
+# entry per game, so game N is found with a single seek and the games can be streamed one by one.
+DATA_MAGIC = b'TRVR\x02'
+INDEX_MAGIC = b'TRVI\x02'
+RECORD_LENGTH = struct.Struct('!I')
+# game id, byte offset of the record in the replay file, record length, start time
+INDEX_ENTRY = struct.Struct('!QQId')
+
+# game id, lobby id, start time, end time, number of players, number of rounds
+GAME_HEADER = struct.Struct('!QIddII')
+# round number, milliseconds since the start of the game, correct answer, question length
+ROUND_HEADER = struct.Struct('!IIBH')
+# player index, answer code (see Round_Table), microseconds from question to answer
+ANSWER = struct.Struct('!IbI')
+# answer and loser counts, loser and winner player indexes
+COUNT = struct.Struct('!I')
+NAME_LENGTH = struct.Struct('!B')
+
+NO_PLAYER = 0xFFFFFFFF  # Winner of a game nobody won; player indexes stay below it
+NO_LATENCY = 0xFFFFFFFF
+
+
+class GameRecord:
+    """
+    The transcript of one game: its players, every round's question, the answer and answer
+    time of each player, the eliminations and the winner. Rounds are recorded on the game's
+    thread as plain tuples; encoding is left to the ReplayWriter's thread.
+
+    Attributes:
+        lobby_id (int): The lobby that played the game, 0 for the threaded server.
+        started_at (float): When the game started, as a Unix timestamp.
+        players (list): The players' names; answers and eliminations refer to their index.
+        rounds (list): (round number, milliseconds since the start, question, correct answer,
+            [(player index, answer code, answer time in ns or None)], [eliminated player indexes]).
+        winner (int): Index of the winner, or None.
+    """
+
+    def __init__(self, lobby_id, active_clients):
+        """
+        Starts the record of a game played by an {connection: name} mapping of players.
+        """
+        self.lobby_id = lobby_id
+        self.started_at = time.time()
+        self.ended_at = None
+        self.players = []
+        self.index = {}
+        for connection, name in active_clients.items():
+            self.player(connection, name)
+        self.rounds = []
+        self.winner = None
+
+    def player(self, connection, name):
+        """
+        Returns the index of a player, adding players that were not in the game at its start.
+        """
+        player_index = self.index.get(connection)
+        if player_index is None:
+            player_index = self.index[connection] = len(self.players)
+            self.players.append(name)
+        return player_index
+
+    def add_round(self, round_num, question, correct_answer, responses, answered_at, client_names, eliminated):
+        """
+        Records a resolved round from its {connection: response} and {connection: answer time in ns}
+        dicts and the connections it eliminated.
+        """
+        elapsed_ms = int((time.time() - self.started_at) * 1000)
+        answers = [(self.player(connection, client_names[connection]), encode_answer(response),
+                    answered_at.get(connection)) for connection, response in responses.items()]
+        losers = [self.index[connection] for connection in eliminated if connection in self.index]
+        self.rounds.append((round_num, elapsed_ms, question, bool(correct_answer), answers, losers))
+
+    def finish(self, winner=None):
+        """
+        Ends the record with the winner's connection, or None when nobody won.
+        """
+        self.ended_at = time.time()
+        self.winner = self.index.get(winner) if winner is not None else None
+
+    def encode(self, game_id):
+        """
+        Returns the binary record of the game.
+        """
+        parts = [GAME_HEADER.pack(game_id, self.lobby_id, self.started_at, self.ended_at or time.time(),
+                                  len(self.players), len(self.rounds))]
+        for name in self.players:
+            data = name.encode()[:255]
+            parts.append(NAME_LENGTH.pack(len(data)) + data)
+        for round_num, elapsed_ms, question, correct_answer, answers, losers in self.rounds:
+            text = question.encode()[:0xFFFF]
+            parts.append(ROUND_HEADER.pack(round_num, elapsed_ms, correct_answer, len(text)) + text)
+            parts.append(COUNT.pack(len(answers)))
+            for player_index, code, latency_ns in answers:
+                latency_us = NO_LATENCY if latency_ns is None else min(latency_ns // 1000, NO_LATENCY - 1)
+                parts.append(ANSWER.pack(player_index, code, latency_us))
+            parts.append(COUNT.pack(len(losers)))
+            parts.append(struct.pack(f'!{len(losers)}I', *losers))
+        parts.append(COUNT.pack(NO_PLAYER if self.winner is None else self.winner))
+        return b''.join(parts)
+
+
+def decode_game(data):
+    """
+    Decodes a binary game record into a dict with names in place of player indexes.
+    """
+    game_id, lobby_id, started_at, ended_at, player_count, round_count = GAME_HEADER.unpack_from(data)
+    offset = GAME_HEADER.size
+    players = []
+    for _ in range(player_count):
+        (length,) = NAME_LENGTH.unpack_from(data, offset)
+        offset += NAME_LENGTH.size
+        players.append(data[offset:offset + length].decode(errors='replace'))
+        offset += length
+    rounds = []
+    for _ in range(round_count):
+        round_num, elapsed_ms, correct_answer, length = ROUND_HEADER.unpack_from(data, offset)
+        offset += ROUND_HEADER.size
+        question = data[offset:offset + length].decode(errors='replace')
+        offset += length
+        (answer_count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        answers = []
+        for player_index, code, latency_us in ANSWER.iter_unpack(data[offset:offset + answer_count * ANSWER.size]):
+            answers.append((players[player_index], code, None if latency_us == NO_LATENCY else latency_us))
+        offset += answer_count * ANSWER.size
+        (loser_count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        losers = struct.unpack_from(f'!{loser_count}I', data, offset)
+        offset += loser_count * COUNT.size
+        rounds.append({'round': round_num, 'elapsed_ms': elapsed_ms, 'question': question,
+                       'correct_answer': bool(correct_answer), 'answers': answers,
+                       'eliminated': [players[player_index] for player_index in losers]})
+    (winner,) = COUNT.unpack_from(data, offset)
+    return {'game_id': game_id, 'lobby_id': lobby_id, 'started_at': started_at, 'ended_at': ended_at,
+            'players': players, 'rounds': rounds, 'winner': None if winner == NO_PLAYER else players[winner]}
+
+
+class ReplayWriter:
+    """
+    Appends finished games to a replay file and its index. Servers only queue the GameRecord of
+    a finished game; a background writer thread encodes the records and appends them in batches,
+    so the round loop never waits for the disk.
+
+    A record is indexed only after it was written. Records a crash left without their index
+    entries are indexed again the next time the file is opened, and a torn last record is cut off.
+
+    Attributes:
+        path (str): Path of the replay file.
+        index_path (str): Path of its index.
+        next_game_id (int): Id of the next game written.
+        logger (GameLog): Receives the errors of the writer thread.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=1.0, logger=None):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger or GameLog()
+        self.data_file, self.index_file = self.open_files()
+        self.next_game_id = (self.index_file.tell() - len(INDEX_MAGIC)) // INDEX_ENTRY.size + 1
+        self.pending = queue.Queue()
+        self.writer = Thread(target=self.write_batches, daemon=True)
+        self.writer.start()
+
+    def open_files(self):
+        """
+        Opens the replay file and its index for appending, creating them if needed. Complete
+        records past the last index entry are indexed, anything after them is cut off. Raises
+        ValueError for files of another format, which the records would corrupt.
+        """
+        index_file = open(self.index_path, 'a+b')
+        index_file.seek(0, os.SEEK_END)
+        if index_file.tell() < len(INDEX_MAGIC):
+            index_file.truncate(0)
+            index_file.write(INDEX_MAGIC)
+        else:
+            index_file.seek(0)
+            if index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                index_file.close()
+                raise ValueError(f"{self.index_path} is not an index of this replay format")
+            index_file.seek(0, os.SEEK_END)
+        entries = (index_file.tell() - len(INDEX_MAGIC)) // INDEX_ENTRY.size
+        index_end = len(INDEX_MAGIC) + entries * INDEX_ENTRY.size
+        index_file.truncate(index_end)
+
+        data_file = open(self.path, 'a+b')
+        data_file.seek(0, os.SEEK_END)
+        if data_file.tell() < len(DATA_MAGIC):
+            data_file.truncate(0)
+            data_file.write(DATA_MAGIC)
+        else:
+            data_file.seek(0)
+            if data_file.read(len(DATA_MAGIC)) != DATA_MAGIC:
+                data_file.close()
+                index_file.close()
+                raise ValueError(f"{self.path} is not a replay file of this format")
+        data_end = len(DATA_MAGIC)
+        if entries:
+            index_file.seek(index_end - INDEX_ENTRY.size)
+            _, offset, length, _ = INDEX_ENTRY.unpack(index_file.read(INDEX_ENTRY.size))
+            data_end = offset + length
+
+        recovered = []
+        data_file.seek(data_end)
+        while True:
+            prefix = data_file.read(RECORD_LENGTH.size)
+            if len(prefix) < RECORD_LENGTH.size:
+                break
+            (length,) = RECORD_LENGTH.unpack(prefix)
+            data = data_file.read(length)
+            if len(data) < length or length < GAME_HEADER.size:
+                break
+            game_id, _, started_at, _, _, _ = GAME_HEADER.unpack_from(data)
+            recovered.append(INDEX_ENTRY.pack(game_id, data_end + RECORD_LENGTH.size, length, started_at))
+            data_end += RECORD_LENGTH.size + length
+        data_file.truncate(data_end)
+        data_file.seek(0, os.SEEK_END)
+        index_file.seek(0, os.SEEK_END)
+        index_file.write(b''.join(recovered))
+        index_file.flush()
+        return data_file, index_file
+
+    def submit(self, record):
+        """
+        Queues a finished game to be written.
+        """
+        self.pending.put(record)
+
+    def write_batches(self):
+        """
+        Writer thread: waits for finished games and appends them, flushing the replay file
+        before the index entry that points into it. A game that fails to save is logged and
+        skipped; the games around it are still written and indexed.
+        """
+        running = True
+        while running:
+            try:
+                batch = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            for record in batch:
+                if record is None:
+                    running = False
+                    continue
+                try:
+                    data = record.encode(self.next_game_id)
+                    offset = self.data_file.tell() + RECORD_LENGTH.size
+                    self.data_file.write(RECORD_LENGTH.pack(len(data)) + data)
+                    self.data_file.flush()
+                    self.index_file.write(INDEX_ENTRY.pack(self.next_game_id, offset, len(data), record.started_at))
+                    self.next_game_id += 1
+                except (OSError, struct.error) as e:
+                    self.logger.log('replay_failed', f"\033[31mError saving replays: {e}\033[00m", error=str(e))
+            try:
+                self.index_file.flush()
+            except OSError as e:
+                self.logger.log('replay_failed', f"\033[31mError saving replays: {e}\033[00m", error=str(e))
+
+    def close(self):
+        """
+        Writes every queued game and stops the writer thread.
+        """
+        self.pending.put(None)
+        self.writer.join()
+        self.data_file.close()
+        self.index_file.close()
+
+
+class ReplayReader:
+    """
+    Reads a replay file through its index without loading it whole: games are decoded one at a
+    time while iterating, and any game can be read by id with two seeks.
+    """
+
+    def __init__(self, path):
+        self.data_file = open(path, 'rb')
+        self.index_file = open(path + '.idx', 'rb')
+        if self.data_file.read(len(DATA_MAGIC)) != DATA_MAGIC or \
+                self.index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+
+    def __len__(self):
+        return (os.fstat(self.index_file.fileno()).st_size - len(INDEX_MAGIC)) // INDEX_ENTRY.size
+
+    def read_entry(self, position):
+        """
+        Returns the game at a position of the index (from 0).
+        """
+        self.index_file.seek(len(INDEX_MAGIC) + position * INDEX_ENTRY.size)
+        _, offset, length, _ = INDEX_ENTRY.unpack(self.index_file.read(INDEX_ENTRY.size))
+        self.data_file.seek(offset)
+        return decode_game(self.data_file.read(length))
+
+    def game(self, game_id):
+        """
+        Returns the game with the given id, counted from 1 in the order the games were written.
+        """
+        if not 1 <= game_id <= len(self):
+            raise KeyError(game_id)
+        return self.read_entry(game_id - 1)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self.read_entry(position)
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the games of a replay file as JSON lines.")
+    parser.add_argument('path', help="replay file written with the server's --replay-file")
+    parser.add_argument('--game', type=int, default=None, help="print only the game with this id")
+    args = parser.parse_args()
+    with ReplayReader(args.path) as reader:
+        games = [reader.game(args.game)] if args.game else reader
+        for game in games:
+            print(json.dumps(game))
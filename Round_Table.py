@@ -0,0 +1,110 @@
+import math
+import random
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the pure-Python columns give the same results
+    numpy = None
+
+NO_ANSWER = -1
+FALSE = 0
+TRUE = 1
+INVALID = 2
+
+# Every accepted answer in both cases, so encoding a response is a single dictionary lookup
+ANSWER_CODES = {None: NO_ANSWER}
+for accepted, code in (('YT1', TRUE), ('NF0', FALSE)):
+    for answer in accepted:
+        ANSWER_CODES[answer] = ANSWER_CODES[answer.lower()] = code
+
+
+def encode_answer(response):
+    """
+    Returns the answer code of a response: TRUE, FALSE, INVALID or NO_ANSWER for None.
+    """
+    return ANSWER_CODES.get(response, INVALID)
+
+
+class RoundTable:
+    """
+    The answers of one round kept in columns indexed by player id (the player's position in the
+    table): the answer code and the answer timestamp. Responses are encoded with one dictionary
+    lookup each, then split into correct, incorrect and missing answers by comparing the codes.
+    NumPy arrays are used when NumPy is installed, plain lists otherwise.
+
+    Attributes:
+        players (list): The player (client socket or stream writer) of every player id.
+        answers (array): The answer code of every player.
+        answered_at (array): When every player answered (nanoseconds after the question was sent,
+            as stamped by the servers), infinity for players without a timestamp so they rank last.
+    """
+
+    def __init__(self, responses, answered_at=None):
+        """
+        Builds the table from a {player: response} dict and an optional {player: timestamp} dict.
+        """
+        self.players = list(responses)
+        codes = [ANSWER_CODES.get(response, INVALID) for response in responses.values()]
+        times = [answered_at.get(player, math.inf) for player in self.players] if answered_at else None
+        if numpy is not None:
+            self.answers = numpy.array(codes, dtype=numpy.int8)
+            self.answered_at = numpy.array(times, dtype=numpy.float64) if times else numpy.full(len(codes), math.inf)
+        else:
+            self.answers = codes
+            self.answered_at = times or [math.inf] * len(codes)
+
+    def select(self, mask):
+        """
+        Returns the players whose mask entry is set, in table order.
+        """
+        if numpy is not None:
+            return [self.players[player_id] for player_id in numpy.flatnonzero(mask)]
+        return [player for player, selected in zip(self.players, mask) if selected]
+
+    def masks(self, correct_answer):
+        """
+        Returns the (correct, incorrect, missing) masks of the table, counting invalid answers as incorrect.
+        """
+        code = TRUE if correct_answer else FALSE
+        if numpy is not None:
+            correct = self.answers == code
+            missing = self.answers == NO_ANSWER
+            return correct, ~(correct | missing), missing
+        correct = [answer == code for answer in self.answers]
+        missing = [answer == NO_ANSWER for answer in self.answers]
+        incorrect = [not (is_correct or is_missing) for is_correct, is_missing in zip(correct, missing)]
+        return correct, incorrect, missing
+
+    def resolve(self, correct_answer):
+        """
+        Splits the players into (correct, incorrect, missing) lists, counting invalid answers as incorrect.
+        """
+        return tuple(self.select(mask) for mask in self.masks(correct_answer))
+
+    def resolve_fastest(self, correct_answer):
+        """
+        Resolves the round like resolve(), then ranks the correct players by answer time so a tie
+        is settled in the same round: only the fastest one wins it. Players with exactly the same
+        answer time are ordered at random, not by join order. Returns (fastest, slower, incorrect,
+        missing), with the slower correct players in order of answer time.
+        """
+        correct_mask, incorrect_mask, missing_mask = self.masks(correct_answer)
+        incorrect, missing = self.select(incorrect_mask), self.select(missing_mask)
+        if numpy is not None:
+            player_ids = numpy.flatnonzero(correct_mask)
+            numpy.random.shuffle(player_ids)
+            ranked_ids = player_ids[numpy.argsort(self.answered_at[player_ids], kind='stable')]
+        else:
+            player_ids = [player_id for player_id, is_correct in enumerate(correct_mask) if is_correct]
+            random.shuffle(player_ids)
+            ranked_ids = sorted(player_ids, key=self.answered_at.__getitem__)
+        ranked = [self.players[player_id] for player_id in ranked_ids]
+        return ranked[:1], ranked[1:], incorrect, missing
+
+    def invalid(self):
+        """
+        Returns the players whose response was not a valid answer.
+        """
+        if numpy is not None:
+            return self.select(self.answers == INVALID)
+        return self.select([answer == INVALID for answer in self.answers])
@@ -0,0 +1,387 @@
+import argparse
+import json
+import multiprocessing
+import random
+import time
+from collections import Counter
+
+from Clock import VirtualClock
+from Game_Log import NullLog
+from Load_Test import parse_latency
+from Question_Bank import QuestionBank
+from Trivia import TriviaServer
+
+
+class RoundLimitReached(Exception):
+    """
+    Raised when a simulated game played more rounds than allowed without finding a winner.
+    """
+
+
+class FakePlayer:
+    """
+    A simulated player. It answers right with probability `accuracy`, after a delay in seconds
+    drawn from `latency`; a delay past the answer timeout means it did not answer.
+    """
+
+    __slots__ = ('name', 'accuracy', 'latency')
+
+    def __init__(self, name, accuracy, latency):
+        self.name = name
+        self.accuracy = accuracy
+        self.latency = latency
+
+    def answer(self, correct_answer):
+        """
+        Returns the (delay, answer text) of the player's answer to a question.
+        """
+        right = random.random() < self.accuracy
+        return self.latency(), 'Y' if right == bool(correct_answer) else 'N'
+
+
+class SimulatedConnection:
+    """
+    The server side of a fake player's connection. Everything sent to it is accepted at once
+    and only counted, so the server's outbound buffers never lag.
+    """
+
+    __slots__ = ('player', 'bytes_sent', 'closed')
+
+    def __init__(self, player):
+        self.player = player
+        self.bytes_sent = 0
+        self.closed = False
+
+    def sendmsg(self, buffers):
+        sent = sum(len(buffer) for buffer in buffers)
+        self.bytes_sent += sent
+        return sent
+
+    def send(self, data):
+        return self.sendmsg([data])
+
+    def get_extra_info(self, name):
+        return None  # No socket, hence no file descriptor
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedListener:
+    """
+    Stands in for the server's TCP listener: nothing is bound, players are added directly.
+    """
+
+    def __init__(self, host):
+        self.host = host
+
+    def getsockname(self):
+        return self.host, 0
+
+    def listen(self, backlog):
+        pass
+
+    def close(self):
+        pass
+
+
+class SimulatedOfferSocket:
+    """
+    Stands in for the server's UDP socket: offers are counted instead of sent.
+    """
+
+    def __init__(self):
+        self.offers_sent = 0
+
+    def setsockopt(self, *args):
+        pass
+
+    def sendto(self, data, address):
+        self.offers_sent += 1
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class SimulatedCollector:
+    """
+    Plays the answer collection of a round on a virtual clock. Every active player answers the
+    current question after its own delay; the answers within the timeout count, and the clock
+    moves to the end of the round: the timeout, or the last answer when `close_early` is set
+    and everyone answered.
+
+    Attributes:
+        timeout (float): Seconds a round waits for answers.
+        close_early (bool): End the round as soon as every active player has answered.
+        metrics (TriviaMetrics): Optional metrics receiving the answer count and latencies.
+        clock (VirtualClock): The clock moved forward by every round.
+        correct_answer (bool): The answer of the question being played, set by the server.
+    """
+
+    def __init__(self, timeout, close_early, metrics, clock):
+        self.timeout = timeout
+        self.close_early = close_early
+        self.metrics = metrics
+        self.clock = clock
+        self.correct_answer = None
+
+    def sync(self, active_clients):
+        pass
+
+    def unregister(self, connection):
+        pass
+
+    def clear(self):
+        pass
+
+    def collect(self, active_clients, answered_at=None):
+        """
+        Collects the answers of the fake players like AnswerCollector.collect, with the answer
+        times in `answered_at` being the simulated delays in nanoseconds.
+        """
+        responses = dict.fromkeys(active_clients)
+        answered = 0
+        last = 0
+        for connection in active_clients:
+            delay, text = connection.player.answer(self.correct_answer)
+            if delay >= self.timeout:
+                continue
+            responses[connection] = text
+            answered += 1
+            last = max(last, delay)
+            if answered_at is not None:
+                answered_at[connection] = round(delay * 1e9)
+            if self.metrics:
+                self.metrics.answers_received.inc()
+                self.metrics.answer_latency.observe(delay)
+        everyone = answered == len(responses)
+        self.clock.advance(last if self.close_early and everyone else self.timeout)
+        return responses
+
+
+class SimulatedTriviaServer(TriviaServer):
+    """
+    A TriviaServer whose players are FakePlayers in memory and whose rounds run on a
+    VirtualClock. Nothing is bound or sent on the network and nothing is logged, so the game
+    logic itself (question draws, result resolution, eliminations and stats) runs at full speed.
+
+    Attributes:
+        max_rounds (int): Rounds after which a game without a winner is abandoned.
+        rounds (int): Rounds played in the current game.
+        winner (str): Name of the winner of the last game, or None.
+        question_stats (dict): Question -> [times asked, answers, correct answers].
+    """
+
+    def __init__(self, max_rounds=1000, **options):
+        options.setdefault('clock', VirtualClock())
+        options.setdefault('logger', NullLog())
+        options.setdefault('host', '127.0.0.1')
+        super().__init__(**options)
+        self.max_rounds = max_rounds
+        self.rounds = 0
+        self.winner = None
+        self.current_question = None
+        self.question_stats = {}
+        self.answer_collector = SimulatedCollector(self.answer_timeout, self.close_round_early, self.metrics, self.clock)
+
+    def open_listener(self, port):
+        return SimulatedListener(self.host)
+
+    def open_offer_socket(self):
+        return SimulatedOfferSocket()
+
+    def pick_question(self):
+        """
+        Draws the next question and hands its answer to the fake players.
+        """
+        if self.rounds >= self.max_rounds:
+            raise RoundLimitReached(self.rounds)
+        self.rounds += 1
+        question, answer = super().pick_question()
+        self.current_question = question
+        self.answer_collector.correct_answer = answer
+        return question, answer
+
+    def determine_round_results(self, responses, correct_answer, client_names, answered_at=None):
+        """
+        Resolves a round and counts how its question was answered.
+        """
+        results = super().determine_round_results(responses, correct_answer, client_names, answered_at)
+        expected = 'Y' if correct_answer else 'N'
+        answers = [response for response in responses.values() if response is not None]
+        stats = self.question_stats.setdefault(self.current_question, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += len(answers)
+        stats[2] += answers.count(expected)
+        return results
+
+    def announce_winner_and_cleanup(self, winner_socket, client_names):
+        self.winner = client_names[winner_socket]
+        super().announce_winner_and_cleanup(winner_socket, client_names)
+
+    def play(self, players):
+        """
+        Plays one game between FakePlayers and returns (winner name or None, rounds played).
+        """
+        self.rounds = 0
+        self.winner = None
+        for index, player in enumerate(players):
+            self.complete_handshake(SimulatedConnection(player), ('simulated', index), player.name)
+        try:
+            self.start_game()
+        except RoundLimitReached:
+            self.current_game_true_answers = 0
+            self.current_game_false_answers = 0
+            self.stop_game()
+        return self.winner, self.rounds
+
+
+class SimulationResults:
+    """
+    Outcomes of simulated games, merged across batches and worker processes.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.unfinished = 0
+        self.rounds = Counter()  # Rounds played -> number of games
+        self.wins = Counter()  # Player name -> games won
+        self.simulated_seconds = 0.0
+        self.question_stats = {}
+
+    def add(self, winner, rounds):
+        self.games += 1
+        self.rounds[rounds] += 1
+        if winner is None:
+            self.unfinished += 1
+        else:
+            self.wins[winner] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.unfinished += other.unfinished
+        self.rounds.update(other.rounds)
+        self.wins.update(other.wins)
+        self.simulated_seconds += other.simulated_seconds
+        for question, counts in other.question_stats.items():
+            totals = self.question_stats.setdefault(question, [0, 0, 0])
+            for i, count in enumerate(counts):
+                totals[i] += count
+
+    def rounds_percentile(self, pct):
+        """
+        Returns the nearest-rank percentile of the rounds per game.
+        """
+        rank = max(round(pct / 100 * self.games), 1)
+        seen = 0
+        for rounds in sorted(self.rounds):
+            seen += self.rounds[rounds]
+            if seen >= rank:
+                return rounds
+        return None
+
+    def summary(self, duration, top=5):
+        """
+        Returns the results as a dictionary: game and round counts, the win share of every
+        player and the `top` questions answered right least and most often.
+        """
+        total_rounds = sum(rounds * games for rounds, games in self.rounds.items())
+        rates = sorted((counts[2] / counts[1], question) for question, counts in self.question_stats.items()
+                       if counts[1])
+        return {'games': self.games,
+                'unfinished_games': self.unfinished,
+                'games_per_second': round(self.games / duration, 1) if duration else 0,
+                'rounds_mean': round(total_rounds / self.games, 3) if self.games else 0,
+                'rounds_p50': self.rounds_percentile(50),
+                'rounds_p99': self.rounds_percentile(99),
+                'rounds_max': max(self.rounds, default=None),
+                'simulated_hours': round(self.simulated_seconds / 3600, 2),
+                'win_share': {name: round(wins / self.games, 4) for name, wins in sorted(self.wins.items())},
+                'hardest_questions': [(question, round(rate, 4)) for rate, question in rates[:top]],
+                'easiest_questions': [(question, round(rate, 4)) for rate, question in rates[::-1][:top]]}
+
+
+def run_batch(task):
+    """
+    Plays a batch of games on one SimulatedTriviaServer and returns their SimulationResults.
+    Entry point of the worker processes.
+    """
+    seed, games, settings = task
+    random.seed(seed)
+    options = dict(answer_timeout=settings['answer_timeout'], close_round_early=settings['close_round_early'],
+                   scoring=settings['scoring'], max_rounds=settings['max_rounds'])
+    if settings['question_bank']:
+        options['questions'] = QuestionBank(settings['question_bank']).select(settings['category'],
+                                                                             settings['difficulty'])
+    server = SimulatedTriviaServer(**options)
+    latency = parse_latency(settings['latency'])
+    accuracies = settings['accuracy']
+    players = [FakePlayer(f"player{index}", accuracies[index % len(accuracies)], latency)
+               for index in range(settings['players'])]
+
+    results = SimulationResults()
+    for _ in range(games):
+        results.add(*server.play(players))
+    results.simulated_seconds = server.clock.monotonic()
+    results.question_stats = server.question_stats
+    return results
+
+
+def simulate(games, settings, workers=None, batch_size=1000, seed=0):
+    """
+    Plays `games` simulated games in batches spread over a pool of `workers` processes
+    (one per core by default) and returns the merged SimulationResults.
+    """
+    tasks = [(seed + start, min(batch_size, games - start), settings) for start in range(0, games, batch_size)]
+    results = SimulationResults()
+    if workers == 1:
+        for task in tasks:
+            results.merge(run_batch(task))
+        return results
+    with multiprocessing.Pool(workers) as pool:
+        for batch in pool.imap_unordered(run_batch, tasks):
+            results.merge(batch)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trivia game simulation on a virtual clock")
+    parser.add_argument('--games', type=int, default=10000, help="number of games to simulate")
+    parser.add_argument('--players', type=int, default=4, help="players per game")
+    parser.add_argument('--accuracy', type=float, nargs='+', default=[0.5],
+                        help="probability of a correct answer, cycled over the players")
+    parser.add_argument('--latency', default='uniform:0.2:2', help="answer delay distribution")
+    parser.add_argument('--answer-timeout', type=float, default=10, help="seconds each round waits for answers")
+    parser.add_argument('--close-round-early', action='store_true',
+                        help="end a round as soon as every player has answered")
+    parser.add_argument('--scoring', choices=['elimination', 'fastest'], default='elimination')
+    parser.add_argument('--question-bank', default=None, help="question bank file built with Question_Bank.py")
+    parser.add_argument('--category', default=None, help="only ask questions of this category")
+    parser.add_argument('--difficulty', type=int, default=None, help="only ask questions of this difficulty")
+    parser.add_argument('--max-rounds', type=int, default=1000, help="abandon a game without a winner after this many rounds")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--batch-size', type=int, default=1000, help="games per task handed to a worker")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    settings = dict(players=args.players, accuracy=args.accuracy, latency=args.latency,
+                    answer_timeout=args.answer_timeout, close_round_early=args.close_round_early,
+                    scoring=args.scoring, question_bank=args.question_bank, category=args.category,
+                    difficulty=args.difficulty, max_rounds=args.max_rounds)
+    start = time.perf_counter()
+    results = simulate(args.games, settings, args.workers, args.batch_size, args.seed)
+    report = results.summary(time.perf_counter() - start)
+
+    for key, value in report.items():
+        if isinstance(value, (list, dict)):
+            print(key)
+            items = value.items() if isinstance(value, dict) else value
+            for name, share in items:
+                print(f"  {share:<8} {name}")
+        else:
+            print(f"{key:<20} {value}")
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
@@ -0,0 +1,250 @@
+import queue
+import sqlite3
+from threading import Lock, Thread
+
+from Game_Log import GameLog
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    name TEXT PRIMARY KEY,
+    wins INTEGER NOT NULL DEFAULT 0,
+    games INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS players_wins ON players (wins);
+CREATE INDEX IF NOT EXISTS players_games ON players (games);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+UPSERT_WINS = ("INSERT INTO players (name, wins) VALUES (?, ?) "
+               "ON CONFLICT (name) DO UPDATE SET wins = wins + excluded.wins")
+UPSERT_GAMES = ("INSERT INTO players (name, games) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET games = games + excluded.games")
+UPSERT_COUNTER = ("INSERT INTO counters (name, value) VALUES (?, ?) "
+                  "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value")
+# The players with the K + 1 highest counts, K + 1 being the parameter: the extra row tells
+# whether more players are tied with the K-th count than were loaded
+TOP_PLAYERS = "SELECT name, {column} FROM players WHERE {column} > 0 ORDER BY {column} DESC LIMIT ?"
+TIED_PLAYERS = "SELECT name FROM players WHERE {column} = ?"
+
+
+class Leaderboard:
+    """
+    The K players with the highest value of a counter that only ever grows, plus every player
+    tied with the K-th highest value, so tied players are never left out of the leaders. Players
+    are kept in count -> names buckets: an update moves one name between two buckets, and the
+    lowest bucket is dropped once the buckets above it hold K players. Because counts never
+    decrease, a player outside the board can only enter it when one of its own updates reaches
+    the board's minimum, so the board stays exact.
+
+    Attributes:
+        size (int): K.
+        entries (dict): Name -> count of the players on the board.
+        buckets (dict): Count -> {name: None} of the players on the board, in the order they got there.
+        minimum (int): The lowest count on the board once it holds K players, 0 before.
+        best (int): The highest count on the board, 0 while it is empty.
+        unloaded (int): A count whose tied players were not all loaded from the database, or None.
+    """
+
+    def __init__(self, size, entries=()):
+        self.size = size
+        self.entries = {}
+        self.buckets = {}
+        self.minimum = 0
+        self.best = 0
+        self.unloaded = None
+        for name, count in entries:
+            self.update(name, count)
+
+    def update(self, name, count):
+        """
+        Records the new count of a player.
+        """
+        previous = self.entries.get(name)
+        if previous is None and count < self.minimum:
+            return
+        if previous is not None:
+            bucket = self.buckets[previous]
+            del bucket[name]
+            if not bucket:
+                del self.buckets[previous]
+        self.entries[name] = count
+        self.buckets.setdefault(count, {})[name] = None
+        self.best = max(self.best, count)
+        if len(self.entries) < self.size:
+            return
+        if previous == self.minimum and self.minimum not in self.buckets or not self.minimum:
+            self.minimum = min(self.buckets)  # At most K + 1 buckets on the board
+        while len(self.entries) - len(self.buckets[self.minimum]) >= self.size:
+            for dropped in self.buckets.pop(self.minimum):
+                del self.entries[dropped]
+            self.minimum = min(self.buckets)
+
+    def leaders(self):
+        """
+        Returns (highest count, players with that count). The count is 0 for an empty board.
+        """
+        if not self.entries:
+            return 0, []
+        return self.best, list(self.buckets[self.best])
+
+
+class StatsStore:
+    """
+    Durable player statistics in an SQLite database in WAL mode. Updates are applied to an
+    in-memory cache and top-K leaderboards right away, and persisted in batches by a background
+    writer thread, so the game threads never wait for the disk.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+        most_wins_board (Leaderboard): The players with the most wins.
+        most_games_board (Leaderboard): The players with the most games.
+        true_answers (int): Cumulative number of questions whose answer was true.
+        false_answers (int): Cumulative number of questions whose answer was false.
+    """
+
+    def __init__(self, path, top_k=10, batch_size=500, flush_interval=1.0, logger=None):
+        self.path = path
+        self.logger = logger or GameLog()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = Lock()
+        self.cache = {}  # name -> [wins, games] for the players seen by this process
+        self.pending = queue.Queue()
+
+        with sqlite3.connect(path) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self.most_wins_board = self._load_board(connection, 'wins', top_k)
+            self.most_games_board = self._load_board(connection, 'games', top_k)
+            counters = dict(connection.execute("SELECT name, value FROM counters"))
+        connection.close()
+        self.true_answers = counters.get('true_answers', 0)
+        self.false_answers = counters.get('false_answers', 0)
+
+        self.reader = sqlite3.connect(path, check_same_thread=False)
+        self.writer = Thread(target=self.write_batches, daemon=True)
+        self.writer.start()
+
+    @staticmethod
+    def _load_board(connection, column, top_k):
+        """
+        Builds a leaderboard from the K highest rows of a column. When more players are tied with
+        the K-th count, the board only notes that count instead of loading all of them.
+        """
+        rows = connection.execute(TOP_PLAYERS.format(column=column), (top_k + 1,)).fetchall()
+        board = Leaderboard(top_k, rows[:top_k])
+        if len(rows) > top_k and rows[top_k][1] == rows[top_k - 1][1]:
+            board.unloaded = rows[top_k][1]
+        return board
+
+    def _leaders(self, board, column):
+        """
+        Returns the leaders of a board, adding the tied players it did not load when they lead.
+        Must be called with the lock held.
+        """
+        best, leaders = board.leaders()
+        if best and best == board.unloaded:
+            stored = self.reader.execute(TIED_PLAYERS.format(column=column), (best,))
+            leaders = list(dict.fromkeys(leaders + [name for (name,) in stored]))
+        return best, leaders
+
+    def _player(self, name):
+        """
+        Returns the cached [wins, games] of a player, loading it with an indexed lookup on first use.
+        Must be called with the lock held.
+        """
+        counts = self.cache.get(name)
+        if counts is None:
+            row = self.reader.execute("SELECT wins, games FROM players WHERE name = ?", (name,)).fetchone()
+            counts = list(row) if row else [0, 0]
+            self.cache[name] = counts
+        return counts
+
+    def record_game(self, name):
+        """
+        Counts one more game for a player.
+        """
+        with self.lock:
+            counts = self._player(name)
+            counts[1] += 1
+            self.most_games_board.update(name, counts[1])
+        self.pending.put((UPSERT_GAMES, name))
+
+    def record_win(self, name):
+        """
+        Counts one more win for a player.
+        """
+        with self.lock:
+            counts = self._player(name)
+            counts[0] += 1
+            self.most_wins_board.update(name, counts[0])
+        self.pending.put((UPSERT_WINS, name))
+
+    def record_question(self, answer):
+        """
+        Counts one more asked question with the given true/false answer.
+        """
+        with self.lock:
+            if answer:
+                self.true_answers += 1
+            else:
+                self.false_answers += 1
+        self.pending.put((UPSERT_COUNTER, 'true_answers' if answer else 'false_answers'))
+
+    def most_wins(self):
+        """
+        Returns (most wins, players with that many wins) without a query.
+        """
+        with self.lock:
+            return self._leaders(self.most_wins_board, 'wins')
+
+    def most_games(self):
+        """
+        Returns (most games, players with that many games) without a query.
+        """
+        with self.lock:
+            return self._leaders(self.most_games_board, 'games')
+
+    def write_batches(self):
+        """
+        Writer thread: waits for updates and persists them in one transaction per batch, folding
+        repeated updates of the same row into one statement.
+        """
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        running = True
+        while running:
+            try:
+                batch = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            totals = {}
+            for update in batch:
+                if update is None:
+                    running = False
+                    continue
+                totals[update] = totals.get(update, 0) + 1
+            try:
+                with connection:
+                    for (statement, name), count in totals.items():
+                        connection.execute(statement, (name, count))
+            except sqlite3.Error as e:
+                self.logger.log('stats_failed', f"\033[31mError saving statistics: {e}\033[00m", error=str(e))
+        connection.close()
+
+    def close(self):
+        """
+        Persists every pending update and stops the writer thread.
+        """
+        self.pending.put(None)
+        self.writer.join()
+        self.reader.close()
@@ -1,10 +1,27 @@
+import argparse
 import socket
 import time
-from threading import Lock, Event
+from threading import RLock, Event
 import select
-import struct
 from Bot import *
 from threading import Thread
+from Protocol import LEGACY_VERSION, encode_welcome, parse_hello
+from Broadcast import OutboundBuffer, broadcast
+from Answer_Collector import AnswerCollector
+from Question_Bank import QuestionBank, QuestionDeck
+from Players import PlayerRegistry, ActiveSet, TopCounts
+from Messages import (ONLY_PLAYER, DISQUALIFIED_DATA, TextCache, round_message, winner_message,
+                      most_active_message, top_winners_message, true_false_rate_messages)
+from Round_Table import RoundTable, TRUE, FALSE, encode_answer
+from Game_Log import GameLog
+from Metrics import TriviaMetrics, MetricsServer
+from Offers import OfferBroadcaster, SERVER_NAME, UNLIMITED_SLOTS
+from Replay import GameRecord, ReplayWriter
+from Handshake_Stage import HandshakeStage
+from Clock import SYSTEM_CLOCK
+
+# Any routable address works: connecting a UDP socket only looks up the route, nothing is sent
+ROUTE_LOOKUP_ADDRESS = ("10.254.254.254", 1)
 
 
 class TriviaServer:
@@ -14,31 +31,72 @@ class TriviaServer:
     Attributes:
         host (str): The IP address of the server.
         udp_port (int): The UDP port number for broadcasting server offers.
-        tcp_port (int): The TCP port number for accepting client connections.
-        clients (list): A list to store connected clients (socket, address).
+        tcp_port (int): The TCP port number for accepting client connections, as bound.
+        clients (PlayerRegistry): The connected players.
+        outbound (dict): Maps each client socket to the OutboundBuffer queuing its outgoing messages.
         game_state (str): The state of the game, either 'waiting' or 'game'.
         udp_socket (socket.socket): The UDP socket for broadcasting server offers.
+        offers (OfferBroadcaster): Sends the offers and paces them by the server's load.
         tcp_socket (socket.socket): The TCP socket for accepting client connections.
-        lock (threading.Lock): A lock for thread safety.
+        handshakes (HandshakeStage): Accepts the connections and reads their handshake lines.
+        handshake_timeout (float): Seconds a new connection has to send its handshake line.
+        max_pending_handshakes (int): Most connections completing their handshake at once.
+        lock (threading.RLock): A lock for thread safety.
+        answer_timeout (int): Seconds each round waits for answers.
+        close_round_early (bool): End a round as soon as every active client has answered.
+        questions (sequence): The (question, answer) pairs to play, a list or a QuestionBank.
+        question_deck (QuestionDeck): The no-repeat draw of the current game.
+        stats_store (StatsStore): Optional durable store for the player and question statistics.
+        replays (ReplayWriter): Optional writer recording the transcript of every game.
+        logger (GameLog): Buffered logger used instead of printing on the game thread.
+        metrics (TriviaMetrics): Counters and histograms of the server's activity.
+        startup_time (float): Seconds it took to set up the server and bind its listener.
+        scoring (str): 'elimination' repeats a round until exactly one player is correct,
+            'fastest' lets only the fastest correct answer through, ending ties in one round.
+        slow_consumers (str): What happens to a player whose outbound queue goes over its high
+            watermark: 'disqualify' removes it from the game, 'drop' also closes its connection.
+        drain_timeout (float): Seconds the game-over message may take to reach the players.
+        texts (TextCache): The rendered stats lines, kept until their counters change.
+        clock: The clock timing the rounds and offers, SYSTEM_CLOCK or a Clock.VirtualClock.
     """
 
-    def __init__(self, udp_port=13117):
-        self.host = self.get_server_ip()
+    reuse_port = False  # Set by servers whose processes share one TCP port
+
+    def __init__(self, udp_port=13117, answer_timeout=10, close_round_early=False, questions=None,
+                 stats_store=None, logger=None, metrics=None, host=None, tcp_port=0, offer_group=None,
+                 scoring='elimination', replays=None, handshake_timeout=5, max_pending_handshakes=1024,
+                 slow_consumers='disqualify', clock=None):
+        started = time.perf_counter()
+        self.clock = clock or SYSTEM_CLOCK
+        self.logger = logger or GameLog()
+        self.metrics = metrics or TriviaMetrics()
+        self.host = host or self.get_server_ip()
         self.udp_port = udp_port
-        self.tcp_port = self.find_available_port()  # changed because it didn't work normally
-        self.clients = []
+        self.tcp_socket = self.open_listener(tcp_port)
+        self.tcp_port = self.tcp_socket.getsockname()[1]
+        self.clients = PlayerRegistry()
+        self.outbound = {}
         self.game_state = 'waiting'
-        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.lock = Lock()
+        self.udp_socket = self.open_offer_socket()
+        self.offers = OfferBroadcaster(self.udp_socket, SERVER_NAME, self.host, self.tcp_port, udp_port, offer_group)
+        self.lock = RLock()
         self.cumulative_true_answers = 0
         self.cumulative_false_answers = 0
         self.current_game_true_answers = 0
         self.current_game_false_answers = 0
         self.start_game_event = Event()
         self.MIN_PLAYERS = 2
-        self.player_wins = {}  # Tracks the number of wins per player
+        self.player_wins = TopCounts()  # Tracks the number of wins per player
+        self.answer_timeout = answer_timeout
+        self.close_round_early = close_round_early
+        self.scoring = scoring
+        self.slow_consumers = slow_consumers
+        self.drain_timeout = 2
+        self.replays = replays
+        self.handshake_timeout = handshake_timeout
+        self.max_pending_handshakes = max_pending_handshakes
+        self.handshakes = None
+        self.answer_collector = AnswerCollector(answer_timeout, close_round_early, self.metrics, self.outbound, self.clock)
 
         self.questions = [("Does Quentin Tarantino have a cameo in 'Pulp Fiction'?", True),
                 ("Is 'Reservoir Dogs' Quentin Tarantino's debut film?", True),
@@ -60,8 +118,18 @@ class TriviaServer:
                 ("Is 'Inglourious Basterds' a silent film?", False),
                 ("Does 'Death Proof' primarily revolve around stunt car driving?", True),
                 ("In 'Pulp Fiction,' does Vincent Vega survive the movie?", False)]
+        if questions is not None:
+            self.questions = questions
+        self.question_deck = QuestionDeck(self.questions)
 
-        self.player_activity = {}  # Tracks the number of ames each plater has participated in
+        self.player_activity = TopCounts()  # Tracks the number of ames each plater has participated in
+        self.texts = TextCache()
+
+        self.stats_store = stats_store
+        if stats_store:
+            self.cumulative_true_answers = stats_store.true_answers
+            self.cumulative_false_answers = stats_store.false_answers
+        self.startup_time = time.perf_counter() - started
 
     def start(self):
         """
@@ -71,12 +139,11 @@ class TriviaServer:
         while True:
             if flag:
                 flag = 0
-                self.tcp_socket.bind((self.host, self.tcp_port))  # Bind to an available port
-                self.tcp_socket.listen()
-                print(f"Server started, listening on IP address {self.host} on port {self.tcp_port}")
+                self.tcp_socket.listen(socket.SOMAXCONN)  # Room for connection bursts
+                self.log_startup()
 
                 Thread(target=self.accept_tcp_connections).start()
-                Thread(target=self.udp_broadcast).start()
+                Thread(target=self.udp_broadcast, daemon=True).start()
 
                 # Wait for a minimum number of players to connect
                 self.start_game_event.wait()
@@ -84,10 +151,10 @@ class TriviaServer:
 
                 # Once the minimum number of players have connected, start the game
                 self.start_game()
-            print(f"Server restarted, listening on IP address {self.host} on port {self.tcp_port}")
+            self.logger.log('server_restarted', f"Server restarted, listening on IP address {self.host} on port {self.tcp_port}",
+                            host=self.host, port=self.tcp_port)
 
             Thread(target=self.accept_tcp_connections).start()
-            Thread(target=self.udp_broadcast).start()
 
             # Wait for a minimum number of players to connect
             self.start_game_event.wait()
@@ -95,78 +162,107 @@ class TriviaServer:
             # Once the minimum number of players have connected, start the game
             self.start_game()
 
-    def udp_broadcast(self):
+    def offer_load(self):
         """
-            Broadcasts server offers over UDP to all devices in the network, following the specified packet format.
+            Returns the (open slots, players, lobby id) advertised in the offers. Games have no
+            player limit, so every slot is open while waiting and none while a game is running.
         """
-        magic_cookie = 0xabcddcba
-        message_type = 0x2
-        server_name = "MysticTriviaServer".ljust(32)  # Ensure the server name is 32 characters
+        open_slots = UNLIMITED_SLOTS if self.game_state == 'waiting' else 0
+        return open_slots, len(self.clients), 0
 
-        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        offer_message = struct.pack('!Ib32sH', magic_cookie, message_type, server_name.encode('utf-8'), self.tcp_port)
-        while self.game_state == 'waiting':
-            self.udp_socket.sendto(offer_message, ('<broadcast>', self.udp_port))
-            time.sleep(1)
+    def udp_broadcast(self):
+        """
+            Broadcasts server offers over UDP to all devices in the network for the lifetime of the server,
+            while it is waiting for players, at the pace the offer broadcaster sets for the current load.
+        """
+        while True:
+            open_slots, players, lobby_id = self.offer_load()
+            if open_slots:
+                try:
+                    self.offers.send(open_slots, players, lobby_id)
+                except OSError as e:
+                    self.logger.log('offer_failed', f"\033[31mError broadcasting offer: {e}\033[00m", error=str(e))
+            self.clock.sleep(self.offers.interval(open_slots, players))
 
     def accept_tcp_connections(self):
         """
-            Accepts and processes incoming TCP connections.
+            Accepts players until no one joined for 10 seconds. The handshakes of all new connections
+            are read concurrently, so a slow client cannot hold up the others.
         """
-        while True:
-            try:
-                client_socket, address = self.tcp_socket.accept()
-                self.tcp_socket.settimeout(10)  # Set a 10-second timeout for accept()
-                client_socket.setblocking(True)  # Make socket blocking to receive name
-                client_name = ''
-                while True:
-                    char = client_socket.recv(1).decode()  # Corrected to recv(1)
-                    if char == '\n':
-                        break
-                    client_name += char
-                client_name = client_name.strip()
-                client_socket.setblocking(False)
-
-                with self.lock:
-                    self.clients.append((client_socket, address, client_name))
-                self.update_player_activity(client_name)
-                print(f"New client {address} connected with name: {client_name}")
-
-            except socket.timeout:
-                break  # Explicitly breaking is optional, depends on desired flow
-
-        self.tcp_socket.settimeout(None)
+        if self.handshakes is None:
+            self.handshakes = HandshakeStage(self.tcp_socket, self.complete_handshake, self.max_pending_handshakes,
+                                             self.handshake_timeout, self.logger, self.metrics)
+        self.handshakes.run(idle_timeout=10)
 
         self.start_game_event.set()
 
+    def complete_handshake(self, client_socket, address, line):
+        """
+            Negotiates the protocol of a connection that sent its handshake line and adds the player.
+        """
+        version, client_name = parse_hello(line)
+        if version != LEGACY_VERSION:
+            # This server only speaks the text protocol, tell framed clients to fall back to it
+            try:
+                client_socket.send(encode_welcome(LEGACY_VERSION))  # A few bytes, they fit in the empty send buffer
+            except OSError as e:
+                client_socket.close()
+                self.logger.log('handshake_failed', f"\033[31mError answering {address}: {e}\033[00m",
+                                address=address, error=str(e))
+                self.metrics.handshakes_failed.inc()
+                return
+
+        with self.lock:
+            self.clients.add(client_socket, address, client_name)
+            self.outbound[client_socket] = OutboundBuffer(client_socket)
+        self.update_player_activity(client_name)
+        self.metrics.connections_accepted.inc()
+        self.metrics.connected_players.inc()
+        self.logger.log('client_connected', f"New client {address} connected with name: {client_name}",
+                        address=address, name=client_name)
+
     def get_server_ip(self):
         """
-        Retrieves the server's IP address by attempting to establish a UDP
-        connection with an external address. Falls back to a specified default if
-        any issues arise.
+        Retrieves the address of the interface holding the default route, from the local routing
+        table alone: connecting a UDP socket sends no packet. Falls back to the loopback address
+        on a machine without a route, so the server still starts offline.
         """
-        # Set your preferred default IP address here
-        default_server_ip = "192.168.1.1"  # Example default IP address
+        default_server_ip = "127.0.0.1"
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.connect(("8.8.4.4", 53))  # Google's public DNS server
+                sock.connect(ROUTE_LOOKUP_ADDRESS)
                 server_ip = sock.getsockname()[0]
-        except Exception as ex:
-            print(f"\033[31mFailed to get server IP, defaulting to {default_server_ip}. Error: {ex}\033[00m")
+        except OSError as ex:
+            self.logger.log('server_ip_failed', f"\033[31mNo network route, defaulting to {default_server_ip}. Error: {ex}\033[00m",
+                            error=str(ex))
             server_ip = default_server_ip
         return server_ip
 
-    def find_available_port(self):
+    def open_listener(self, port):
         """
-        Searches for an available (free) TCP port within the specified range.
-        Defaults to the dynamic and/or private ports range (49152-65535).
+        Creates the TCP socket for client connections and binds it to `port`; port 0 lets the
+        operating system pick a free port, read back from the socket afterwards.
+        """
+        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        tcp_socket.bind((self.host, port))
+        return tcp_socket
 
+    def open_offer_socket(self):
+        """
+        Creates the UDP socket the offers are sent from.
         """
-        for port in range(49152, 65536):
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                if sock.connect_ex(('localhost', port)) != 0:  # Port is free if connect_ex returns non-zero
-                    return port  # Return the first free port found
-        raise Exception("\033[31mFailed to find an available port in the specified range.\033[00m")
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def log_startup(self):
+        """
+        Logs the listening address and how long the server took to start.
+        """
+        self.logger.log('server_started', f"Server started in {self.startup_time * 1000:.1f} ms, "
+                                          f"listening on IP address {self.host} on port {self.tcp_port}",
+                        host=self.host, port=self.tcp_port, startup_ms=round(self.startup_time * 1000, 3))
 
     def start_game(self):
         """
@@ -175,346 +271,363 @@ class TriviaServer:
          updates clients based on results.
         """
         self.game_state = 'game'
-        print("Game starting with connected clients...")
-        active_clients = [client_socket for client_socket, _, name in self.clients]
-        client_names = {client_socket: name for client_socket, _, name in self.clients}
-
-        if len(active_clients) == 1:
-            cancellation_message = "\033[34mYou are the only registered player, the game is over.\033[00m"
-            print(cancellation_message)
-            for client_socket in active_clients:
-                try:
-                    client_socket.sendall(cancellation_message.encode())
-                except Exception as e:
-                    print(f"\033[31mError sending to client: {e}\033[00m")
+        self.logger.log('game_started', "Game starting with connected clients...", players=len(self.clients))
+        self.question_deck = QuestionDeck(self.questions)
+        # One {socket: name} mapping serves as both the active list and the name lookup
+        active_clients = ActiveSet.of(self.clients)
+        client_names = active_clients
+
+        if len(active_clients) < 2:
+            # Also reached with no player at all, when every joining connection went away
+            self.logger.log('game_cancelled', ONLY_PLAYER if active_clients else "No players joined, the game is over.")
+            self.send_message_to_all(ONLY_PLAYER, active_clients)
             self.stop_game()
             return
 
-        flag = False
+        record = GameRecord(0, active_clients) if self.replays else None
         round_num = 1
         while len(active_clients) > 1:
-            if flag:
-                names = ""
-                last = 0
-                for name in client_names.values():
-                    if last == 0:
-                        names += f"{name}"
-                        last += 1
-                    elif last == len(client_names.values()) - 1:
-                        names += f" and {name}"
-                    else:
-                        names += f", {name}"
-                        last += 1
-                question_text, correct_answer = self.pick_question()
-                welcome_message = f"\n\033[35mRound {round_num}, played by {names}:\n{question_text}\033[00m\n"
-            else:
-                question_text, correct_answer = self.pick_question()
-                flag = True
-                welcome_message = f"\033[35mWelcome to the Trivia Contest!\nHere's your question:\n{question_text}\033[00m\n"
-            print(welcome_message)
+            question_text, correct_answer = self.pick_question()
+            welcome_message = self.build_round_message(round_num, question_text, client_names)
+            self.logger.log('round_started', welcome_message, round=round_num, players=len(active_clients))
+            round_start = self.clock.perf_counter()
 
             # Send question to all active clients
             with self.lock:
                 self.send_message_to_all(welcome_message, active_clients)
 
             # Collect responses
-            responses = self.collect_responses(active_clients)
+            answered_at = {}
+            responses = self.collect_responses(active_clients, answered_at)
 
             # Determine round results
-            correct_responses, incorrect_responses, no_responses = self.determine_round_results(responses, correct_answer, client_names)
+            correct_responses, incorrect_responses, no_responses = self.determine_round_results(responses, correct_answer, client_names, answered_at)
+            if record:
+                eliminated = incorrect_responses + no_responses if correct_responses else []
+                record.add_round(round_num, question_text, correct_answer, responses, answered_at, client_names, eliminated)
             # Update active clients based on round result
             active_clients = self.update_active_clients(correct_responses, incorrect_responses, no_responses, active_clients, client_names)
-            client_names = {client_socket: name for client_socket, _, name in self.clients if
-                            client_socket in active_clients}
+            self.metrics.rounds_played.inc()
+            self.metrics.round_duration.observe(self.clock.perf_counter() - round_start)
 
             # Handling for no correct responses or more than one correct response
             if not correct_responses or len(correct_responses) > 1:
                 round_num += 1
-                print("\033[35mMoving to the next round with another question...\033[00m\n")
+                self.logger.log('next_round', "\033[35mMoving to the next round with another question...\033[00m\n")
                 continue
 
             # Handling for exactly one winner
-        self.announce_winner_and_cleanup(correct_responses[0], client_names)
+        if not active_clients:
+            # Every remaining player was lost to failed sends or evictions
+            self.logger.log('game_empty', "\033[31mAll players left the game.\033[00m")
+            self.save_replay(record, None)
+            self.stop_game()
+            return
+        self.save_replay(record, active_clients.first())
+        self.announce_winner_and_cleanup(active_clients.first(), client_names)
 
-    def send_message_to_all(self, message, active_clients):
+    def save_replay(self, record, winner):
         """
-        Sends a message to all active clients. Use threads to send the given message to each client
-        in `active_clients`. Handles any errors during sending and removes problematic clients.
+        Ends a game's record with its winner (None when nobody won) and queues it for the replay writer.
         """
-        def send_message(client_socket):
-            try:
-                client_socket.sendall(message.encode())
-            except Exception as e:
-                print(f"\033[31mError sending to client: {e}\033[00m")
-                with self.lock:
-                    active_clients.remove(client_socket)
-
-        threads = []
-        for client_socket in active_clients:
-            thread = Thread(target=send_message, args=(client_socket,))
-            thread.start()
-            threads.append(thread)
-
-        for thread in threads:
-            thread.join()  # Optionally wait for all threads to complete
+        if record:
+            record.finish(winner)
+            self.replays.submit(record)
 
-    def collect_responses(self, active_clients):
+    def build_round_message(self, round_num, question_text, client_names):
         """
-        Collects responses from active clients within a 10-second time limit.
+        Builds the message announcing a question. The first round gets the contest welcome,
+        later rounds list the players still in the game.
         """
-        responses = {client_socket: None for client_socket in active_clients}  # Initialize all responses to None
-        start_time = time.time()
+        return round_message(round_num, question_text, client_names)
 
-        while time.time() - start_time < 10:
-            time_left = 10 - (time.time() - start_time)
-            readable, _, _ = select.select(active_clients, [], [], time_left)
+    def send_message_to_all(self, message, active_clients):
+        """
+        Sends a message to all active clients. The message is encoded once and queued on every
+        client's outbound buffer, then flushed without blocking; what the kernel does not take yet
+        is flushed while the answers are collected. Removes clients whose socket fails and
+        evicts the ones that fell behind.
+        """
+        buffers = [self.outbound[client_socket] for client_socket in active_clients]
+        start = self.clock.perf_counter()
+        failed, lagging = broadcast(message.encode(), buffers)
+        self.metrics.fanout_time.observe(self.clock.perf_counter() - start)
+        for buffer in failed:
+            self.logger.log('send_failed', "\033[31mError sending to client: connection lost\033[00m")
+            self.metrics.connections_dropped.inc()
+            active_clients.remove(buffer.sock)
+        self.evict_slow_consumers([buffer.sock for buffer in lagging], active_clients)
 
-            for client_socket in readable:
-                data = client_socket.recv(1024).strip()
-                responses[client_socket] = data.decode()  # Store the response
+    def evict_slow_consumers(self, connections, active_clients):
+        """
+        Removes players whose outbound queue went over its high watermark from the game, so they
+        cannot hold up its rounds. With the 'drop' policy their connections are closed as well.
+        """
+        for connection in connections:
+            client_name = active_clients[connection]
+            self.logger.log('slow_consumer', f"\033[31m{client_name} is not keeping up and leaves the game.\033[00m",
+                            name=client_name, policy=self.slow_consumers)
+            self.metrics.slow_consumers.inc()
+            active_clients.remove(connection)
+            if self.slow_consumers == 'drop':
+                self.drop_connection(connection)
 
-            if all(response is not None for response in responses.values()):
-                # All clients have responded, now wait for the remaining time to finish 10 seconds
-                time.sleep(time_left)
-                break
+    def drop_connection(self, client_socket):
+        """
+        Closes a client connection in the middle of a game and forgets its player.
+        """
+        self.answer_collector.unregister(client_socket)
+        with self.lock:
+            player = self.clients.find(client_socket)
+            if player:
+                self.clients.remove(player)
+                self.metrics.connected_players.dec()
+            self.outbound.pop(client_socket, None)
+        client_socket.close()
+        self.metrics.connections_dropped.inc()
 
-        return responses
+    def collect_responses(self, active_clients, answered_at=None):
+        """
+        Collects responses from active clients within the `answer_timeout` time limit, stamping
+        their answer times into `answered_at` when it is given.
+        """
+        return self.answer_collector.collect(active_clients, answered_at)
 
-    def determine_round_results(self, responses, correct_answer, client_names):
+    def determine_round_results(self, responses, correct_answer, client_names, answered_at=None):
         """
-         Determines the results of a round based on client responses.
+         Determines the results of a round based on client responses. The responses are resolved
+         by a RoundTable; invalid answers count as incorrect. With 'fastest'
+         scoring, correct players slower than the fastest one are returned with the incorrect ones.
+         `answered_at` maps the players to their answer times in nanoseconds, which are logged.
         """
-        correct_responses = []
-        incorrect_responses = []
-        no_response_clients = []
+        answered_at = answered_at or {}
+        table = RoundTable(responses, answered_at)
+        if self.scoring == 'fastest':
+            correct_responses, slower_responses, incorrect_responses, no_response_clients = \
+                table.resolve_fastest(correct_answer)
+        else:
+            correct_responses, incorrect_responses, no_response_clients = table.resolve(correct_answer)
+            slower_responses = []
+        invalid_responses = set(table.invalid()) if incorrect_responses else set()
+
+        for client_socket in correct_responses:
+            latency = self.format_latency(answered_at.get(client_socket))
+            self.logger.log('correct_answer', f"\033[32m{client_names[client_socket]} is correct!{latency}\033[00m",
+                            name=client_names[client_socket], latency_ns=answered_at.get(client_socket))
+        for client_socket in slower_responses:
+            latency = self.format_latency(answered_at.get(client_socket))
+            self.logger.log('slower_answer', f"\033[93m{client_names[client_socket]} is correct, but slower!{latency}\033[00m",
+                            name=client_names[client_socket], latency_ns=answered_at.get(client_socket))
+        for client_socket in incorrect_responses:
+            latency = self.format_latency(answered_at.get(client_socket))
+            if client_socket in invalid_responses:
+                self.logger.log('invalid_answer', f"\033[93m{client_names[client_socket]} provided an invalid response.\033[00m",
+                                name=client_names[client_socket], latency_ns=answered_at.get(client_socket))
+            else:
+                self.logger.log('incorrect_answer', f"\033[93m{client_names[client_socket]} is incorrect!{latency}\033[00m",
+                                name=client_names[client_socket], latency_ns=answered_at.get(client_socket))
+        for client_socket in no_response_clients:
+            self.logger.log('no_answer', f"\033[93m{client_names[client_socket]} did not answer.\033[00m",
+                            name=client_names[client_socket])
 
-        # Normalize the correct answer to '1' or '0'
-        normalized_correct_answer = '1' if correct_answer else '0'
+        return correct_responses, slower_responses + incorrect_responses, no_response_clients
 
-        for client_socket, response in responses.items():
-            if response is None:
-                no_response_clients.append(client_socket)
-                print(f"\033[93m{client_names[client_socket]} did not answer.\033[00m")
-            else:
-                # Normalize the response to '1' or '0'
-                normalized_response = self.normalize_response(response)
-
-                if normalized_response == normalized_correct_answer:
-                    correct_responses.append(client_socket)
-                    print(f"\033[32m{client_names[client_socket]} is correct!\033[00m")
-                elif normalized_response is None:
-                    # Handle None normalized responses as incorrect (invalid input)
-                    incorrect_responses.append(client_socket)
-                    print(f"\033[93m{client_names[client_socket]} provided an invalid response.\033[00m")
-                else:
-                    incorrect_responses.append(client_socket)
-                    print(f"\033[93m{client_names[client_socket]} is incorrect!\033[00m")
-
-        return correct_responses, incorrect_responses, no_response_clients
+    def format_latency(self, latency_ns):
+        """
+        Formats an answer time in nanoseconds for the log, or returns '' when there is none.
+        """
+        if latency_ns is None:
+            return ""
+        return f" ({latency_ns / 1e6:.1f} ms)"
 
     def normalize_response(self, response):
         """
         Normalizes a client's response to '1' or '0' (yes or no).
 
         """
-        if response.upper() in ['Y', 'T', '1']:
+        code = encode_answer(response)
+        if code == TRUE:
             return '1'
-        elif response.upper() in ['N', 'F', '0']:
+        elif code == FALSE:
             return '0'
         else:
             return None  # Consider an invalid response as incorrect
 
     def update_active_clients(self, correct_responses, incorrect_responses, no_response_clients, active_clients, client_names):
         """
-        Updates the list of active clients based on round results.
+        Updates the active clients in place based on round results.
 
         """
         # If no correct responses, all players proceed to the next round
         if not correct_responses:
-            print("\033[35mNo correct answers, all players proceed to the next round.\033[00m")
+            self.logger.log('no_correct_answers', "\033[35mNo correct answers, all players proceed to the next round.\033[00m")
             return active_clients  # No change in active clients
 
-        def disqualify_client(client_socket, message):
-            try:
-                client_socket.sendall(message.encode())
-            except Exception as e:
-                print(f"\033[31mError sending to client: {e}\033[00m")
-
-        threads = []
-        message = "You have been disqualified (loser)\n"
-        for client_socket in incorrect_responses + no_response_clients:
-            client_name = client_names[client_socket]
-            print(f"\033[35m{client_name} is disqualified.\033[00m")
-            thread = Thread(target=disqualify_client, args=(client_socket, message))
-            thread.start()
-            threads.append(thread)
-
-        for thread in threads:
-            thread.join()
+        self.disqualify_clients(incorrect_responses + no_response_clients, client_names)
 
-        updated_active_clients = [client_socket for client_socket in correct_responses if client_socket in active_clients]
+        active_clients.retain(correct_responses)
 
         # Log updates
-        if len(updated_active_clients) != 1:
-            for client_socket in updated_active_clients:
+        if len(active_clients) != 1:
+            for client_socket in active_clients:
                 client_name = client_names[client_socket]
-                print(f"\033[35m{client_name} proceeds to the next round.\033[00m")
-        return updated_active_clients
+                self.logger.log('player_proceeds', f"\033[35m{client_name} proceeds to the next round.\033[00m", name=client_name)
+        return active_clients
+
+    def disqualify_clients(self, losers, client_names):
+        """
+        Notifies every losing client that it has been disqualified with one shared message buffer.
+        """
+        for client_socket in losers:
+            client_name = client_names[client_socket]
+            self.logger.log('player_disqualified', f"\033[35m{client_name} is disqualified.\033[00m", name=client_name)
+
+        buffers = [self.outbound[client_socket] for client_socket in losers if client_socket in self.outbound]
+        failed, _ = broadcast(DISQUALIFIED_DATA, buffers)  # Lagging losers leave the game anyway
+        for buffer in failed:
+            self.logger.log('send_failed', f"\033[31mError sending to client: {client_names[buffer.sock]}\033[00m",
+                            name=client_names[buffer.sock])
+            self.metrics.connections_dropped.inc()
 
     def update_player_activity(self, client_name):
         """
         Updates the activity count for a client.
 
         """
+        if self.stats_store:
+            self.stats_store.record_game(client_name)
+            return
+
         # Increment the count of games this player has participated in
-        if client_name in self.player_activity:
-            self.player_activity[client_name] += 1
-        else:
-            self.player_activity[client_name] = 1
+        self.player_activity.add(client_name)
 
     def send_most_active_players_stats(self):
         """
         Sends stats of the most active players.
         """
-        # Determine the maximum number of games played
-        if not self.player_activity:
-            most_games = 0
-        else:
-            most_games = max(self.player_activity.values())
+        most_games, most_active_players = self.most_active_players()
+        if not most_active_players:
+            # A game resumed after a restart can end before this process counted any game
+            self.logger.log('no_games', "No games have been counted yet")
+            return "No games have been counted yet\n"
 
-        # Collect all players who have played the maximum number of games
-        most_active_players = [name for name, games in self.player_activity.items() if games == most_games]
+        # Counts only grow, so the top players can't change without their count or number changing
+        message = self.texts.get('most_active', (most_games, len(most_active_players)),
+                                 most_active_message, most_games, most_active_players)
+        self.logger.log('most_active_players', message, games=most_games, players=most_active_players)
+        return message
 
-        # Format the message based on the number of top players
-        if len(most_active_players) > 1:
-            most_active_message = f"Most active players each with {most_games} games: " + ", ".join(most_active_players) + " (nerds)\n"
-        else:
-            most_active_message = f"Most active player: {most_active_players[0]} with {most_games} games (nerd).\n"
-
-        print(most_active_message)  # Server-side log
-        return most_active_message
+    def most_active_players(self):
+        """
+        Returns the highest number of games played and the players who played that many.
+        """
+        if self.stats_store:
+            return self.stats_store.most_games()
+        return self.player_activity.top()
 
     def update_player_wins(self, winner_name):
         """
         Updates the win count for a player.
 
         """
-        if winner_name in self.player_wins:
-            self.player_wins[winner_name] += 1
-        else:
-            self.player_wins[winner_name] = 1
+        if self.stats_store:
+            self.stats_store.record_win(winner_name)
+            return
+        self.player_wins.add(winner_name)
 
     def send_most_wins_stats(self):
         """
         Sends stats of players with the most wins.
         """
-        if not self.player_wins:
-            print("No games have been won yet")
+        max_wins, top_winners = self.top_winners()
+        if not top_winners:
+            self.logger.log('no_winners', "No games have been won yet")
+            return "No games have been won yet\n"
 
-        # Find the maximum number of wins and who achieved it
-        max_wins = max(self.player_wins.values())
-        top_winners = [name for name, wins in self.player_wins.items() if wins == max_wins]
+        message = self.texts.get('top_winners', (max_wins, len(top_winners)), top_winners_message, max_wins, top_winners)
+        self.logger.log('top_winners', message, wins=max_wins, players=top_winners)
+        return message
 
-        # Format the message based on the number of top winners
-        if len(top_winners) > 1:
-            top_winners_message = f"Top winners, each with {max_wins} wins: " + ", ".join(top_winners) + "\n"
-        else:
-            top_winners_message = f"Top winner: {top_winners[0]} with {max_wins} wins.\n"
-        print(top_winners_message)
-        return top_winners_message
+    def top_winners(self):
+        """
+        Returns the highest number of wins and the players who won that many games.
+        """
+        if self.stats_store:
+            return self.stats_store.most_wins()
+        return self.player_wins.top()
 
     def display_true_false_rate(self):
         """
         Calculate and display statistics after a game.
         """
-        total_questions = self.cumulative_true_answers + self.cumulative_false_answers
-        current_game_total = self.current_game_true_answers + self.current_game_false_answers
-
-        if total_questions > 0:  # Avoid division by zero
-            cumulative_true_pct = self.cumulative_true_answers / total_questions
-            cumulative_false_pct = self.cumulative_false_answers / total_questions
-        else:
-            cumulative_true_pct = cumulative_false_pct = 0
-
-        if current_game_total > 0:
-            current_game_true_pct = self.current_game_true_answers / current_game_total
-            current_game_false_pct = self.current_game_false_answers / current_game_total
-        else:
-            current_game_true_pct = current_game_false_pct = 0
-
-        # Print statistics in a table format
-        print("+--------------------------------+")
-        print("| Statistic                | Value |")
-        print("+--------------------------------+")
-        print(f"| Cumulative True Answers   | {cumulative_true_pct:.2%} |")
-        print(f"| Cumulative False Answers  | {cumulative_false_pct:.2%} |")
-        print("+--------------------------------+")
-        print(f"| Current Game True Answers | {current_game_true_pct:.2%} |")
-        print(f"| Current Game False Answers| {current_game_false_pct:.2%} |")
-        print("+--------------------------------+")
+        stats = self.format_true_false_rate(self.current_game_true_answers, self.current_game_false_answers)
 
         # Reset current game statistics
         self.current_game_true_answers = 0
         self.current_game_false_answers = 0
 
-        # Return the statistics as a string
-        return (f"Cumulative True Answers: {cumulative_true_pct:.2%}\n"
-                f"Cumulative False Answers: {cumulative_false_pct:.2%}\n"
-                f"Current Game True Answers: {current_game_true_pct:.2%}\n"
-                f"Current Game False Answers: {current_game_false_pct:.2%}")
+        return stats
+
+    def format_true_false_rate(self, current_game_true_answers, current_game_false_answers):
+        """
+        Logs the cumulative and current game true/false answer rates as a table and returns them as a string.
+        Both are rendered again only when one of the question counters changed.
+        """
+        counters = (self.cumulative_true_answers, self.cumulative_false_answers,
+                    current_game_true_answers, current_game_false_answers)
+        table, text, cumulative_true_pct, current_game_true_pct = self.texts.get(
+            'true_false_rate', counters, true_false_rate_messages, *counters)
+        self.logger.log('true_false_rate', table,
+                        cumulative_true=cumulative_true_pct, current_game_true=current_game_true_pct)
+        return text
 
     def announce_winner_and_cleanup(self, winner_socket, client_names):
         """
         Announces the winner and performs cleanup. Congratulates the winner and updates player wins.
-        Sends a game-over message with stats to all clients using threads, then stops the game.
+        Sends a game-over message with stats to all clients, encoded once, then stops the game.
         """
         winner_name = client_names[winner_socket]
-        winner_message = f"\033[34mCongratulations to {winner_name}, the winner of this game!\033[00m\n"
-        print(winner_message)
+        self.logger.log('game_won', f"\033[34mCongratulations to {winner_name}, the winner of this game!\033[00m\n",
+                        name=winner_name)
+        self.metrics.games_played.inc()
         self.update_player_wins(winner_name)
 
-        game_over_message = (f"\033[34mGame over!\nCongratulations to the winner: {winner_name}\033[00m\n" +
-                             "\n" + self.send_most_active_players_stats() + '\n' +
+        game_over_message = (winner_message(winner_name) + "\n" + self.send_most_active_players_stats() + '\n' +
                              self.send_most_wins_stats() + '\n' + self.display_true_false_rate())
 
-        threads = []
         with self.lock:
-            for client_socket, _, _ in self.clients:
-                thread = Thread(target=self.send_game_over_message, args=(client_socket, game_over_message))
-                thread.start()
-                threads.append(thread)
-
-        for thread in threads:
-            thread.join()
+            names = {self.outbound[player.connection]: player.name for player in self.clients}
+        failed, lagging = broadcast(game_over_message.encode(), list(names), self.drain_timeout)
+        for buffer in failed:
+            self.logger.log('send_failed', "\033[31mError sending summary to client: connection lost\033[00m")
+            self.metrics.connections_dropped.inc()
+        for buffer in lagging:  # Every connection is closed right after, the summary is all they miss
+            client_name = names[buffer]
+            self.logger.log('slow_consumer', f"\033[31m{client_name} is not keeping up and misses the game summary.\033[00m",
+                            name=client_name, policy=self.slow_consumers)
+            self.metrics.slow_consumers.inc()
 
         self.stop_game()
 
-    def send_game_over_message(self, client_socket, message):
-        """
-        Sends a game-over message to a client.
-        Tries to send the given message to the client's socket. Logs an error if sending fails.
-        """
-        try:
-            client_socket.sendall(message.encode())
-        except Exception as e:
-            print(f"\033[31mError sending summary to client: {e}\033[00m")
-
     def stop_game(self):
         """
         Handles the end-of-game tasks: closing client connections, announcing the game's conclusion,
         and resetting the server state to begin sending out offer messages again.
         """
         # Close all client connections
+        self.answer_collector.clear()
         with self.lock:
-            for client_socket, _, __ in self.clients:
+            for player in self.clients:
                 try:
-                    client_socket.close()  # Attempt to close each connection gracefully
+                    player.connection.close()  # Attempt to close each connection gracefully
                 except Exception as e:
-                    print(f"\033[31mError closing client socket: {e}\033[00m")
+                    self.logger.log('close_failed', f"\033[31mError closing client socket: {e}\033[00m", error=str(e))
+            self.metrics.connected_players.dec(len(self.clients))
             self.clients.clear()  # Clear the list of clients for the next game
+            self.outbound.clear()
 
         # Announce game over and that the server will resume sending out offers
-        print("Game over, sending out offer requests...")
+        self.logger.log('game_over', "Game over, sending out offer requests...")
 
         # Reset the game state and clear any events if necessary
         self.game_state = 'waiting'
@@ -523,24 +636,122 @@ class TriviaServer:
 
     def pick_question(self):
         """
-        Randomly selects a trivia question from the list.
+        Randomly selects a trivia question, never repeating one within a game.
         """
-        question, answer = random.choice(self.questions)
+        question, answer = self.question_deck.draw()
         # Update cumulative and current game statistics
+        self.count_question(answer)
         if answer:
-            self.cumulative_true_answers += 1
             self.current_game_true_answers += 1
         else:
-            self.cumulative_false_answers += 1
             self.current_game_false_answers += 1
         return question, answer
 
+    def count_question(self, answer):
+        """
+        Adds an asked question to the cumulative statistics.
+        """
+        if answer:
+            self.cumulative_true_answers += 1
+        else:
+            self.cumulative_false_answers += 1
+        if self.stats_store:
+            self.stats_store.record_question(answer)
+
 
 if __name__ == '__main__':
-    server = TriviaServer()
+    parser = argparse.ArgumentParser(description="Trivia game server")
+    parser.add_argument('--asyncio', action='store_true',
+                        help="serve every client from a single asyncio event loop instead of threads")
+    parser.add_argument('--host', default=None,
+                        help="address to listen on and advertise (default: the interface of the default route)")
+    parser.add_argument('--port', type=int, default=0, help="TCP port to listen on (default: any free port)")
+    parser.add_argument('--lobby-size', type=int, default=None,
+                        help="with --asyncio, start a lobby as soon as this many players joined it")
+    parser.add_argument('--answer-timeout', type=float, default=10,
+                        help="seconds each round waits for answers")
+    parser.add_argument('--close-round-early', action='store_true',
+                        help="end a round as soon as every player has answered")
+    parser.add_argument('--question-bank', default=None,
+                        help="question bank file built with Question_Bank.py, instead of the built-in questions")
+    parser.add_argument('--category', default=None, help="only ask questions of this category")
+    parser.add_argument('--difficulty', type=int, default=None, help="only ask questions of this difficulty")
+    parser.add_argument('--stats-db', default=None,
+                        help="SQLite database keeping the player statistics across restarts")
+    parser.add_argument('--log-format', choices=['console', 'json'], default='console',
+                        help="write log records as colored console text or as JSON lines")
+    parser.add_argument('--log-file', default=None, help="append the log to this file instead of the console")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve metrics on http://127.0.0.1:PORT/metrics (workers use PORT + worker index)")
+    parser.add_argument('--checkpoint', default=None,
+                        help="save the running games to this file after every round and resume them on restart "
+                             "(requires --asyncio)")
+    parser.add_argument('--resume-grace', type=float, default=30,
+                        help="seconds a resumed game waits for its players to rejoin")
+    parser.add_argument('--replay-file', default=None,
+                        help="record every game in this binary replay file (read it with Replay.py)")
+    parser.add_argument('--scoring', choices=['elimination', 'fastest'], default='elimination',
+                        help="'fastest' ends a round with several correct answers by letting only the fastest one through")
+    parser.add_argument('--offer-group', default=None, metavar='GROUP',
+                        help="send the extended offers (with the server's load) to this multicast group, "
+                             "e.g. 239.255.13.117, instead of broadcasting them")
+    parser.add_argument('--handshake-timeout', type=float, default=5,
+                        help="seconds a new connection has to send its player name before it is dropped")
+    parser.add_argument('--max-pending-handshakes', type=int, default=1024,
+                        help="most connections completing their handshake at once; the next ones wait to be accepted")
+    parser.add_argument('--slow-consumers', choices=['disqualify', 'drop'], default='disqualify',
+                        help="what happens to a player whose unsent messages exceed the outbound limit: "
+                             "'disqualify' removes it from the game, 'drop' also closes its connection")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="fork this many asyncio worker processes sharing the TCP port and statistics")
+    args = parser.parse_args()
+    if args.workers and args.replay_file:
+        parser.error("--replay-file cannot be combined with --workers, the workers would append to one file")
+    if args.workers and args.stats_db:
+        parser.error("--stats-db cannot be combined with --workers, the workers share their statistics in memory")
+    if args.checkpoint and (args.workers or not args.asyncio):
+        parser.error("--checkpoint is only supported by the single-process --asyncio server")
+
+    options = dict(answer_timeout=args.answer_timeout, close_round_early=args.close_round_early,
+                   host=args.host, tcp_port=args.port, offer_group=args.offer_group,
+                   scoring=args.scoring, handshake_timeout=args.handshake_timeout,
+                   max_pending_handshakes=args.max_pending_handshakes, slow_consumers=args.slow_consumers)
+    log_stream = open(args.log_file, 'a') if args.log_file else None
+    options['logger'] = GameLog(args.log_format, log_stream)
+    if args.question_bank:
+        options['questions'] = QuestionBank(args.question_bank).select(args.category, args.difficulty)
+    if args.replay_file:
+        options['replays'] = ReplayWriter(args.replay_file, logger=options['logger'])
+    if args.stats_db:
+        from Stats_Store import StatsStore
+        options['stats_store'] = StatsStore(args.stats_db, logger=options['logger'])
+    if args.workers:
+        from Prefork_Trivia import PreforkTriviaServer
+        server = PreforkTriviaServer(workers=args.workers, lobby_size=args.lobby_size,
+                                     metrics_port=args.metrics_port, **options)
+    elif args.asyncio:
+        from Async_Trivia import AsyncTriviaServer
+        if args.checkpoint:
+            from Checkpoint import CheckpointStore
+            options['checkpoints'] = CheckpointStore(args.checkpoint)
+            options['resume_grace'] = args.resume_grace
+        server = AsyncTriviaServer(lobby_size=args.lobby_size, **options)
+    else:
+        server = TriviaServer(**options)
+    if args.metrics_port and not args.workers:
+        MetricsServer(server.metrics, args.metrics_port)
     try:
         # Start the server
         server.start()
     except KeyboardInterrupt:
         # Stop the server if interrupted by Ctrl+C
         server.stop_game()
+    finally:
+        if server.stats_store:
+            # Persist the statistics still waiting for the writer thread
+            server.stats_store.close()
+        if options.get('checkpoints'):
+            options['checkpoints'].close()
+        if options.get('replays'):
+            # Write the games still waiting for the writer thread
+            options['replays'].close()
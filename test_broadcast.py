@@ -0,0 +1,32 @@
+import socket
+import unittest
+
+from Broadcast import OutboundBuffer, broadcast
+
+
+class BroadcastTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server_side, self.client_side = socket.socketpair()
+        self.server_side.setblocking(False)
+
+    def tearDown(self):
+        self.server_side.close()
+        self.client_side.close()
+
+    def test_refused_message_is_reported_after_the_queue_drained(self):
+        buffer = OutboundBuffer(self.server_side, high_watermark=10, low_watermark=5)
+        buffer.queue(memoryview(b'x' * 20))
+        failed, lagging = broadcast(b'GAME_OVER', [buffer])
+        self.assertEqual((failed, lagging), ([], [buffer]))
+        self.assertFalse(buffer.lagging)
+        self.assertEqual(self.client_side.recv(64), b'x' * 20)
+
+    def test_delivered_message_reports_nothing(self):
+        buffer = OutboundBuffer(self.server_side)
+        self.assertEqual(broadcast(b'GAME_OVER', [buffer]), ([], []))
+        self.assertEqual(self.client_side.recv(64), b'GAME_OVER')
+
+
+if __name__ == '__main__':
+    unittest.main()
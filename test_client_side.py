@@ -0,0 +1,85 @@
+import socket
+import time
+import unittest
+from threading import Thread
+
+from Client_Side import TriviaClient
+from Protocol import LEGACY_VERSION, RESUME_REJECTED, encode_frame
+
+
+def free_port():
+    """
+    Returns a loopback TCP port nothing listens on.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+class LegacyServer:
+    """
+    A server from before the framed protocol: it reads a line from each connection and never
+    sends a welcome frame.
+    """
+
+    def __init__(self, connections, reply=b''):
+        self.reply = reply
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        self.lines = []
+        self.thread = Thread(target=self.serve, args=(connections,), daemon=True)
+        self.thread.start()
+
+    def serve(self, connections):
+        for _ in range(connections):
+            connection, _ = self.listener.accept()
+            with connection:
+                self.lines.append(connection.makefile('rb').readline())
+                connection.sendall(self.reply)
+
+    def close(self):
+        self.listener.close()
+
+
+class TriviaClientTest(unittest.TestCase):
+
+    def test_framed_client_falls_back_to_legacy_server(self):
+        server = LegacyServer(connections=2)
+        client = TriviaClient('alice', input_mode='terminal')
+        client.discovery = None
+        client.handshake_timeout = 0.2
+        try:
+            self.assertTrue(client.connect_to_server('127.0.0.1', server.port))
+            self.assertEqual(client.protocol_version, LEGACY_VERSION)
+            client.cleanup()
+            server.thread.join(2)
+            self.assertEqual(server.lines[-1], b"alice\n")
+        finally:
+            client.cleanup()
+            server.close()
+
+    def test_failed_resume_returns_false(self):
+        client = TriviaClient('alice', input_mode='terminal')
+        client.session_token = '00' * 16
+        client.handshake_timeout = 0.2
+        self.assertFalse(client.try_resume('127.0.0.1', free_port()))
+        self.assertIsNone(client.tcp_socket)
+
+    def test_rejected_session_ends_resume_at_once(self):
+        server = LegacyServer(connections=1, reply=encode_frame(RESUME_REJECTED))
+        client = TriviaClient('alice', input_mode='terminal')
+        client.session_token = '00' * 16
+        client.server_address = ('127.0.0.1', server.port)
+        started = time.monotonic()
+        try:
+            self.assertFalse(client.resume_session())
+            self.assertLess(time.monotonic() - started, client.resume_grace)
+            self.assertIsNone(client.tcp_socket)
+        finally:
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
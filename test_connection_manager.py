@@ -0,0 +1,36 @@
+import unittest
+
+from Connection_Manager import ConnectionManager
+
+
+class CandidatesTest(unittest.TestCase):
+
+    def test_last_server_leads_while_its_offer_is_fresh(self):
+        connections = ConnectionManager(max_age=5)
+        connections.offer(('10.0.0.1', 2000), (3, 1, 0))
+        connections.offer(('10.0.0.2', 2000), (1, 5, 0))
+        connections.connected(('10.0.0.2', 2000), 0.01)
+        self.assertEqual(connections.candidates(), [('10.0.0.2', 2000), ('10.0.0.1', 2000)])
+
+    def test_stale_last_server_goes_through_discovery(self):
+        connections = ConnectionManager(max_age=5)
+        connections.offer(('10.0.0.1', 2000), age=30)
+        connections.connected(('10.0.0.1', 2000), 0.01)
+        self.assertEqual(connections.candidates(), [])
+        connections.offer(('10.0.0.1', 2000))
+        self.assertEqual(connections.candidates(), [('10.0.0.1', 2000)])
+
+
+class SpeaksFramesTest(unittest.TestCase):
+
+    def test_servers_heard_only_through_original_offers_are_not_probed(self):
+        connections = ConnectionManager()
+        connections.offer(('10.0.0.1', 2000))
+        connections.offer(('10.0.0.2', 2000), (1, 0, 0))
+        self.assertFalse(connections.speaks_frames(('10.0.0.1', 2000)))
+        self.assertTrue(connections.speaks_frames(('10.0.0.2', 2000)))
+        self.assertTrue(connections.speaks_frames(('10.0.0.3', 2000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
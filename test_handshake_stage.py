@@ -0,0 +1,88 @@
+import asyncio
+import socket
+import time
+import unittest
+from threading import Thread
+
+from Game_Log import NullLog
+from Async_Trivia import AsyncTriviaServer
+from Handshake_Stage import HandshakeStage
+from Trivia import TriviaServer
+
+
+class HandshakeStageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.address = self.listener.getsockname()
+        self.joined = []
+        self.stage = HandshakeStage(self.listener, lambda sock, address, line: self.joined.append((sock, line)),
+                                    handshake_timeout=0.5)
+        self.runner = Thread(target=self.stage.run, kwargs={'idle_timeout': 0.3}, daemon=True)
+
+    def tearDown(self):
+        for client_socket, _ in self.joined:
+            client_socket.close()
+        self.listener.close()
+
+    def test_failed_handshakes_do_not_end_the_join_window(self):
+        self.runner.start()
+        socket.create_connection(self.address).close()
+        time.sleep(0.8)
+        self.assertTrue(self.runner.is_alive())
+
+        with socket.create_connection(self.address) as client:
+            client.sendall(b"bob\n")
+            self.runner.join(2)
+        self.assertFalse(self.runner.is_alive())
+        self.assertEqual([line for _, line in self.joined], ["bob"])
+
+    def test_blank_handshake_lines_are_rejected(self):
+        self.runner.start()
+        with socket.create_connection(self.address, timeout=2) as client:
+            client.sendall(b"\n")
+            self.assertEqual(client.recv(1), b'')
+        self.assertEqual(self.joined, [])
+
+
+class AsyncHandshakeTest(unittest.TestCase):
+
+    def test_closed_and_partial_handshakes_register_no_player(self):
+        server = AsyncTriviaServer(host='127.0.0.1', logger=NullLog())
+
+        async def connect_and_close():
+            server.loop = asyncio.get_running_loop()
+            server.tcp_socket.listen()
+            server.tcp_socket.setblocking(False)
+            listener = await asyncio.start_server(server.handle_connection, sock=server.tcp_socket)
+            address = server.tcp_socket.getsockname()
+            for data in (b'', b'bo', b'\n'):
+                reader, writer = await asyncio.open_connection(*address)
+                writer.write(data)
+                writer.close()
+            await asyncio.sleep(0.2)
+            listener.close()
+
+        try:
+            asyncio.run(connect_and_close())
+            self.assertEqual(len(server.clients), 0)
+        finally:
+            server.udp_socket.close()
+
+
+class StartGameTest(unittest.TestCase):
+
+    def test_game_without_players_is_cancelled(self):
+        server = TriviaServer(host='127.0.0.1', logger=NullLog())
+        try:
+            server.start_game()
+            self.assertEqual(server.game_state, 'waiting')
+        finally:
+            server.tcp_socket.close()
+            server.udp_socket.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
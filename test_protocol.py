@@ -0,0 +1,31 @@
+import unittest
+
+from Protocol import (GAME_OVER, INFO, MAX_PAYLOAD, QUESTION, STATS, FrameDecoder, ProtocolError,
+                      decode_question, encode_frame, encode_question, encode_text_frames)
+
+
+class FrameSizeTest(unittest.TestCase):
+
+    def test_oversized_payloads_are_refused(self):
+        with self.assertRaises(ProtocolError):
+            encode_frame(STATS, b'x' * (MAX_PAYLOAD + 1))
+
+    def test_long_texts_are_split_at_line_ends(self):
+        text = "\n".join(f"player{i}: 1 game" for i in range(8000))
+        frames = FrameDecoder().feed(encode_text_frames(GAME_OVER, text, INFO))
+        self.assertGreater(len(frames), 1)
+        self.assertEqual([message_type for message_type, _ in frames], [INFO] * (len(frames) - 1) + [GAME_OVER])
+        self.assertEqual("\n".join(payload.decode() for _, payload in frames), text)
+
+    def test_crowded_question_ends_with_the_question(self):
+        text = "Round 70000, played by " + ", ".join(f"player{i}" for i in range(10000)) + ":\nIs the sky blue?"
+        frames = FrameDecoder().feed(encode_question(70000, text))
+        message_type, payload = frames[-1]
+        self.assertEqual(message_type, QUESTION)
+        round_num, question = decode_question(payload)
+        self.assertEqual((round_num, question), (70000, "Is the sky blue?"))
+        self.assertTrue(all(message_type == INFO for message_type, _ in frames[:-1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
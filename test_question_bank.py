@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from Question_Bank import QuestionBank, QuestionDeck, build_question_bank
+
+
+class QuestionDeckTest(unittest.TestCase):
+
+    def test_every_question_is_drawn_once_per_cycle(self):
+        questions = [(f"q{i}", i % 2 == 0) for i in range(50)]
+        deck = QuestionDeck(questions)
+        for _ in range(2):
+            drawn = [deck.draw() for _ in questions]
+            self.assertCountEqual(drawn, questions)
+
+    def test_restored_deck_continues_the_same_draw(self):
+        questions = [(f"q{i}", True) for i in range(20)]
+        deck = QuestionDeck(questions)
+        for _ in range(7):
+            deck.draw()
+        restored = QuestionDeck(questions)
+        restored.restore(deck.state())
+        self.assertEqual([restored.draw() for _ in range(13)], [deck.draw() for _ in range(13)])
+
+
+class QuestionBankTest(unittest.TestCase):
+
+    def test_long_category_names_round_trip(self):
+        category = "ארץ " * 100  # 700 bytes of UTF-8
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bank.tqb')
+            build_question_bank(path, [("The sky is blue", True, category, 1)])
+            bank = QuestionBank(path)
+            self.assertEqual(bank[0], ("The sky is blue", True))
+            self.assertIn(category, bank.categories)
+            bank.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
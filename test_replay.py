@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from Game_Log import NullLog
+from Replay import GameRecord, ReplayReader, ReplayWriter, decode_game
+
+
+class GameRecordTest(unittest.TestCase):
+
+    def test_games_with_more_than_65535_players_round_trip(self):
+        players = {connection: f"p{connection}" for connection in range(70000)}
+        record = GameRecord(1, players)
+        responses = {69999: 'Y', 0: None}
+        record.add_round(1, "Is the sky blue?", True, responses, {69999: 1500}, players, [0])
+        record.finish(69999)
+        game = decode_game(record.encode(7))
+        self.assertEqual(len(game['players']), 70000)
+        self.assertEqual(game['rounds'][0]['eliminated'], ['p0'])
+        self.assertEqual(game['rounds'][0]['answers'][0], ('p69999', 1, 1))
+        self.assertEqual(game['winner'], 'p69999')
+
+    def test_game_without_winner(self):
+        record = GameRecord(1, {1: 'alice'})
+        record.finish()
+        self.assertIsNone(decode_game(record.encode(1))['winner'])
+
+
+class ReplayWriterTest(unittest.TestCase):
+
+    def test_failed_game_does_not_drop_the_rest_of_its_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.replay')
+            broken = GameRecord(1, {1: 'bob'})
+            broken.started_at = 'not a time'  # Fails to encode
+            writer = ReplayWriter(path, logger=NullLog())
+            for record in (GameRecord(1, {1: 'alice'}), broken, GameRecord(2, {2: 'carol'})):
+                record.finish()
+                writer.submit(record)
+            writer.close()
+            with ReplayReader(path) as reader:
+                self.assertEqual([game['players'] for game in reader], [['alice'], ['carol']])
+
+
+if __name__ == '__main__':
+    unittest.main()
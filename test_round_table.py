@@ -0,0 +1,28 @@
+import unittest
+
+from Round_Table import RoundTable
+
+
+class ResolveFastestTest(unittest.TestCase):
+
+    def test_fastest_correct_player_wins(self):
+        table = RoundTable({'alice': 'Y', 'bob': 'Y', 'carol': 'N'}, {'alice': 900, 'bob': 400, 'carol': 100})
+        fastest, slower, incorrect, missing = table.resolve_fastest(True)
+        self.assertEqual((fastest, slower, incorrect, missing), (['bob'], ['alice'], ['carol'], []))
+
+    def test_exact_ties_are_not_settled_by_join_order(self):
+        winners = set()
+        for _ in range(200):
+            table = RoundTable({'alice': 'Y', 'bob': 'Y'}, {'alice': 500, 'bob': 500})
+            fastest, _, _, _ = table.resolve_fastest(True)
+            winners.update(fastest)
+        self.assertEqual(winners, {'alice', 'bob'})
+
+    def test_players_without_a_timestamp_rank_last(self):
+        table = RoundTable({'alice': 'Y', 'bob': 'Y'}, {'bob': 900})
+        fastest, slower, _, _ = table.resolve_fastest(True)
+        self.assertEqual((fastest, slower), (['bob'], ['alice']))
+
+
+if __name__ == '__main__':
+    unittest.main()
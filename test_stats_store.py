@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from Stats_Store import Leaderboard, StatsStore
+
+
+class LeaderboardTest(unittest.TestCase):
+
+    def test_tied_players_stay_on_the_board(self):
+        board = Leaderboard(1)
+        board.update('A', 1)
+        board.update('B', 1)
+        self.assertEqual(board.leaders(), (1, ['A', 'B']))
+
+    def test_overtaken_players_leave_the_board(self):
+        board = Leaderboard(1)
+        board.update('A', 1)
+        board.update('B', 1)
+        board.update('B', 2)
+        self.assertEqual(board.entries, {'B': 2})
+        self.assertEqual(board.leaders(), (2, ['B']))
+
+
+class StatsStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'stats.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ties_are_kept_across_restarts(self):
+        store = StatsStore(self.path, top_k=1)
+        for name in ('A', 'B', 'C'):
+            store.record_win(name)
+        self.assertEqual(store.most_wins(), (1, ['A', 'B', 'C']))
+        store.close()
+
+        store = StatsStore(self.path, top_k=1)
+        try:
+            best, leaders = store.most_wins()
+            self.assertEqual((best, sorted(leaders)), (1, ['A', 'B', 'C']))
+            store.record_win('C')
+            self.assertEqual(store.most_wins(), (2, ['C']))
+        finally:
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()